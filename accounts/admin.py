@@ -2,10 +2,16 @@
 #
 # # Register your models here.
 from django.contrib import admin
-from .models import PassengerProfile
+from .models import PassengerProfile, BookingDelegate
 
 
 @admin.register(PassengerProfile)
 class PassengerProfileAdmin(admin.ModelAdmin):
     list_display = ("real_name", "user", "phone", "email")
     search_fields = ("real_name", "phone", "email", "id_card_no")
+
+
+@admin.register(BookingDelegate)
+class BookingDelegateAdmin(admin.ModelAdmin):
+    list_display = ("profile", "user", "created_at")
+    search_fields = ("profile__real_name", "profile__id_card_no", "user__username")
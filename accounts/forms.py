@@ -82,3 +82,24 @@ class ResetPasswordByPhoneForm(forms.Form):
         if pwd1 and pwd2 and pwd1 != pwd2:
             self.add_error("confirm_password", "两次输入的密码不一致")
         return cleaned
+
+
+class BookingDelegateForm(forms.Form):
+    """授权另一个账号为本人代订机票。"""
+
+    username = forms.CharField(label="授权账号（用户名）", max_length=150)
+
+    def __init__(self, *args, user=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.user = user
+        for f in self.fields.values():
+            f.widget.attrs.setdefault("class", "form-control")
+
+    def clean_username(self):
+        username = self.cleaned_data["username"].strip()
+        if self.user is not None and username == self.user.username:
+            raise forms.ValidationError("无需授权自己的账号")
+        try:
+            return User.objects.get(username=username)
+        except User.DoesNotExist:
+            raise forms.ValidationError("用户不存在")
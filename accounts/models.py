@@ -19,3 +19,23 @@ class PassengerProfile(models.Model):
 
     def __str__(self):
         return f"{self.real_name} ({self.user.username})"
+
+
+class BookingDelegate(models.Model):
+    """乘机人授权其他账号为自己代订机票（团体订票只能添加本人或已授权的乘机人）。"""
+
+    profile = models.ForeignKey(
+        PassengerProfile, on_delete=models.CASCADE, related_name="delegates"
+    )
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="delegated_profiles"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["profile", "user"], name="booking_delegate_unique"),
+        ]
+
+    def __str__(self):
+        return f"{self.profile.real_name} -> {self.user.username}"
@@ -13,6 +13,8 @@ urlpatterns = [
     path("logout/", auth_views.LogoutView.as_view(), name="logout"),
     path("register/", views.register, name="register"),
     path("profile/", views.profile_view, name="profile"),
+    path("profile/delegates/", views.add_delegate, name="add_delegate"),
+    path("profile/delegates/<int:pk>/remove/", views.remove_delegate, name="remove_delegate"),
     path("password/change/", views.change_password, name="change_password"),
     path("password/reset-by-phone/", views.reset_password_by_phone, name="reset_password_by_phone"),
 ]
@@ -1,14 +1,16 @@
 # from django.shortcuts import render
 #
 # # Create your views here.
-from django.shortcuts import render, redirect
+from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import login, update_session_auth_hash
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.forms import PasswordChangeForm
 from django.contrib import messages
 from django.contrib.auth.models import User
+from django.views.decorators.http import require_POST
 
-from .forms import RegisterForm, ProfileForm, ResetPasswordByPhoneForm
+from .forms import RegisterForm, ProfileForm, ResetPasswordByPhoneForm, BookingDelegateForm
+from .models import BookingDelegate
 
 
 def register(request):
@@ -33,7 +35,39 @@ def profile_view(request):
             return redirect("accounts:profile")
     else:
         form = ProfileForm(instance=profile)
-    return render(request, "accounts/profile.html", {"form": form})
+    return render(
+        request,
+        "accounts/profile.html",
+        {
+            "form": form,
+            "delegate_form": BookingDelegateForm(user=request.user),
+            "delegates": profile.delegates.select_related("user").order_by("created_at"),
+        },
+    )
+
+
+@login_required
+@require_POST
+def add_delegate(request):
+    """授权其他账号在团体订票中为本人下单。"""
+    profile = request.user.profile
+    form = BookingDelegateForm(request.POST, user=request.user)
+    if form.is_valid():
+        BookingDelegate.objects.get_or_create(profile=profile, user=form.cleaned_data["username"])
+        messages.success(request, "已授权该账号为您代订机票")
+    else:
+        for error in form.errors.get("username", []):
+            messages.error(request, error)
+    return redirect("accounts:profile")
+
+
+@login_required
+@require_POST
+def remove_delegate(request, pk):
+    delegate = get_object_or_404(BookingDelegate, pk=pk, profile__user=request.user)
+    delegate.delete()
+    messages.success(request, "已取消授权")
+    return redirect("accounts:profile")
 
 
 @login_required
@@ -0,0 +1,63 @@
+# air_ticket_system/cursors.py
+"""
+游标（keyset）分页共用的游标编解码：航班搜索（flights.search）、我的订单（orders.history）、
+后台航班列表（dashboard.listing）。
+
+游标是上一页最后一行排序键组成的 JSON 数组，再做 URL 安全的 base64（去掉补齐的 "="）。
+解码时按位置逐个用解析函数校验，任何一项不合法都抛 InvalidCursor，由视图回到第一页
+或返回 400，不会把无法比较的值（NaN、非法时间等）带进查询。
+"""
+import base64
+import json
+from decimal import Decimal, InvalidOperation
+
+from django.utils.dateparse import parse_datetime
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(*values):
+    raw = json.dumps(list(values), separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token, *parsers):
+    """按 parsers 逐项解析游标，返回元组；格式错误时抛 InvalidCursor。"""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded))
+        if not isinstance(values, list) or len(values) != len(parsers):
+            raise ValueError(token)
+        return tuple(parse(value) for parse, value in zip(parsers, values))
+    except (ValueError, TypeError, InvalidOperation, OverflowError):
+        # json / base64 / UnicodeDecodeError 都是 ValueError 的子类
+        raise InvalidCursor("无效的分页游标")
+
+
+def cursor_int(value):
+    if isinstance(value, bool) or not isinstance(value, int):
+        raise TypeError(value)
+    return value
+
+
+def cursor_str(value):
+    if not isinstance(value, str):
+        raise TypeError(value)
+    return value
+
+
+def cursor_datetime(value):
+    parsed = parse_datetime(cursor_str(value))
+    if parsed is None:
+        raise ValueError(value)
+    return parsed
+
+
+def cursor_decimal(value):
+    parsed = Decimal(cursor_str(value))
+    if not parsed.is_finite():
+        # NaN / Infinity 能解析成 Decimal，但不能用于比较查询
+        raise ValueError(value)
+    return parsed
@@ -0,0 +1,161 @@
+# air_ticket_system/query_budget.py
+"""
+按视图统计 SQL 查询次数和耗时，并检查是否超出预算（settings.QUERY_BUDGETS）。
+
+- DEBUG 下把统计写进响应头：X-Query-Count / X-Query-Time-Ms / X-Query-Budget
+- 非 DEBUG 下写日志（logger：air_ticket_system.query_budget）
+- QUERY_BUDGET_STRICT=True 时超预算直接抛 QueryBudgetExceeded，
+  运行 manage.py test 时默认开启，测试中一旦有视图超预算就会失败
+
+测试中也可以直接使用 QueryBudgetTestMixin.assertWithinQueryBudget()。
+"""
+import logging
+import time
+from contextlib import ExitStack, contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.urls import reverse
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class QueryStats:
+    """作为 connection.execute_wrapper 使用，累计查询次数和耗时。"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    @property
+    def duration_ms(self):
+        return round(self.duration * 1000, 2)
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - start
+
+
+def _attach(stack, stats):
+    for conn in connections.all():
+        stack.enter_context(conn.execute_wrapper(stats))
+
+
+@contextmanager
+def record_queries():
+    stats = QueryStats()
+    with ExitStack() as stack:
+        _attach(stack, stats)
+        yield stats
+
+
+def get_budget(view_name):
+    if not view_name:
+        return None
+    return getattr(settings, "QUERY_BUDGETS", {}).get(view_name)
+
+
+def check_budget(view_name, stats):
+    budget = get_budget(view_name)
+    if budget is None or stats.count <= budget:
+        return
+    message = (
+        f"{view_name} 执行了 {stats.count} 条 SQL（{stats.duration_ms}ms），"
+        f"超出预算 {budget} 条"
+    )
+    logger.warning(message)
+    if getattr(settings, "QUERY_BUDGET_STRICT", False):
+        raise QueryBudgetExceeded(message)
+
+
+class QueryBudgetMiddleware:
+    # 同时支持同步 / 异步调用链，ASGI 下不会把异步视图退化成同步执行
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with record_queries() as stats:
+            response = self.get_response(request)
+        return self._finish(request, response, stats)
+
+    async def __acall__(self, request):
+        # 数据库连接是线程本地的，异步 ORM 在同一个 thread_sensitive 线程里执行查询，
+        # 所以要在那个线程里给连接挂上统计钩子
+        stats = QueryStats()
+        stack = ExitStack()
+        await sync_to_async(_attach)(stack, stats)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        return self._finish(request, response, stats)
+
+    def _finish(self, request, response, stats):
+        view_name = getattr(request.resolver_match, "view_name", None)
+        response.query_stats = stats
+
+        if settings.DEBUG:
+            response["X-Query-Count"] = str(stats.count)
+            response["X-Query-Time-Ms"] = str(stats.duration_ms)
+            budget = get_budget(view_name)
+            if budget is not None:
+                response["X-Query-Budget"] = str(budget)
+        else:
+            logger.info(
+                "%s %s view=%s queries=%d sql_ms=%.2f",
+                request.method,
+                request.path,
+                view_name,
+                stats.count,
+                stats.duration_ms,
+            )
+
+        check_budget(view_name, stats)
+        return response
+
+
+class QueryBudgetTestMixin:
+    """
+    TestCase 混入类：
+
+        class SearchTests(QueryBudgetTestMixin, TestCase):
+            def test_search_budget(self):
+                self.assertWithinQueryBudget("flights:search", data={...})
+    """
+
+    def assertWithinQueryBudget(
+        self, view_name, args=None, kwargs=None, data=None, method="get", client=None
+    ):
+        budget = get_budget(view_name)
+        if budget is None:
+            self.fail(f"{view_name} 没有在 QUERY_BUDGETS 中声明查询预算")
+
+        url = reverse(view_name, args=args, kwargs=kwargs)
+        with record_queries() as stats:
+            response = getattr(client or self.client, method)(url, data)
+        if stats.count > budget:
+            self.fail(f"{view_name} 执行了 {stats.count} 条 SQL，超出预算 {budget} 条")
+        return response
+
+    @contextmanager
+    def assertMaxQueries(self, budget):
+        with record_queries() as stats:
+            yield stats
+        if stats.count > budget:
+            self.fail(f"执行了 {stats.count} 条 SQL，超出预算 {budget} 条")
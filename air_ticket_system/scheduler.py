@@ -0,0 +1,51 @@
+# air_ticket_system/scheduler.py
+"""
+定时任务的通用管理命令基类。
+
+子类只需实现 run_once()，即可同时支持：
+- python manage.py <cmd>                 执行一轮后退出（适合 cron / systemd timer）
+- python manage.py <cmd> --interval 60   常驻进程，每 60 秒执行一轮
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+
+class PeriodicCommand(BaseCommand):
+    default_interval = 0
+    default_batch_size = 500
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=self.default_interval,
+            help="常驻模式下每轮间隔秒数；0 表示只执行一轮",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=self.default_batch_size,
+            help="每个批次处理的行数",
+        )
+
+    def run_once(self, **options):
+        """执行一轮任务，返回要输出的说明文字（可为空）。"""
+        raise NotImplementedError
+
+    def handle(self, *args, **options):
+        interval = options["interval"]
+        while True:
+            close_old_connections()
+            started = time.monotonic()
+            message = self.run_once(**options)
+            if message:
+                elapsed = time.monotonic() - started
+                self.stdout.write(f"[{time.strftime('%H:%M:%S')}] {message}（{elapsed:.2f}s）")
+            if interval <= 0:
+                return
+            try:
+                time.sleep(max(0.0, interval - (time.monotonic() - started)))
+            except KeyboardInterrupt:
+                return
@@ -132,6 +132,7 @@
 # STATIC_URL = 'static/'
 from pathlib import Path
 import os
+import sys
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -155,6 +156,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "air_ticket_system.query_budget.QueryBudgetMiddleware",  # 放在最前面，统计整个请求的 SQL
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -196,6 +198,84 @@ DATABASES = {
     }
 }
 
+# 缓存：默认使用进程内存（LocMemCache）；多进程部署时可换成 Redis / Memcached
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "air-ticket-system",
+        "OPTIONS": {"MAX_ENTRIES": 10000},
+    },
+    # 航班搜索结果缓存（flights.search_cache）。失效用的“代数”和命中计数也存在这里，
+    # 所以多进程 / 多机器部署时必须换成所有 worker 共享的后端，否则一个进程里的库存变化
+    # 不会让其他进程的缓存失效（最长 FLIGHT_SEARCH_CACHE_TIMEOUT 秒内返回旧结果），
+    # 命中计数也只是单个进程的。例如：
+    #     "BACKEND": "django.core.cache.backends.redis.RedisCache",
+    #     "LOCATION": "redis://127.0.0.1:6379/1",
+    # 或 django.core.cache.backends.memcached.PyMemcacheCache。
+    # 进程内存只适合 runserver / 单进程部署。
+    "search": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "air-ticket-system-search",
+        "OPTIONS": {"MAX_ENTRIES": 10000},
+    },
+}
+
+# 航班搜索结果缓存（flights.search_cache），使用上面的 "search" 缓存
+FLIGHT_SEARCH_CACHE_ALIAS = "search"
+FLIGHT_SEARCH_CACHE_TIMEOUT = 300  # 秒；库存变化会提前失效
+
+# 未支付订单的保座存储（orders.holds）：
+# - DatabaseHoldStore：保座记录存在数据库，多进程部署可用（默认）
+# - InMemoryHoldStore：进程内 TTL 存储，只适合单进程部署（如单个 ASGI worker）
+SEAT_HOLD_BACKEND = "orders.holds.DatabaseHoldStore"
+
+# 退票队列（orders.refunds）：
+# - DatabaseRefundQueue：待审核的退票记录由 process_refunds 命令批量处理（默认）
+# - LocalRefundQueue：进程内队列 + 后台线程，提交后立即处理，只适合单进程部署
+REFUND_QUEUE_BACKEND = "orders.refunds.DatabaseRefundQueue"
+
+# 订单号中的节点号（0-999，见 orders.order_no）；多台机器部署时需要为每台机器 / 每个
+# worker 显式配置不同的值。未配置时由主机名和进程号计算，可能相同，
+# 使用 SQLite 以外的数据库时 manage.py check 和 worker 日志会给出警告
+ORDER_NO_NODE_ID = None
+
+# 每个视图允许的最大 SQL 条数（含 session / 登录用户查询），见 air_ticket_system.query_budget
+QUERY_BUDGETS = {
+    # 搜索页：session、用户、机场解析、航班搜索、低价日历各一条；没有直飞时路由图
+    # 冷启动再加载一次航段（航段和机场一条查询取出），最坏 6 条
+    "flights:search": 6,
+    "flights:search_api": 4,
+    "flights:connections_api": 5,
+    "flights:fare_calendar_api": 4,
+    "flights:detail": 4,
+    "flights:search_async": 6,
+    "flights:detail_async": 4,
+    "orders:order_list": 4,
+    "orders:order_detail": 5,
+    "dashboard:flight_list": 4,
+    "dashboard:revenue_overview": 6,
+    "dashboard:revenue_report": 4,
+}
+# 超预算时直接抛异常；运行 manage.py test 时默认开启
+QUERY_BUDGET_STRICT = len(sys.argv) > 1 and sys.argv[1] == "test"
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        # 生产环境逐个请求记录 SQL 条数（INFO）；开发时已有 X-Query-* 响应头，
+        # 跑测试时也不需要每个请求一行，只输出超预算警告
+        "air_ticket_system.query_budget": {
+            "handlers": ["console"],
+            "level": "WARNING" if DEBUG or QUERY_BUDGET_STRICT else "INFO",
+            "propagate": False,
+        },
+    },
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         "NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator",
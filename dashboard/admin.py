@@ -1,3 +1,9 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import DailyRevenue
+
+
+@admin.register(DailyRevenue)
+class DailyRevenueAdmin(admin.ModelAdmin):
+    list_display = ("day", "paid_amount", "paid_count", "refund_fee", "refund_count", "updated_at")
+    date_hierarchy = "day"
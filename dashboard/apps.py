@@ -9,3 +9,6 @@ from django.apps import AppConfig
 class DashboardConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "dashboard"
+
+    def ready(self):
+        from . import signals  # noqa: F401  注册订单状态变更信号，维护每日营收汇总
@@ -0,0 +1,155 @@
+# dashboard/exports.py
+"""
+订单 / 退票记录导出（CSV、NDJSON），配合 StreamingHttpResponse 边查边写：
+
+- 查询用 values_list + iterator(chunk_size)，PostgreSQL 下对应服务端游标，
+  每次只从数据库取一批行，内存占用与导出总行数无关
+- 生成器每攒够一批行就输出一段文本；CSV 的表头在查询之前就先发出去，
+  浏览器立刻开始下载，不用等第一批数据
+"""
+import csv
+import json
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from io import StringIO
+
+from django.utils import timezone
+
+from orders.models import TicketOrder, OrderStatus, RefundRecord, RefundStatus
+
+CHUNK_SIZE = 2000
+
+# (NDJSON 字段名, 查询字段, CSV 表头)
+ORDER_COLUMNS = [
+    ("order_no", "order_no", "订单号"),
+    ("username", "user__username", "用户名"),
+    ("passenger", "profile__real_name", "乘机人"),
+    ("flight_no", "flight__flight_no", "航班号"),
+    ("depart_airport", "flight__depart_airport__code", "出发机场"),
+    ("arrive_airport", "flight__arrive_airport__code", "到达机场"),
+    ("depart_time", "flight__depart_time", "起飞时间"),
+    ("cabin_class", "seat__cabin_class", "舱位"),
+    ("status", "status", "状态"),
+    ("ticket_price", "ticket_price", "票价"),
+    ("tax", "tax", "税费"),
+    ("fee", "fee", "手续费"),
+    ("total_amount", "total_amount", "订单金额"),
+    ("created_at", "created_at", "下单时间"),
+    ("paid_at", "paid_at", "支付时间"),
+    ("cancelled_at", "cancelled_at", "取消时间"),
+    ("refunded_at", "refunded_at", "退票时间"),
+]
+
+REFUND_COLUMNS = [
+    ("order_no", "order__order_no", "订单号"),
+    ("username", "order__user__username", "用户名"),
+    ("flight_no", "order__flight__flight_no", "航班号"),
+    ("order_status", "order__status", "订单状态"),
+    ("status", "status", "审核状态"),
+    ("total_amount", "order__total_amount", "订单金额"),
+    ("refund_amount", "refund_amount", "退款金额"),
+    ("refund_fee", "refund_fee", "退票手续费"),
+    ("request_time", "request_time", "申请时间"),
+    ("approve_time", "approve_time", "审核时间"),
+    ("reason", "reason", "退票原因"),
+]
+
+# 导出类型 -> (模型, 列, 日期筛选字段, 状态枚举)
+EXPORTS = {
+    "orders": (TicketOrder, ORDER_COLUMNS, "created_at", OrderStatus),
+    "refunds": (RefundRecord, REFUND_COLUMNS, "request_time", RefundStatus),
+}
+
+CONTENT_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson; charset=utf-8",
+}
+
+
+def _local_bound(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def export_rows(kind, start=None, end=None, status=None):
+    """
+    返回 (列定义, 行迭代器)。start / end 为本地日期（含首尾两天），
+    status 为订单状态（orders）或审核状态（refunds）。
+    """
+    model, columns, date_field, _ = EXPORTS[kind]
+    queryset = model.objects.all()
+    if start is not None:
+        queryset = queryset.filter(**{f"{date_field}__gte": _local_bound(start)})
+    if end is not None:
+        queryset = queryset.filter(**{f"{date_field}__lt": _local_bound(end + timedelta(days=1))})
+    if status:
+        queryset = queryset.filter(status=status)
+    rows = queryset.order_by("pk").values_list(*(lookup for _, lookup, _ in columns))
+    return columns, rows.iterator(chunk_size=CHUNK_SIZE)
+
+
+def _plain(value):
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return timezone.localtime(value).strftime("%Y-%m-%d %H:%M:%S")
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def _json(value):
+    if isinstance(value, datetime):
+        return timezone.localtime(value).isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+# 以这些字符开头的单元格会被 Excel / WPS 当作公式执行（用户名、退票原因等由用户填写）
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+
+def _csv_cell(value):
+    # 只处理文本字段，金额等数值保持原样
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return _plain(value)
+
+
+def stream_csv(columns, rows, batch_size=500):
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+    # BOM：Excel 打开时按 UTF-8 识别中文
+    buffer.write("\ufeff")
+    writer.writerow([label for _, _, label in columns])
+    yield _drain(buffer)
+    for count, row in enumerate(rows, 1):
+        writer.writerow([_csv_cell(value) for value in row])
+        if count % batch_size == 0:
+            yield _drain(buffer)
+    tail = buffer.getvalue()
+    if tail:
+        yield tail
+
+
+def _drain(buffer):
+    text = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    return text
+
+
+def stream_ndjson(columns, rows, batch_size=500):
+    keys = [key for key, _, _ in columns]
+    lines = []
+    for row in rows:
+        record = {key: _json(value) for key, value in zip(keys, row)}
+        lines.append(json.dumps(record, ensure_ascii=False) + "\n")
+        if len(lines) >= batch_size:
+            yield "".join(lines)
+            lines = []
+    if lines:
+        yield "".join(lines)
+
+
+STREAMERS = {"csv": stream_csv, "ndjson": stream_ndjson}
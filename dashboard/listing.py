@@ -0,0 +1,115 @@
+# dashboard/listing.py
+"""
+后台航班列表：按 (depart_time, id) 升序做游标（keyset）分页，支持按状态 / 机场 / 航空公司 /
+起飞日期筛选；每行的已售、余票、总座位数用相关子查询随同一条 SQL 取出，
+只对当前页的航班计算，不需要按航班逐个查询。
+
+配合 Flight 上的 (depart_time, id) 索引，表中有上百万航班时翻页耗时也基本不变。
+"""
+from datetime import datetime, time, timedelta
+
+from django.db.models import Count, IntegerField, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from air_ticket_system.cursors import (
+    cursor_datetime,
+    cursor_int,
+    decode_cursor as decode_cursor_values,
+    encode_cursor as encode_cursor_values,
+)
+
+from flights.models import Flight, FlightSeat, FlightStatus, SALE_CUTOFF
+from orders.models import TicketOrder, SOLD_STATUSES
+
+PAGE_SIZE = 50
+
+
+def encode_cursor(flight):
+    return encode_cursor_values(flight.depart_time.isoformat(), flight.pk)
+
+
+def decode_cursor(token):
+    """解析游标，返回 (depart_time, id)；格式错误时抛 InvalidCursor。"""
+    return decode_cursor_values(token, cursor_datetime, cursor_int)
+
+
+def _seat_sum(field):
+    seats = (
+        FlightSeat.objects.filter(flight=OuterRef("pk"))
+        .order_by()
+        .values("flight")
+        .annotate(total=Sum(field))
+        .values("total")
+    )
+    return Coalesce(Subquery(seats, output_field=IntegerField()), 0)
+
+
+def with_load(queryset):
+    """给航班加上 total_seats / available_seats / sold_count 三个统计字段。"""
+    sold = (
+        TicketOrder.objects.filter(flight=OuterRef("pk"), status__in=SOLD_STATUSES)
+        .order_by()
+        .values("flight")
+        .annotate(count=Count("id"))
+        .values("count")
+    )
+    return queryset.annotate(
+        total_seats=_seat_sum("total_seats"),
+        available_seats=_seat_sum("available_seats"),
+        sold_count=Coalesce(Subquery(sold, output_field=IntegerField()), 0),
+    )
+
+
+def filter_flights(queryset, status=None, airport=None, airline=None, depart_date=None, now=None):
+    """
+    按后台筛选条件过滤。status 按实际售卖状态（Flight.sale_status）筛选：
+    起飞前 1 小时内、尚未被定时任务停售的航班算作“已结束”。
+    """
+    if status:
+        cutoff = (now or timezone.now()) + SALE_CUTOFF
+        if status == FlightStatus.ON_SALE:
+            queryset = queryset.filter(status=FlightStatus.ON_SALE, depart_time__gt=cutoff)
+        elif status == FlightStatus.FINISHED:
+            queryset = queryset.filter(
+                Q(status=FlightStatus.FINISHED)
+                | Q(status=FlightStatus.ON_SALE, depart_time__lte=cutoff)
+            )
+        else:
+            queryset = queryset.filter(status=status)
+    if airport:
+        queryset = queryset.filter(
+            Q(depart_airport__code=airport) | Q(arrive_airport__code=airport)
+        )
+    if airline:
+        queryset = queryset.filter(airline__icontains=airline)
+    if depart_date:
+        start = timezone.make_aware(datetime.combine(depart_date, time.min))
+        queryset = queryset.filter(
+            depart_time__gte=start, depart_time__lt=start + timedelta(days=1)
+        )
+    return queryset
+
+
+def flight_page(filters=None, cursor=None, limit=PAGE_SIZE):
+    """
+    返回 (flights, next_cursor)，没有下一页时 next_cursor 为 None。
+    filters 为 filter_flights 的关键字参数。
+    """
+    qs = filter_flights(Flight.objects.all(), **(filters or {}))
+    qs = with_load(qs.select_related("depart_airport", "arrive_airport")).order_by(
+        "depart_time", "id"
+    )
+    if cursor:
+        depart_time, pk = decode_cursor(cursor)
+        qs = qs.filter(Q(depart_time__gt=depart_time) | Q(depart_time=depart_time, id__gt=pk))
+
+    # 多取一行用来判断是否还有下一页
+    rows = list(qs[: limit + 1])
+    flights = rows[:limit]
+    for flight in flights:
+        flight.load_factor = (
+            round(flight.sold_count * 100 / flight.total_seats, 1) if flight.total_seats else None
+        )
+    next_cursor = encode_cursor(flights[-1]) if len(rows) > limit else None
+    return flights, next_cursor
@@ -0,0 +1,23 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from dashboard.revenue import backfill
+
+
+class Command(BaseCommand):
+    help = "根据订单表重算每日营收汇总（DailyRevenue），用于首次部署回填或数据修复"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--since", help="只重算该日期（YYYY-MM-DD）及之后的数据")
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        since = None
+        if options["since"]:
+            try:
+                since = date.fromisoformat(options["since"])
+            except ValueError:
+                raise CommandError("--since 格式应为 YYYY-MM-DD")
+        written = backfill(since=since, batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"已写入 {written} 天的营收汇总"))
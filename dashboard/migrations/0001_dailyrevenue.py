@@ -0,0 +1,63 @@
+# Generated by Django 4.2.30 on 2026-10-17 02:03
+
+from collections import defaultdict
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+
+def backfill_daily_revenue(apps, schema_editor):
+    TicketOrder = apps.get_model("orders", "TicketOrder")
+    DailyRevenue = apps.get_model("dashboard", "DailyRevenue")
+    tz = timezone.get_current_timezone()
+    days = defaultdict(dict)
+    paid = (
+        TicketOrder.objects.filter(status__in=["PAID", "REFUNDING"], paid_at__isnull=False)
+        .annotate(day=TruncDate("paid_at", tzinfo=tz))
+        .values("day")
+        .annotate(amount=Sum("total_amount"), count=Count("id"))
+    )
+    for row in paid:
+        days[row["day"]].update(paid_amount=row["amount"], paid_count=row["count"])
+    refunded = (
+        TicketOrder.objects.filter(status="REFUNDED", refunded_at__isnull=False)
+        .annotate(day=TruncDate("refunded_at", tzinfo=tz))
+        .values("day")
+        .annotate(fee=Sum("fee"), count=Count("id"))
+    )
+    for row in refunded:
+        days[row["day"]].update(refund_fee=row["fee"], refund_count=row["count"])
+    DailyRevenue.objects.bulk_create(
+        [DailyRevenue(day=day, **values) for day, values in sorted(days.items())],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('orders', '0005_order_user_created_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRevenue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(unique=True)),
+                ('paid_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('paid_count', models.PositiveIntegerField(default=0)),
+                ('refund_fee', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('refund_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['day'],
+            },
+        ),
+        migrations.RunPython(backfill_daily_revenue, migrations.RunPython.noop),
+    ]
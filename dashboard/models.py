@@ -1,3 +1,27 @@
 from django.db import models
 
-# Create your models here.
+
+class DailyRevenue(models.Model):
+    """
+    按天（本地日期）汇总的营收，供营收统计页面直接读取，不再扫描订单表。
+
+    - paid_amount：当天支付、目前仍为已支付 / 退票中的订单金额
+    - refund_fee：当天退票完成的订单收取的手续费
+    订单支付、退票时由 dashboard.revenue 增量维护；backfill_revenue 命令可全量重算。
+    """
+    day = models.DateField(unique=True)
+    paid_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    paid_count = models.PositiveIntegerField(default=0)
+    refund_fee = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    refund_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["day"]
+
+    @property
+    def total(self):
+        return self.paid_amount + self.refund_fee
+
+    def __str__(self):
+        return f"{self.day}: {self.total}"
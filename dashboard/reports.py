@@ -0,0 +1,176 @@
+# dashboard/reports.py
+"""
+营收报表：任意日期区间，按日 / 周 / 月 / 季度分桶，可按航空公司或航线拆分。
+
+营收口径与营收统计页一致：已支付（含退票中）订单金额计入支付日，
+已退票订单只计手续费，计入退票日。
+
+- 不拆分时读取每日营收汇总表（DailyRevenue），按日期截断分组，一条查询
+- 拆分时直接查订单表：把每个订单归入“支付时间或退票时间”所在的桶，
+  用条件聚合（Sum ... filter=）同时算出支付金额和退票手续费，一条查询完成，
+  不再每个桶各做一次 aggregate
+分桶统一按北京时间（Asia/Shanghai）计算。
+"""
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from zoneinfo import ZoneInfo
+
+from django.db.models import Case, Count, DateField, DateTimeField, F, Q, Sum, When
+from django.db.models.functions import Trunc
+
+from orders.models import TicketOrder, OrderStatus
+
+from .models import DailyRevenue
+from .revenue import PAID_STATUSES
+
+REPORT_TIMEZONE = ZoneInfo("Asia/Shanghai")
+
+GRANULARITIES = {"day": "按日", "week": "按周", "month": "按月", "quarter": "按季度"}
+
+# 拆分维度 -> 分组字段
+SPLITS = {
+    "airline": ("flight__airline",),
+    "route": ("flight__depart_airport__code", "flight__arrive_airport__code"),
+}
+
+ZERO = Decimal("0.00")
+
+
+def period_start(day, granularity):
+    """day 所在桶的起始日期（周从周一开始）。"""
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())
+    if granularity == "month":
+        return day.replace(day=1)
+    if granularity == "quarter":
+        return date(day.year, (day.month - 1) // 3 * 3 + 1, 1)
+    return day
+
+
+def _next_period(start, granularity):
+    if granularity == "day":
+        return start + timedelta(days=1)
+    if granularity == "week":
+        return start + timedelta(days=7)
+    months = 3 if granularity == "quarter" else 1
+    month = start.month - 1 + months
+    return date(start.year + month // 12, month % 12 + 1, 1)
+
+
+def periods(start, end, granularity):
+    """[start, end) 区间覆盖的所有桶的起始日期。"""
+    current = period_start(start, granularity)
+    result = []
+    while current < end:
+        result.append(current)
+        current = _next_period(current, granularity)
+    return result
+
+
+def period_label(period, granularity):
+    if granularity == "month":
+        return period.strftime("%Y-%m")
+    if granularity == "quarter":
+        return f"{period.year}Q{(period.month - 1) // 3 + 1}"
+    if granularity == "week":
+        return f"{period.isoformat()} 起"
+    return period.isoformat()
+
+
+def _bounds(start, end):
+    return (
+        datetime.combine(start, time.min, tzinfo=REPORT_TIMEZONE),
+        datetime.combine(end, time.min, tzinfo=REPORT_TIMEZONE),
+    )
+
+
+def _rollup_rows(start, end, granularity):
+    return (
+        DailyRevenue.objects.filter(day__gte=start, day__lt=end)
+        .annotate(period=Trunc("day", granularity, output_field=DateField()))
+        .values("period")
+        .annotate(
+            paid=Sum("paid_amount"),
+            refund_fee=Sum("refund_fee"),
+            orders=Sum(F("paid_count") + F("refund_count")),
+        )
+        .order_by("period")
+    )
+
+
+def _order_rows(start, end, granularity, fields):
+    lower, upper = _bounds(start, end)
+    paid = Q(status__in=PAID_STATUSES)
+    refunded = Q(status=OrderStatus.REFUNDED)
+    # 每个订单只落在一个桶里：已退票看退票时间，其余看支付时间
+    booked_at = Case(
+        When(refunded, then=F("refunded_at")),
+        default=F("paid_at"),
+        output_field=DateTimeField(),
+    )
+    return (
+        TicketOrder.objects.filter(
+            paid & Q(paid_at__gte=lower, paid_at__lt=upper)
+            | refunded & Q(refunded_at__gte=lower, refunded_at__lt=upper)
+        )
+        .annotate(
+            period=Trunc(booked_at, granularity, output_field=DateField(), tzinfo=REPORT_TIMEZONE)
+        )
+        .values("period", *fields)
+        .annotate(
+            paid=Sum("total_amount", filter=paid),
+            refund_fee=Sum("fee", filter=refunded),
+            orders=Count("id"),
+        )
+        .order_by("period", *fields)
+    )
+
+
+def _group_label(row, split):
+    if split == "airline":
+        return row["flight__airline"]
+    if split == "route":
+        return f'{row["flight__depart_airport__code"]}→{row["flight__arrive_airport__code"]}'
+    return ""
+
+
+def revenue_report(start, end, granularity="day", split=None):
+    """
+    [start, end) 日期区间的营收报表，一条 SQL 完成。
+    返回按 (桶, 拆分维度) 排序的行：
+    {"period", "label", "group", "paid", "refund_fee", "total", "orders"}
+    没有营收的桶不返回（图表需要连续序列时用 series 补零）。
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"不支持的时间粒度：{granularity}")
+    if split is None:
+        rows = _rollup_rows(start, end, granularity)
+    elif split in SPLITS:
+        rows = _order_rows(start, end, granularity, SPLITS[split])
+    else:
+        raise ValueError(f"不支持的拆分维度：{split}")
+
+    report = []
+    for row in rows:
+        paid = row["paid"] or ZERO
+        refund_fee = row["refund_fee"] or ZERO
+        report.append(
+            {
+                "period": row["period"],
+                "label": period_label(row["period"], granularity),
+                "group": _group_label(row, split),
+                "paid": paid,
+                "refund_fee": refund_fee,
+                "total": paid + refund_fee,
+                "orders": row["orders"] or 0,
+            }
+        )
+    return report
+
+
+def series(report, start, end, granularity):
+    """把（不拆分的）报表行展开成连续的 [(桶起始日期, 营收)]，没有营收的桶为 0。"""
+    by_period = {}
+    for row in report:
+        by_period[row["period"]] = by_period.get(row["period"], ZERO) + row["total"]
+    return [(period, by_period.get(period, ZERO)) for period in periods(start, end, granularity)]
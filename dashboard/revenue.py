@@ -0,0 +1,152 @@
+# dashboard/revenue.py
+"""
+每日营收汇总表（DailyRevenue）的维护逻辑。
+
+订单状态迁移（orders.state.transition）后由 signals 调用：
+- RESERVED -> PAID：支付日期 +订单金额
+- -> REFUNDED：支付日期 -订单金额，退票日期 +手续费
+增量在状态迁移的事务里算好，等事务提交后（transaction.on_commit）再累加到汇总表，
+支付事务不会去锁当天的汇总行，同一天的大量支付之间也就不用排队。
+代价是汇总表是最终一致的：订单已提交、增量还没写入时进程退出，这部分会漏记，
+用 backfill_revenue 命令或 recompute_days() 按订单表重算即可修复。
+迁移数量与订单数不一致（有订单被并发修改）时，改为提交后按涉及的日期从订单表重算。
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from orders.models import TicketOrder, OrderStatus
+
+from .models import DailyRevenue
+
+# 计入“已支付金额”的订单状态（退票中的订单钱还没退，仍计入）
+PAID_STATUSES = [OrderStatus.PAID, OrderStatus.REFUNDING]
+
+ZERO = Decimal("0.00")
+
+
+def _empty():
+    return {"paid_amount": ZERO, "paid_count": 0, "refund_fee": ZERO, "refund_count": 0}
+
+
+def _apply(deltas):
+    """把 {day: {字段: 增量}} 累加到汇总表，每天一条 UPDATE（各自提交，行锁只持有一瞬间）。"""
+    for day in sorted(deltas):
+        delta = deltas[day]
+        DailyRevenue.objects.get_or_create(day=day)
+        DailyRevenue.objects.filter(day=day).update(
+            **{name: F(name) + value for name, value in delta.items() if value}
+        )
+
+
+def _after_commit(func, *args):
+    # robust：汇总更新失败只记日志，不影响已经提交的支付 / 退票
+    transaction.on_commit(lambda: func(*args), robust=True)
+
+
+def record_payments(order_ids):
+    deltas = defaultdict(_empty)
+    rows = TicketOrder.objects.filter(pk__in=order_ids, status=OrderStatus.PAID).values_list(
+        "paid_at", "total_amount"
+    )
+    for paid_at, amount in rows:
+        delta = deltas[timezone.localdate(paid_at)]
+        delta["paid_amount"] += amount
+        delta["paid_count"] += 1
+    if deltas:
+        _after_commit(_apply, dict(deltas))
+
+
+def record_refunds(order_ids):
+    deltas = defaultdict(_empty)
+    rows = TicketOrder.objects.filter(pk__in=order_ids, status=OrderStatus.REFUNDED).values_list(
+        "paid_at", "total_amount", "refunded_at", "fee"
+    )
+    for paid_at, amount, refunded_at, fee in rows:
+        if paid_at is not None:
+            paid = deltas[timezone.localdate(paid_at)]
+            paid["paid_amount"] -= amount
+            paid["paid_count"] -= 1
+        refund = deltas[timezone.localdate(refunded_at)]
+        refund["refund_fee"] += fee
+        refund["refund_count"] += 1
+    if deltas:
+        _after_commit(_apply, dict(deltas))
+
+
+def _compute(paid_filter, refund_filter):
+    """从订单表按本地日期分组统计，返回 {day: {字段: 值}}。"""
+    tz = timezone.get_current_timezone()
+    result = defaultdict(_empty)
+    paid = (
+        TicketOrder.objects.filter(status__in=PAID_STATUSES, paid_at__isnull=False, **paid_filter)
+        .annotate(day=TruncDate("paid_at", tzinfo=tz))
+        .values("day")
+        .annotate(amount=Sum("total_amount"), count=Count("id"))
+    )
+    for row in paid:
+        result[row["day"]].update(paid_amount=row["amount"], paid_count=row["count"])
+    refunded = (
+        TicketOrder.objects.filter(
+            status=OrderStatus.REFUNDED, refunded_at__isnull=False, **refund_filter
+        )
+        .annotate(day=TruncDate("refunded_at", tzinfo=tz))
+        .values("day")
+        .annotate(fee=Sum("fee"), count=Count("id"))
+    )
+    for row in refunded:
+        result[row["day"]].update(refund_fee=row["fee"], refund_count=row["count"])
+    return result
+
+
+def recompute_days(days):
+    """按订单表重算指定日期的汇总行。"""
+    days = sorted(set(days))
+    if not days:
+        return
+    computed = _compute({"paid_at__date__in": days}, {"refunded_at__date__in": days})
+    for day in days:
+        DailyRevenue.objects.update_or_create(day=day, defaults=computed.get(day, _empty()))
+
+
+def recompute_after_commit(order_ids):
+    """事务提交后按 order_ids 涉及的日期重算。"""
+    days = affected_days(order_ids)
+    if days:
+        _after_commit(recompute_days, days)
+
+
+def affected_days(order_ids):
+    days = set()
+    for paid_at, refunded_at in TicketOrder.objects.filter(pk__in=order_ids).values_list(
+        "paid_at", "refunded_at"
+    ):
+        days.update(timezone.localdate(dt) for dt in (paid_at, refunded_at) if dt)
+    return days
+
+
+def backfill(since=None, batch_size=1000):
+    """
+    全量重算汇总表（since 不为 None 时只重算该日期及之后），返回写入的行数。
+    """
+    paid_filter, refund_filter = {}, {}
+    if since is not None:
+        paid_filter["paid_at__date__gte"] = since
+        refund_filter["refunded_at__date__gte"] = since
+    computed = _compute(paid_filter, refund_filter)
+
+    with transaction.atomic():
+        stale = DailyRevenue.objects.all()
+        if since is not None:
+            stale = stale.filter(day__gte=since)
+        stale.delete()
+        DailyRevenue.objects.bulk_create(
+            (DailyRevenue(day=day, **values) for day, values in sorted(computed.items())),
+            batch_size=batch_size,
+        )
+    return len(computed)
+
@@ -0,0 +1,20 @@
+# dashboard/signals.py
+from django.dispatch import receiver
+
+from orders.models import OrderStatus
+from orders.state import order_transitioned
+
+from . import revenue
+
+
+@receiver(order_transitioned)
+def update_daily_revenue(sender, order_ids, source, target, updated, **kwargs):
+    if target not in (OrderStatus.PAID, OrderStatus.REFUNDED):
+        return
+    if updated != len(order_ids):
+        # 不知道具体哪些订单迁移成功，按涉及的日期从订单表重算
+        revenue.recompute_after_commit(order_ids)
+    elif target == OrderStatus.PAID:
+        revenue.record_payments(order_ids)
+    else:
+        revenue.record_refunds(order_ids)
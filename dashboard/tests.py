@@ -1,3 +1,339 @@
+import csv
+import io
+import json
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import transaction
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import PassengerProfile
+from air_ticket_system.query_budget import QueryBudgetTestMixin
+from flights.models import Airport
+from flights.tests import create_flight
+from orders.models import OrderStatus, TicketOrder
+from orders.state import advance, transition
+
+from . import reports
+from .exports import ORDER_COLUMNS, stream_csv
+from .models import DailyRevenue
+from .revenue import backfill
+
+
+class DashboardQueryBudgetTests(QueryBudgetTestMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        pvg = Airport.objects.create(code="PVG", name="浦东国际机场", city="上海", country="中国")
+        pek = Airport.objects.create(code="PEK", name="首都国际机场", city="北京", country="中国")
+        base = timezone.now() + timedelta(days=1)
+        for i in range(60):
+            create_flight(f"MU53{i:02d}", pvg, pek, base + timedelta(hours=i))
+        today = timezone.localdate()
+        DailyRevenue.objects.bulk_create(
+            DailyRevenue(
+                day=today - timedelta(days=i),
+                paid_amount=Decimal("1000.00"),
+                paid_count=1,
+                refund_fee=Decimal("20.00"),
+                refund_count=1,
+            )
+            for i in range(40)
+        )
+        cls.staff = User.objects.create_user("staff", password="pw123456", is_staff=True)
+
+    def setUp(self):
+        self.client.force_login(self.staff)
+
+    def test_flight_list_within_budget(self):
+        response = self.assertWithinQueryBudget("dashboard:flight_list")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context["next_query"])
+
+    def test_flight_list_filtered_within_budget(self):
+        response = self.assertWithinQueryBudget(
+            "dashboard:flight_list", data={"airport": "PVG", "airline": "东方"}
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_revenue_overview_within_budget(self):
+        response = self.assertWithinQueryBudget("dashboard:revenue_overview")
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(response.context["yearly_total"], 0)
+
+    def test_revenue_overview_out_of_range_params_fall_back(self):
+        today = timezone.localdate()
+        current = f"{today.year:04d}-{today.month:02d}"
+        for params in [
+            {"month": "2025-13"},
+            {"month": "2025-0"},
+            {"month": "0-05"},
+            {"month": "9999-12"},
+            {"month": "abc"},
+            {"year": "10000"},
+            {"year": "0"},
+            {"week_start": "9999-12-30"},
+        ]:
+            with self.subTest(params=params):
+                response = self.client.get(reverse("dashboard:revenue_overview"), params)
+                self.assertEqual(response.status_code, 200)
+                if "month" in params:
+                    self.assertEqual(response.context["selected_month"], current)
+                if "year" in params:
+                    self.assertEqual(response.context["selected_year"], today.year)
+
+    def test_revenue_overview_accepts_valid_month(self):
+        response = self.client.get(reverse("dashboard:revenue_overview"), {"month": "2024-12"})
+        self.assertEqual(response.context["selected_month"], "2024-12")
+
+
+class CsvExportTests(TestCase):
+    def test_formula_cells_are_escaped(self):
+        columns = [("name", "name", "名称"), ("amount", "amount", "金额")]
+        rows = [
+            ("=HYPERLINK(\"http://evil\")", Decimal("-5.00")),
+            ("+1", Decimal("1.00")),
+            ("-2", None),
+            ("@SUM(A1)", None),
+            ("\tcmd", None),
+            ("\rcmd", None),
+            ("张三", Decimal("3.00")),
+        ]
+        content = "".join(stream_csv(columns, rows)).lstrip("\ufeff")
+        parsed = list(csv.reader(io.StringIO(content)))
+        self.assertEqual(
+            [row[0] for row in parsed[1:]],
+            ["'=HYPERLINK(\"http://evil\")", "'+1", "'-2", "'@SUM(A1)", "'\tcmd", "'\rcmd", "张三"],
+        )
+        # 数值列不加前缀
+        self.assertEqual(parsed[1][1], "-5.00")
+
+
+class ExportRecordsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        pvg = Airport.objects.create(code="PVG", name="浦东国际机场", city="上海", country="中国")
+        pek = Airport.objects.create(code="PEK", name="首都国际机场", city="北京", country="中国")
+        flight = create_flight("MU5950", pvg, pek, timezone.now() + timedelta(days=3))
+        seat = flight.seats.get()
+        cls.day = date(2025, 6, 10)
+        created = [cls.day - timedelta(days=1), cls.day, cls.day + timedelta(days=1)]
+        statuses = [OrderStatus.PAID, OrderStatus.PAID, OrderStatus.CANCELLED]
+        for i, (day, status) in enumerate(zip(created, statuses)):
+            user = User.objects.create_user(f"export{i}")
+            profile = PassengerProfile.objects.create(
+                user=user, real_name=f"乘客{i}", id_card_no=f"EXP{i}", phone="1", email=""
+            )
+            order = TicketOrder.objects.create(
+                order_no=f"EXP{i:04d}",
+                user=user,
+                profile=profile,
+                flight=flight,
+                seat=seat,
+                status=status,
+                ticket_price=Decimal("800.00"),
+                total_amount=Decimal("840.00"),
+            )
+            # created_at 是 auto_now_add，只能事后改
+            TicketOrder.objects.filter(pk=order.pk).update(
+                created_at=timezone.make_aware(datetime.combine(day, time(0, 10)))
+            )
+        cls.staff = User.objects.create_user("export_staff", password="pw123456", is_staff=True)
+        cls.user = User.objects.create_user("export_user", password="pw123456")
+
+    def export(self, kind="orders", **params):
+        response = self.client.get(reverse("dashboard:export_records", args=[kind]), params)
+        if response.status_code != 200:
+            return response, None
+        return response, b"".join(response.streaming_content).decode()
+
+    def test_staff_only(self):
+        url = reverse("dashboard:export_records", args=["orders"])
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+    def test_invalid_params_rejected(self):
+        self.client.force_login(self.staff)
+        self.assertEqual(self.export("tickets")[0].status_code, 404)
+        for params in [
+            {"format": "xlsx"},
+            {"status": "BOGUS"},
+            {"status": OrderStatus.PAID, "kind": "refunds"},
+            {"start": "2025-13-01"},
+            {"end": "9999-12-31"},
+            {"start": "0001-01-01"},
+            {"start": "2025-06-10", "end": "2025-06-09"},
+        ]:
+            with self.subTest(params=params):
+                response, _ = self.export(**params)
+                self.assertEqual(response.status_code, 400)
+
+    def test_csv_filtered_by_local_date(self):
+        self.client.force_login(self.staff)
+        response, content = self.export(start=self.day, end=self.day)
+        self.assertEqual(
+            response["Content-Disposition"],
+            'attachment; filename="orders-2025-06-10-2025-06-10.csv"',
+        )
+        rows = list(csv.reader(io.StringIO(content.lstrip("\ufeff"))))
+        self.assertEqual(rows[0][0], "订单号")
+        self.assertEqual([row[0] for row in rows[1:]], ["EXP0001"])
+
+    def test_ndjson_with_status_filter(self):
+        self.client.force_login(self.staff)
+        response, content = self.export(format="ndjson", status=OrderStatus.PAID, start=self.day)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson; charset=utf-8")
+        records = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual([r["order_no"] for r in records], ["EXP0001"])
+        self.assertEqual(records[0]["passenger"], "乘客1")
+        self.assertEqual(records[0]["total_amount"], "840.00")
+        self.assertIsNone(records[0]["paid_at"])
+
+    def test_csv_header_sent_before_rows_are_read(self):
+        def rows():
+            raise AssertionError("表头之前不应读取数据")
+            yield
+
+        chunks = stream_csv(ORDER_COLUMNS, rows())
+        self.assertTrue(next(chunks).startswith("\ufeff订单号,"))
+
+
+class DailyRevenueRollupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        pvg = Airport.objects.create(code="PVG", name="浦东国际机场", city="上海", country="中国")
+        pek = Airport.objects.create(code="PEK", name="首都国际机场", city="北京", country="中国")
+        flight = create_flight("MU5700", pvg, pek, timezone.now() + timedelta(days=3))
+        seat = flight.seats.get()
+        user = User.objects.create_user("payer", password="pw123456")
+        profile = PassengerProfile.objects.create(
+            user=user, real_name="付款人", id_card_no="1", phone="1", email="payer@example.com"
+        )
+        cls.order = TicketOrder.objects.create(
+            order_no="REV0001",
+            user=user,
+            profile=profile,
+            flight=flight,
+            seat=seat,
+            ticket_price=Decimal("800.00"),
+            tax=Decimal("40.00"),
+            total_amount=Decimal("840.00"),
+        )
+
+    def test_rollup_applied_after_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.assertTrue(advance(self.order, OrderStatus.RESERVED, OrderStatus.PAID))
+        # 支付事务里不碰汇总行
+        self.assertFalse(DailyRevenue.objects.exists())
+        self.assertEqual(len(callbacks), 1)
+        callbacks[0]()
+        row = DailyRevenue.objects.get(day=timezone.localdate())
+        self.assertEqual((row.paid_amount, row.paid_count), (Decimal("840.00"), 1))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            transition([self.order.pk], OrderStatus.PAID, OrderStatus.REFUNDED, fee=Decimal("40.00"))
+        row.refresh_from_db()
+        self.assertEqual((row.paid_amount, row.paid_count), (Decimal("0.00"), 0))
+        self.assertEqual((row.refund_fee, row.refund_count), (Decimal("40.00"), 1))
+
+    def test_rolled_back_payment_is_not_counted(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            try:
+                with transaction.atomic():
+                    advance(self.order, OrderStatus.RESERVED, OrderStatus.PAID)
+                    raise RuntimeError("支付失败")
+            except RuntimeError:
+                pass
+        self.assertEqual(callbacks, [])
+        self.assertFalse(DailyRevenue.objects.exists())
+
+
+class RevenueReportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        pvg = Airport.objects.create(code="PVG", name="浦东国际机场", city="上海", country="中国")
+        pek = Airport.objects.create(code="PEK", name="首都国际机场", city="北京", country="中国")
+        flight = create_flight("MU5900", pvg, pek, timezone.now() + timedelta(days=3))
+        seat = flight.seats.get()
+        def at(day, hour):
+            return timezone.make_aware(datetime.combine(day, time(hour, 30)))
+
+        # 3 月 30 日（周日，Q1）支付、4 月 1 日凌晨（周二，Q2）退票的订单应计入退票那天；
+        # 北京时间 00:30 在 UTC 仍是前一天，顺带检查按本地日期分桶
+        orders = [
+            ("RPT1", OrderStatus.REFUNDED, at(date(2025, 3, 30), 10), at(date(2025, 4, 1), 0), "30.00"),
+            ("RPT2", OrderStatus.PAID, at(date(2025, 3, 31), 0), None, "0"),
+            ("RPT3", OrderStatus.REFUNDING, at(date(2025, 4, 2), 23), None, "0"),
+            ("RPT4", OrderStatus.PAID, at(date(2025, 3, 30), 23), None, "0"),
+        ]
+        for order_no, status, paid_at, refunded_at, fee in orders:
+            # 同一乘机人同一航班只能有一个有效订单，每个订单各用一个乘机人
+            user = User.objects.create_user(order_no)
+            profile = PassengerProfile.objects.create(
+                user=user,
+                real_name="报表", id_card_no=order_no, phone="1", email="rpt@example.com"
+            )
+            TicketOrder.objects.create(
+                order_no=order_no,
+                user=user,
+                profile=profile,
+                flight=flight,
+                seat=seat,
+                status=status,
+                ticket_price=Decimal("800.00"),
+                total_amount=Decimal("840.00"),
+                paid_at=paid_at,
+                refunded_at=refunded_at,
+                fee=Decimal(fee),
+            )
+        backfill()
+        cls.staff = User.objects.create_user("report_staff", password="pw123456", is_staff=True)
+
+    @staticmethod
+    def figures(rows):
+        return [(row["period"], row["paid"], row["refund_fee"], row["orders"]) for row in rows]
+
+    def test_rollup_and_split_agree(self):
+        start, end = date(2025, 3, 1), date(2025, 5, 1)
+        for granularity in ["day", "week", "quarter"]:
+            with self.subTest(granularity=granularity):
+                rollup = reports.revenue_report(start, end, granularity)
+                split = reports.revenue_report(start, end, granularity, "airline")
+                self.assertEqual(self.figures(split), self.figures(rollup))
+
+        quarters = self.figures(reports.revenue_report(start, end, "quarter"))
+        self.assertEqual(
+            quarters,
+            [
+                (date(2025, 1, 1), Decimal("1680.00"), Decimal("0.00"), 2),
+                (date(2025, 4, 1), Decimal("840.00"), Decimal("30.00"), 2),
+            ],
+        )
+        days = self.figures(reports.revenue_report(start, end, "day"))
+        self.assertIn((date(2025, 4, 1), Decimal("0.00"), Decimal("30.00"), 1), days)
+
+    def test_extreme_dates_fall_back(self):
+        self.client.force_login(self.staff)
+        today = timezone.localdate()
+        for params in [
+            {"end": "9999-12-31"},
+            {"start": "0001-01-01"},
+            {"start": "0001-01-01", "end": "9999-12-31", "split": "route"},
+        ]:
+            with self.subTest(params=params):
+                response = self.client.get(reverse("dashboard:revenue_report"), params)
+                self.assertEqual(response.status_code, 200)
+                self.assertLessEqual(response.context["end"], today)
+                self.assertGreater(response.context["start"], date.min)
 
-# Create your tests here.
+    def test_wide_range_allowed(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(
+            reverse("dashboard:revenue_report"),
+            {"start": "0001-01-02", "end": "9999-12-30", "granularity": "quarter", "split": "route"},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["summary"]["orders"], 4)
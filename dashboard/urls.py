@@ -8,6 +8,8 @@ app_name = "dashboard"
 urlpatterns = [
     path("login/", views.admin_login, name="admin_login"),
     path("revenue/", views.revenue_overview, name="revenue_overview"),
+    path("revenue/report/", views.revenue_report, name="revenue_report"),
+    path("export/<str:kind>/", views.export_records, name="export_records"),
 
     # 航班管理
     path("flights/", views.flight_list, name="flight_list"),
@@ -5,69 +5,22 @@ from datetime import date, timedelta
 
 from django.contrib.admin.views.decorators import staff_member_required
 from django.shortcuts import render, redirect, get_object_or_404
-from django.db.models import Sum
 from django.contrib.auth import login
 from django.contrib.auth.forms import AuthenticationForm
         # django.contrib 导入
 from django.contrib import messages
+from django.db import transaction
 from django.db.models.deletion import ProtectedError
+from django.http import Http404, HttpResponseBadRequest, StreamingHttpResponse
 from django.utils import timezone
 
-from orders.models import TicketOrder, OrderStatus
-from flights.models import Flight, FlightSeat, CabinClass, FlightStatus
-from flights.forms import FlightAdminForm
+from air_ticket_system.cursors import InvalidCursor
+from flights.models import Flight, CabinClass
+from flights.seat_sync import sync_cabin_seats
+from flights.forms import FlightAdminForm, FlightFilterForm
 
-
-# --------------------- 舱位价格倍数 ---------------------
-
-CABIN_MULTIPLIERS = {
-    CabinClass.ECONOMY: Decimal("1.0"),
-    CabinClass.BUSINESS: Decimal("1.5"),
-    CabinClass.FIRST: Decimal("2.0"),
-}
-
-
-def _sync_cabin_seat(flight, cabin_class, new_available: int):
-    """
-    同步某个舱位的“剩余座位数”和价格。
-
-    约定：
-    - new_available >= 0
-    - total_seats 始终保持 = 已售出票数 + 剩余座位数
-    """
-    if new_available is None:
-        new_available = 0
-    if new_available < 0:
-        new_available = 0
-
-    qs = FlightSeat.objects.filter(flight=flight, cabin_class=cabin_class)
-    multiplier = CABIN_MULTIPLIERS[cabin_class]
-    price = (flight.base_price * multiplier).quantize(Decimal("0.01"))
-
-    if not qs.exists():
-        # 之前没有这个舱位记录
-        if new_available == 0:
-            # 仍然没有座位，直接不创建即可
-            return
-        FlightSeat.objects.create(
-            flight=flight,
-            cabin_class=cabin_class,
-            total_seats=new_available,
-            available_seats=new_available,
-            price=price,
-        )
-        return
-
-    # 已经存在该舱位记录
-    seat = qs.get()
-    sold = TicketOrder.objects.filter(
-        flight=flight, seat=seat, status=OrderStatus.PAID
-    ).count()
-
-    seat.total_seats = sold + new_available
-    seat.available_seats = new_available
-    seat.price = price
-    seat.save()
+from . import exports, reports
+from .listing import flight_page
 
 
 # --------------------- 管理员登录 ---------------------
@@ -114,31 +67,34 @@ def revenue_overview(request):
     """
     today = timezone.localdate()
 
-    # 年份选择
+    # 年份选择；统计区间的右端是下一年 1 月 1 日，所以年份要小于 date.max.year
     try:
         selected_year = int(request.GET.get("year") or today.year)
     except ValueError:
         selected_year = today.year
+    if not date.min.year <= selected_year < date.max.year:
+        selected_year = today.year
 
-    # 月份选择（格式 YYYY-MM）
+    # 月份选择（格式 YYYY-MM），月份不在 1-12 或年份越界时回退到当前月份
+    month_year, month_month = today.year, today.month
     month_param = request.GET.get("month")
     if month_param:
         try:
             y, m = [int(p) for p in month_param.split("-")]
-            selected_month = f"{y:04d}-{m:02d}"
-            month_year, month_month = y, m
-        except Exception:
-            month_year, month_month = today.year, today.month
-            selected_month = f"{month_year:04d}-{month_month:02d}"
-    else:
-        month_year, month_month = today.year, today.month
-        selected_month = f"{month_year:04d}-{month_month:02d}"
+        except ValueError:
+            pass
+        else:
+            if 1 <= m <= 12 and date.min.year <= y < date.max.year:
+                month_year, month_month = y, m
+    selected_month = f"{month_year:04d}-{month_month:02d}"
 
     # 周起始日期选择（日期控件）
     week_param = request.GET.get("week_start")
     if week_param:
         try:
             week_start = date.fromisoformat(week_param)
+            if week_start > date.max - timedelta(days=7):
+                raise ValueError(week_param)
         except ValueError:
             week_start = today - timedelta(days=today.weekday())
     else:
@@ -147,61 +103,37 @@ def revenue_overview(request):
     selected_week_start = week_start.isoformat()
     week_end = week_start + timedelta(days=7)
 
-    paid_orders = TicketOrder.objects.filter(status=OrderStatus.PAID)
-    refunded_orders = TicketOrder.objects.filter(status=OrderStatus.REFUNDED)
-
-    def _sum_paid(**kwargs):
-        return (
-            paid_orders.filter(**kwargs)
-            .aggregate(total=Sum("total_amount"))
-            .get("total")
-            or Decimal("0.00")
-        )
-
-    def _sum_refund_fee(**kwargs):
-        return (
-            refunded_orders.filter(**kwargs)
-            .aggregate(total=Sum("fee"))
-            .get("total")
-            or Decimal("0.00")
-        )
+    # 每个统计区间一条查询（见 dashboard.reports），数据来自每日营收汇总表
+    year_start = date(selected_year, 1, 1)
+    year_end = date(selected_year + 1, 1, 1)
+    monthly = reports.series(
+        reports.revenue_report(year_start, year_end, "month"), year_start, year_end, "month"
+    )
+    daily = reports.series(
+        reports.revenue_report(week_start, week_end, "day"), week_start, week_end, "day"
+    )
 
     # 按年合计
-    yearly_total = _sum_paid(paid_at__year=selected_year) + _sum_refund_fee(
-        refunded_at__year=selected_year
-    )
+    yearly_total = sum((total for _, total in monthly), Decimal("0.00"))
 
     # 按月合计
-    monthly_total = _sum_paid(
-        paid_at__year=month_year, paid_at__month=month_month
-    ) + _sum_refund_fee(refunded_at__year=month_year, refunded_at__month=month_month)
+    month_start = date(month_year, month_month, 1)
+    next_month = (month_start + timedelta(days=31)).replace(day=1)
+    monthly_total = sum(
+        (row["total"] for row in reports.revenue_report(month_start, next_month, "month")),
+        Decimal("0.00"),
+    )
 
     # 按周合计（[week_start, week_end)）
-    weekly_total = _sum_paid(
-        paid_at__date__gte=week_start, paid_at__date__lt=week_end
-    ) + _sum_refund_fee(
-        refunded_at__date__gte=week_start, refunded_at__date__lt=week_end
-    )
+    weekly_total = sum((total for _, total in daily), Decimal("0.00"))
 
     # 月度营收分布（用于柱状图）
-    monthly_chart_labels = [f"{m}月" for m in range(1, 13)]
-    monthly_chart_data = []
-    for m in range(1, 13):
-        month_total = _sum_paid(paid_at__year=selected_year, paid_at__month=m) + _sum_refund_fee(
-            refunded_at__year=selected_year, refunded_at__month=m
-        )
-        monthly_chart_data.append(float(month_total))
+    monthly_chart_labels = [f"{period.month}月" for period, _ in monthly]
+    monthly_chart_data = [float(total) for _, total in monthly]
 
     # 本周每天营收（用于补充趋势展示）
-    weekly_chart_labels = []
-    weekly_chart_data = []
-    for i in range(7):
-        current_day = week_start + timedelta(days=i)
-        weekly_chart_labels.append(current_day.strftime("%m-%d"))
-        daily_total = _sum_paid(paid_at__date=current_day) + _sum_refund_fee(
-            refunded_at__date=current_day
-        )
-        weekly_chart_data.append(float(daily_total))
+    weekly_chart_labels = [period.strftime("%m-%d") for period, _ in daily]
+    weekly_chart_data = [float(total) for _, total in daily]
 
     return render(
         request,
@@ -222,6 +154,94 @@ def revenue_overview(request):
     )
 
 
+def _parse_date(value, default):
+    """
+    解析 YYYY-MM-DD；格式错误，或是 date.min / date.max 当天（前后再加减一天、
+    换算时区都会溢出）时返回 default。
+    """
+    try:
+        day = date.fromisoformat(value) if value else default
+    except ValueError:
+        return default
+    if day is not None and not date.min < day < date.max:
+        return default
+    return day
+
+
+@staff_member_required
+def revenue_report(request):
+    """
+    营收报表：任意日期区间（含首尾两天），按日 / 周 / 月 / 季度汇总，
+    可按航空公司或航线拆分。默认最近 30 天按日汇总。
+    """
+    today = timezone.localdate()
+    start = _parse_date(request.GET.get("start"), today - timedelta(days=29))
+    end = _parse_date(request.GET.get("end"), today)
+    if end < start:
+        start, end = end, start
+    granularity = request.GET.get("granularity")
+    if granularity not in reports.GRANULARITIES:
+        granularity = "day"
+    split = request.GET.get("split") or None
+    if split not in reports.SPLITS:
+        split = None
+
+    rows = reports.revenue_report(start, end + timedelta(days=1), granularity, split)
+    summary = {
+        "paid": sum((row["paid"] for row in rows), Decimal("0.00")),
+        "refund_fee": sum((row["refund_fee"] for row in rows), Decimal("0.00")),
+        "orders": sum(row["orders"] for row in rows),
+    }
+    summary["total"] = summary["paid"] + summary["refund_fee"]
+
+    return render(
+        request,
+        "dashboard/revenue_report.html",
+        {
+            "rows": rows,
+            "summary": summary,
+            "start": start,
+            "end": end,
+            "granularity": granularity,
+            "split": split or "",
+            "granularities": reports.GRANULARITIES,
+            "splits": {"": "不拆分", "airline": "按航空公司", "route": "按航线"},
+        },
+    )
+
+
+@staff_member_required
+def export_records(request, kind):
+    """
+    流式导出订单（orders）或退票记录（refunds），CSV / NDJSON。
+    参数：format=csv|ndjson，start / end（本地日期，含首尾），status。
+    """
+    if kind not in exports.EXPORTS:
+        raise Http404("不支持的导出类型")
+    fmt = request.GET.get("format") or "csv"
+    if fmt not in exports.STREAMERS:
+        return HttpResponseBadRequest("format 只能是 csv 或 ndjson")
+    status = request.GET.get("status") or None
+    if status and status not in exports.EXPORTS[kind][3].values:
+        return HttpResponseBadRequest("status 不合法")
+    start = _parse_date(request.GET.get("start"), None)
+    end = _parse_date(request.GET.get("end"), None)
+    # 日期写错时不能悄悄导出全部记录
+    if (request.GET.get("start") and start is None) or (request.GET.get("end") and end is None):
+        return HttpResponseBadRequest("start / end 须为有效的 YYYY-MM-DD 日期")
+    if start and end and end < start:
+        return HttpResponseBadRequest("end 不能早于 start")
+
+    columns, rows = exports.export_rows(kind, start, end, status)
+    response = StreamingHttpResponse(
+        exports.STREAMERS[fmt](columns, rows), content_type=exports.CONTENT_TYPES[fmt]
+    )
+    suffix = "-".join(str(d) for d in (start, end) if d)
+    filename = f"{kind}-{suffix}.{fmt}" if suffix else f"{kind}.{fmt}"
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+
 # --------------------- 航班管理 ---------------------
 
 
@@ -229,18 +249,37 @@ def revenue_overview(request):
 def flight_list(request):
     """
     航班列表：管理员在这里查看 / 管理所有航班
+    按起飞时间游标分页，可按状态 / 机场 / 航空公司 / 起飞日期筛选，
+    每行带已售、余票和上座率
     """
-    now = timezone.now()
-    cutoff = now + timedelta(hours=1)
-    Flight.objects.filter(status=FlightStatus.ON_SALE, depart_time__lte=cutoff).update(
-        status=FlightStatus.FINISHED
-    )
+    form = FlightFilterForm(request.GET or None)
+    filters = form.cleaned_data if form.is_valid() else {}
+    cursor = request.GET.get("cursor")
+    try:
+        flights, next_cursor = flight_page(filters, cursor)
+    except InvalidCursor:
+        cursor = None
+        flights, next_cursor = flight_page(filters)
+
+    params = request.GET.copy()
+    params.pop("cursor", None)
+    first_query = params.urlencode()
+    next_query = None
+    if next_cursor:
+        params["cursor"] = next_cursor
+        next_query = params.urlencode()
 
-    flights = (
-        Flight.objects.select_related("depart_airport", "arrive_airport")
-        .order_by("depart_time")
+    return render(
+        request,
+        "dashboard/flight_list.html",
+        {
+            "form": form,
+            "flights": flights,
+            "first_query": first_query,
+            "next_query": next_query,
+            "is_first_page": not cursor,
+        },
     )
-    return render(request, "dashboard/flight_list.html", {"flights": flights})
 
 
 @staff_member_required
@@ -253,15 +292,21 @@ def flight_create(request):
     if request.method == "POST":
         form = FlightAdminForm(request.POST)
         if form.is_valid():
-            flight = form.save()
-
             econ = form.cleaned_data.get("economy_seats") or 0
             biz = form.cleaned_data.get("business_seats") or 0
             fst = form.cleaned_data.get("first_seats") or 0
 
-            _sync_cabin_seat(flight, CabinClass.ECONOMY, econ)
-            _sync_cabin_seat(flight, CabinClass.BUSINESS, biz)
-            _sync_cabin_seat(flight, CabinClass.FIRST, fst)
+            # 航班和舱位在同一事务中保存
+            with transaction.atomic():
+                flight = form.save()
+                sync_cabin_seats(
+                    flight,
+                    {
+                        CabinClass.ECONOMY: econ,
+                        CabinClass.BUSINESS: biz,
+                        CabinClass.FIRST: fst,
+                    },
+                )
 
             messages.success(request, "航班创建成功")
             return redirect("dashboard:flight_list")
@@ -286,15 +331,21 @@ def flight_update(request, pk):
     if request.method == "POST":
         form = FlightAdminForm(request.POST, instance=flight)
         if form.is_valid():
-            flight = form.save()
-
             econ = form.cleaned_data.get("economy_seats") or 0
             biz = form.cleaned_data.get("business_seats") or 0
             fst = form.cleaned_data.get("first_seats") or 0
 
-            _sync_cabin_seat(flight, CabinClass.ECONOMY, econ)
-            _sync_cabin_seat(flight, CabinClass.BUSINESS, biz)
-            _sync_cabin_seat(flight, CabinClass.FIRST, fst)
+            # 航班和舱位在同一事务中保存
+            with transaction.atomic():
+                flight = form.save()
+                sync_cabin_seats(
+                    flight,
+                    {
+                        CabinClass.ECONOMY: econ,
+                        CabinClass.BUSINESS: biz,
+                        CabinClass.FIRST: fst,
+                    },
+                )
 
             messages.success(request, "航班信息已更新")
             return redirect("dashboard:flight_list")
@@ -0,0 +1,95 @@
+# flights/airport_resolver.py
+"""
+进程内机场解析器：把用户输入的城市 / 机场名 / 三字码解析成机场 ID 集合。
+
+Airport 表很小且很少变化，整表加载到内存后：
+- 精确匹配：城市名、机场名、三字码（统一小写、去空白）
+- 前缀匹配：如“浦东”可以匹配“浦东国际机场”，“pe”可以匹配“PEK”
+搜索时只需要 depart_airport_id IN (...)，不再对 Airport 做 LIKE 扫描。
+
+机场保存 / 删除时由 signals 调用 invalidate()，下次解析时自动重建；
+多进程部署下其他进程最多在 MAX_AGE 秒后重建。
+"""
+import bisect
+import threading
+import time
+import unicodedata
+
+from asgiref.sync import sync_to_async
+
+from .models import Airport
+
+MAX_AGE = 300  # 秒
+
+
+def normalize(text: str) -> str:
+    text = unicodedata.normalize("NFKC", text or "").casefold()
+    text = "".join(text.split())
+    # “上海市” 与 “上海” 视为同一城市
+    if len(text) > 1 and text.endswith("市"):
+        text = text[:-1]
+    return text
+
+
+class AirportResolver:
+    def __init__(self, max_age=MAX_AGE):
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._keys: list[str] = []
+        self._ids: dict[str, frozenset] = {}
+        self._built_at = None
+
+    def build(self):
+        mapping: dict[str, set] = {}
+        for airport_id, code, name, city in Airport.objects.values_list(
+            "id", "code", "name", "city"
+        ):
+            for raw in (code, name, city):
+                key = normalize(raw)
+                if key:
+                    mapping.setdefault(key, set()).add(airport_id)
+
+        ids = {key: frozenset(v) for key, v in mapping.items()}
+        keys = sorted(ids)
+        with self._lock:
+            self._ids, self._keys = ids, keys
+            self._built_at = time.monotonic()
+
+    def invalidate(self):
+        with self._lock:
+            self._built_at = None
+
+    def is_fresh(self):
+        built_at = self._built_at
+        return built_at is not None and time.monotonic() - built_at <= self.max_age
+
+    def _ensure_fresh(self):
+        if not self.is_fresh():
+            self.build()
+
+    def resolve(self, text: str) -> frozenset:
+        """
+        返回匹配的机场 ID 集合；没有匹配时返回空集合。
+        """
+        query = normalize(text)
+        if not query:
+            return frozenset()
+        self._ensure_fresh()
+
+        keys, ids = self._keys, self._ids
+        matched = set()
+        start = bisect.bisect_left(keys, query)
+        for key in keys[start:]:
+            if not key.startswith(query):
+                break
+            matched |= ids[key]
+        return frozenset(matched)
+
+    async def aresolve(self, text: str) -> frozenset:
+        """resolve 的异步版本：需要重建时在线程中读库，其余情况纯内存计算。"""
+        if not self.is_fresh():
+            await sync_to_async(self.build)()
+        return self.resolve(text)
+
+
+airport_resolver = AirportResolver()
@@ -9,3 +9,6 @@ from django.apps import AppConfig
 class FlightsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "flights"
+
+    def ready(self):
+        from . import signals  # noqa: F401  注册 Flight / FlightSeat 变更信号
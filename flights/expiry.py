@@ -0,0 +1,32 @@
+# flights/expiry.py
+"""
+航班停售：把起飞前 1 小时内仍在售的航班批量标记为已结束。
+
+由 expire_flights 管理命令定时执行，读请求只按时间条件过滤，不再写库。
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Flight, FlightStatus, FlightSearchIndex, SALE_CUTOFF
+from .search_index import invalidate_entries
+
+
+def expire_flights(batch_size=500, now=None):
+    """
+    分批停售航班，每批一个短事务，避免一次 UPDATE 锁住大量行。
+    返回本次停售的航班数。
+    """
+    cutoff = (now or timezone.now()) + SALE_CUTOFF
+    pending = Flight.objects.filter(status=FlightStatus.ON_SALE, depart_time__lte=cutoff)
+
+    total = 0
+    while True:
+        ids = list(pending.order_by("depart_time").values_list("id", flat=True)[:batch_size])
+        if not ids:
+            return total
+        with transaction.atomic():
+            total += pending.filter(pk__in=ids).update(status=FlightStatus.FINISHED)
+            # update() 不触发信号，这里顺带清理索引行和搜索缓存
+            entries = FlightSearchIndex.objects.filter(flight_id__in=ids)
+            invalidate_entries(entries)
+            entries.delete()
@@ -0,0 +1,92 @@
+# flights/fare_calendar.py
+"""
+低价日历：某条航线在出发日期前后 ±N 天内，每天的最低可售票价。
+
+直接在 FlightSearchIndex 上按 depart_date 分组取 Min(min_price)，一次查询得到整个窗口；
+结果按窗口内每天的库存代数缓存，任一天库存变化都会失效。
+"""
+from datetime import timedelta
+
+from django.db.models import Count, Min
+from django.utils import timezone
+
+from . import search_cache
+from .models import FlightSearchIndex, SALE_CUTOFF
+
+WINDOW_DAYS = 3
+MAX_WINDOW_DAYS = 15
+
+
+def _queryset(depart_ids, arrive_ids, start, end):
+    qs = FlightSearchIndex.objects.filter(
+        arrive_airport_id__in=arrive_ids,
+        depart_date__range=(start, end),
+        depart_time__gt=timezone.now() + SALE_CUTOFF,
+    )
+    if depart_ids is not None:
+        qs = qs.filter(depart_airport_id__in=depart_ids)
+    return (
+        qs.values("depart_date")
+        .annotate(min_price=Min("min_price"), flights=Count("flight_id"))
+        .order_by("depart_date")
+    )
+
+
+def _window(center, days):
+    """计算日期窗口，今天之前的日期不计入。"""
+    days = max(0, min(days, MAX_WINDOW_DAYS))
+    start = max(center - timedelta(days=days), timezone.localdate())
+    end = center + timedelta(days=days)
+    return [start + timedelta(days=i) for i in range((end - start).days + 1)]
+
+
+def _build(window, by_day):
+    prices = [price for price, _ in by_day.values()]
+    cheapest = min(prices) if prices else None
+    calendar = []
+    for day in window:
+        price, count = by_day.get(day, (None, 0))
+        calendar.append(
+            {
+                "date": day,
+                "min_price": price,
+                "flights": count,
+                "is_cheapest": price is not None and price == cheapest,
+            }
+        )
+    return calendar
+
+
+def fare_calendar(depart_ids, arrive_ids, center, days=WINDOW_DAYS):
+    """
+    返回 [{"date", "min_price", "flights", "is_cheapest"}, ...]，窗口内每天一项；
+    没有可售航班的日期 min_price 为 None。今天之前的日期不计入窗口。
+    """
+    window = _window(center, days)
+    if not window:
+        return []
+
+    def compute():
+        rows = _queryset(depart_ids, arrive_ids, window[0], window[-1])
+        return {row["depart_date"]: (row["min_price"], row["flights"]) for row in rows}
+
+    by_day = search_cache.get_or_compute_window(
+        "calendar", depart_ids, arrive_ids, window, compute
+    )
+    return _build(window, by_day)
+
+
+async def afare_calendar(depart_ids, arrive_ids, center, days=WINDOW_DAYS):
+    """fare_calendar 的异步版本。"""
+    window = _window(center, days)
+    if not window:
+        return []
+
+    async def compute():
+        rows = _queryset(depart_ids, arrive_ids, window[0], window[-1])
+        return {row["depart_date"]: (row["min_price"], row["flights"]) async for row in rows}
+
+    by_day = await search_cache.aget_or_compute_window(
+        "calendar", depart_ids, arrive_ids, window, compute
+    )
+    return _build(window, by_day)
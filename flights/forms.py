@@ -2,7 +2,7 @@
 from django import forms
 from django.utils import timezone
 
-from .models import Flight, FlightSeat, CabinClass
+from .models import Flight, FlightSeat, FlightStatus, CabinClass
 
 
 class FlightSearchForm(forms.Form):
@@ -157,3 +157,39 @@ class FlightAdminForm(forms.ModelForm):
                 raise forms.ValidationError("至少为一个舱位设置大于 0 的座位数。")
 
         return cleaned
+
+
+class FlightFilterForm(forms.Form):
+    """
+    后台航班列表筛选（全部可选）：售卖状态、机场三字码（出发或到达）、航空公司、起飞日期
+    """
+    status = forms.ChoiceField(
+        label="状态",
+        required=False,
+        choices=[("", "全部状态")] + list(FlightStatus.choices),
+        widget=forms.Select(attrs={"class": "form-select"}),
+    )
+    airport = forms.CharField(
+        label="机场三字码",
+        max_length=10,
+        required=False,
+        widget=forms.TextInput(attrs={"class": "form-control", "placeholder": "如 PVG"}),
+    )
+    airline = forms.CharField(
+        label="航空公司",
+        max_length=50,
+        required=False,
+        widget=forms.TextInput(attrs={"class": "form-control"}),
+    )
+    depart_date = forms.DateField(
+        label="起飞日期",
+        required=False,
+        input_formats=["%Y-%m-%d"],
+        widget=forms.DateInput(format="%Y-%m-%d", attrs={"type": "date", "class": "form-control"}),
+    )
+
+    def clean_airport(self):
+        return self.cleaned_data["airport"].strip().upper()
+
+    def clean_airline(self):
+        return self.cleaned_data["airline"].strip()
@@ -0,0 +1,214 @@
+# flights/inventory.py
+"""
+舱位库存扣减 / 归还。
+
+不再对 FlightSeat 行加 select_for_update 锁，而是直接执行条件更新：
+
+    UPDATE flights_flightseat SET available_seats = available_seats - n
+    WHERE id = ? AND available_seats >= n
+
+受影响行数为 1 表示扣减成功，为 0 表示余票不足；整个过程只在 UPDATE
+执行期间持有行锁，不会让同一航班的下单请求在整个事务内排队。
+
+搜索索引只关心“航班是否有票”和最低可售票价，二者只在某个舱位的余票跨过 0
+（售罄或从售罄恢复）时才可能变化，所以只有这时才刷新索引，热门航班的每笔
+下单不会再去更新同一行索引。
+
+分片模式（FlightSeat.shard_count > 0）：把一个热门舱位的余票拆到 N 行
+FlightSeatShard 中，每次随机从某个分片扣减，并发请求分散到不同的行上。
+此时 FlightSeat.available_seats 只是汇总值，由 reconcile_shards() 定期回写
+（见 manage.py reconcile_seat_shards），搜索索引也随之刷新。
+"""
+import random
+
+from django.db import transaction
+from django.db.models import Case, F, OuterRef, Subquery, Sum, When
+from django.db.models.functions import Coalesce
+
+from .models import FlightSeat, FlightSeatShard
+from .search_index import schedule_refresh
+
+
+def take_seats(seat: FlightSeat, quantity=1) -> bool:
+    """
+    从舱位中扣减 quantity 个座位，余票不足时返回 False 且不做任何修改。
+    调用方应处于事务中：后续写订单失败时扣减会一并回滚。
+    """
+    if seat.shard_count:
+        return _take_sharded(seat, quantity)
+
+    seats = FlightSeat.objects.filter(pk=seat.pk)
+    # 扣减后仍有余票：索引不受影响
+    if seats.filter(available_seats__gt=quantity).update(
+        available_seats=F("available_seats") - quantity
+    ):
+        return True
+    if not seats.filter(available_seats__gte=quantity).update(
+        available_seats=F("available_seats") - quantity
+    ):
+        return False
+    # 舱位（多半）已售罄；update() 不触发 post_save，需要手动刷新搜索索引
+    schedule_refresh(seat.flight_id)
+    return True
+
+
+def release_seats(seat: FlightSeat, quantity=1):
+    """归还 quantity 个座位（取消 / 超时 / 退票）。"""
+    if seat.shard_count:
+        shard_no = random.randrange(seat.shard_count)
+        updated = FlightSeatShard.objects.filter(seat_id=seat.pk, shard_no=shard_no).update(
+            available_seats=F("available_seats") + quantity
+        )
+        if updated:
+            return
+        # 分片已被撤销（并发调用了 unshard_seat），退回到汇总行上
+
+    seats = FlightSeat.objects.filter(pk=seat.pk)
+    # 原本就有余票：索引不受影响
+    if seats.filter(available_seats__gt=0).update(available_seats=F("available_seats") + quantity):
+        return
+    # 从售罄恢复
+    seats.update(available_seats=F("available_seats") + quantity)
+    schedule_refresh(seat.flight_id)
+
+
+def release_many(counts):
+    """
+    批量归还座位：counts 为 {seat_id: 数量}，每个舱位只执行一条 UPDATE。
+    """
+    if not counts:
+        return
+    seats = FlightSeat.objects.filter(pk__in=counts).only("id", "flight_id", "shard_count")
+    for seat in seats:
+        release_seats(seat, counts[seat.pk])
+
+
+def _take_sharded(seat, quantity):
+    shards = FlightSeatShard.objects.filter(seat_id=seat.pk)
+    candidates = list(range(seat.shard_count))
+    random.shuffle(candidates)
+    for shard_no in candidates:
+        updated = shards.filter(shard_no=shard_no, available_seats__gte=quantity).update(
+            available_seats=F("available_seats") - quantity
+        )
+        if updated:
+            return True
+
+    if quantity == 1:
+        return False
+
+    # 单个分片不够时（团体订票），锁住全部分片后逐个凑齐；这种情况很少发生
+    locked = list(shards.select_for_update().filter(available_seats__gt=0).order_by("shard_no"))
+    if sum(s.available_seats for s in locked) < quantity:
+        return False
+    remaining = quantity
+    for shard in locked:
+        take = min(remaining, shard.available_seats)
+        shards.filter(pk=shard.pk).update(available_seats=F("available_seats") - take)
+        remaining -= take
+        if not remaining:
+            break
+    return True
+
+
+def with_live_availability(seats):
+    """
+    给舱位查询加上 live_available：分片舱位取各分片之和，其余直接取 available_seats。
+    与 available_seats() 结果相同，但只需一条查询。
+    """
+    return seats.annotate(
+        live_available=Case(
+            When(shard_count__gt=0, then=Coalesce(_shard_total(), 0)),
+            default=F("available_seats"),
+        )
+    )
+
+
+def available_seats(seat: FlightSeat) -> int:
+    """实时余票：分片模式下汇总各分片，否则直接返回 available_seats。"""
+    if not seat.shard_count:
+        return seat.available_seats
+    total = FlightSeatShard.objects.filter(seat_id=seat.pk).aggregate(total=Sum("available_seats"))
+    return total["total"] or 0
+
+
+def shard_seat(seat_id, shard_count, available=None):
+    """
+    把舱位余票平均拆分到 shard_count 个分片中；已经分片的舱位会先合并再重新拆分。
+    available 不为 None 时以它作为新的余票总数（后台直接修改座位数时使用）。
+    shard_count 为 0 时等同于 unshard_seat。
+    """
+    if shard_count <= 0:
+        return unshard_seat(seat_id)
+
+    with transaction.atomic():
+        seat = FlightSeat.objects.select_for_update().get(pk=seat_id)
+        collapsed = _collapse(seat)
+        if available is None:
+            available = collapsed
+        base, extra = divmod(available, shard_count)
+        FlightSeatShard.objects.bulk_create(
+            FlightSeatShard(seat=seat, shard_no=i, available_seats=base + (1 if i < extra else 0))
+            for i in range(shard_count)
+        )
+        FlightSeat.objects.filter(pk=seat_id).update(
+            available_seats=available, shard_count=shard_count
+        )
+        schedule_refresh(seat.flight_id)
+    return seat
+
+
+def unshard_seat(seat_id):
+    """合并分片，恢复为单行计数。"""
+    with transaction.atomic():
+        seat = FlightSeat.objects.select_for_update().get(pk=seat_id)
+        available = _collapse(seat)
+        FlightSeat.objects.filter(pk=seat_id).update(available_seats=available, shard_count=0)
+        schedule_refresh(seat.flight_id)
+    return seat
+
+
+def _collapse(seat):
+    """删除全部分片并返回余票总数（调用方已锁住舱位行）。"""
+    if not seat.shard_count:
+        return seat.available_seats
+    shards = FlightSeatShard.objects.select_for_update().filter(seat_id=seat.pk)
+    available = sum(shards.values_list("available_seats", flat=True))
+    shards.delete()
+    return available
+
+
+def reconcile_shards(seat_ids=None):
+    """
+    把分片余票之和回写到 FlightSeat.available_seats，并刷新对应航班的搜索索引。
+    seat_ids 为 None 时处理所有分片舱位。返回有变化的舱位数。
+    """
+    seats = FlightSeat.objects.filter(shard_count__gt=0)
+    if seat_ids is not None:
+        seats = seats.filter(pk__in=seat_ids)
+
+    total = _shard_total()
+    stale = seats.annotate(shard_total=Coalesce(total, 0)).exclude(
+        available_seats=F("shard_total")
+    )
+    changed = list(stale.values_list("pk", "flight_id"))
+    if not changed:
+        return 0
+
+    with transaction.atomic():
+        FlightSeat.objects.filter(pk__in=[pk for pk, _ in changed]).update(
+            available_seats=Coalesce(total, 0)
+        )
+        for flight_id in {flight_id for _, flight_id in changed}:
+            schedule_refresh(flight_id)
+    return len(changed)
+
+
+def _shard_total():
+    """各分片余票之和的子查询（关联外层 FlightSeat 的 pk）。"""
+    return Subquery(
+        FlightSeatShard.objects.filter(seat_id=OuterRef("pk"))
+        .values("seat_id")
+        .annotate(total=Sum("available_seats"))
+        .values("total")
+    )
@@ -0,0 +1,77 @@
+import statistics
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+
+def _fetch(url, timeout):
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as resp:
+            resp.read()
+            ok = resp.status == 200
+    except (urllib.error.URLError, TimeoutError, ConnectionError):
+        ok = False
+    return ok, time.perf_counter() - started
+
+
+class Command(BaseCommand):
+    help = (
+        "压测航班搜索：对比 WSGI（同步视图）与 ASGI（异步视图）的每秒请求数和延迟。"
+        "需要先分别启动两个服务，见 README"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--wsgi-url", default="http://127.0.0.1:8000/flights/search/")
+        parser.add_argument("--asgi-url", default="http://127.0.0.1:8001/flights/async/search/")
+        parser.add_argument("--arrive-city", default="北京")
+        parser.add_argument("--depart-city", default="")
+        parser.add_argument("--date", help="出发日期 YYYY-MM-DD，默认明天")
+        parser.add_argument("--concurrency", type=int, default=50)
+        parser.add_argument("--requests", type=int, default=2000)
+        parser.add_argument("--timeout", type=float, default=30)
+        parser.add_argument(
+            "--only", choices=("wsgi", "asgi"), help="只压测其中一个服务"
+        )
+
+    def _run(self, label, base_url, params, options):
+        url = f"{base_url}?{urllib.parse.urlencode(params)}"
+        total = options["requests"]
+        _fetch(url, options["timeout"])  # 预热：加载机场解析器、路由图等
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options["concurrency"]) as pool:
+            results = list(pool.map(lambda _: _fetch(url, options["timeout"]), range(total)))
+        elapsed = time.perf_counter() - started
+
+        latencies = sorted(t for ok, t in results if ok)
+        errors = total - len(latencies)
+        if not latencies:
+            self.stdout.write(self.style.ERROR(f"{label}: 全部请求失败，请确认服务已启动：{base_url}"))
+            return
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+        self.stdout.write(
+            f"{label:<5} {len(latencies) / elapsed:8.1f} req/s  "
+            f"p50={statistics.median(latencies) * 1000:7.1f}ms  "
+            f"p99={p99 * 1000:7.1f}ms  errors={errors}"
+        )
+
+    def handle(self, *args, **options):
+        day = options["date"] or (timezone.localdate() + timedelta(days=1)).isoformat()
+        params = {"arrive_city": options["arrive_city"], "depart_date": day}
+        if options["depart_city"]:
+            params["depart_city"] = options["depart_city"]
+
+        self.stdout.write(
+            f"并发 {options['concurrency']}，每个服务 {options['requests']} 个请求，参数 {params}"
+        )
+        if options["only"] != "asgi":
+            self._run("WSGI", options["wsgi_url"], params, options)
+        if options["only"] != "wsgi":
+            self._run("ASGI", options["asgi_url"], params, options)
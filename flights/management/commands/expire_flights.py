@@ -0,0 +1,12 @@
+from air_ticket_system.scheduler import PeriodicCommand
+from flights.expiry import expire_flights
+
+
+class Command(PeriodicCommand):
+    help = "将起飞前 1 小时内仍在售的航班批量标记为已结束（可用 --interval 常驻运行）"
+
+    def run_once(self, **options):
+        expired = expire_flights(batch_size=options["batch_size"])
+        if expired:
+            return f"已停售 {expired} 个航班"
+        return ""
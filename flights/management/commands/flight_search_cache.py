@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from flights import search_cache
+
+
+class Command(BaseCommand):
+    help = "查看航班搜索缓存的命中 / 未命中计数"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reset", action="store_true", help="输出后清零计数")
+
+    def handle(self, *args, **options):
+        if search_cache.is_process_local():
+            self.stderr.write(
+                self.style.WARNING(
+                    f"搜索缓存 {search_cache.CACHE_ALIAS!r} 是进程内缓存，这里只能看到本命令进程的计数；"
+                    "多进程部署请把它配置为 Redis / Memcached"
+                )
+            )
+        stats = search_cache.stats()
+        self.stdout.write(
+            f"hits={stats['hits']} misses={stats['misses']} hit_rate={stats['hit_rate']:.2%}"
+        )
+        if options["reset"]:
+            search_cache.reset_stats()
+            self.stdout.write(self.style.SUCCESS("计数已清零"))
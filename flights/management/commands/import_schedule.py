@@ -0,0 +1,55 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from flights.schedule import can_copy, import_schedule, load_rules, planned_flights
+
+
+class Command(BaseCommand):
+    help = (
+        "从 CSV / JSON 时刻表批量导入航班：按班期和有效期展开为每天的航班和舱位，"
+        "PostgreSQL 下使用 COPY，其他数据库分批 bulk_create；已存在的航班自动跳过。"
+        "字段说明见 flights/schedule.py"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="时刻表文件路径")
+        parser.add_argument("--format", choices=("csv", "json"), help="默认按扩展名判断")
+        parser.add_argument("--batch-size", type=int, default=5000, help="每批航班数，默认 5000")
+        parser.add_argument("--no-copy", action="store_true", help="PostgreSQL 下也使用 bulk_create")
+        parser.add_argument("--dry-run", action="store_true", help="只校验并统计将要导入的航班数")
+
+    def handle(self, *args, **options):
+        try:
+            rules = load_rules(options["path"], options["format"])
+        except (OSError, ValueError) as e:
+            # ScheduleError / JSON 解析错误都是 ValueError
+            raise CommandError(str(e))
+
+        if options["dry_run"]:
+            planned = sum(1 for _ in planned_flights(rules))
+            self.stdout.write(f"{len(rules)} 条规则，将导入 {planned} 个航班")
+            return
+
+        use_copy = can_copy() and not options["no_copy"]
+        started = time.perf_counter()
+        stats = import_schedule(rules, batch_size=options["batch_size"], use_copy=use_copy)
+        elapsed = time.perf_counter() - started
+
+        def rate(rows, seconds):
+            return f"{rows / seconds:.0f} 行/s" if seconds else "-"
+
+        self.stdout.write(
+            f"{len(rules)} 条规则（{'COPY' if use_copy else 'bulk_create'}）："
+            f"航班 {stats['flights']}，舱位 {stats['seats']}，"
+            f"写入 {stats['insert_seconds']:.2f}s（{rate(stats['flights'] + stats['seats'], stats['insert_seconds'])}）"
+        )
+        self.stdout.write(
+            f"搜索索引 {stats['index']} 行，{stats['index_seconds']:.2f}s"
+            f"（{rate(stats['index'], stats['index_seconds'])}）"
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"导入完成，共 {elapsed:.2f}s，{rate(stats['flights'], elapsed)}（按航班计）"
+            )
+        )
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from flights.search_index import rebuild_flight_index
+
+
+class Command(BaseCommand):
+    help = "重建航班搜索索引（FlightSearchIndex），用于首次部署回填或数据修复"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--flight",
+            type=int,
+            action="append",
+            dest="flight_ids",
+            help="只重建指定航班 ID，可重复传入",
+        )
+        parser.add_argument("--batch-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        written = rebuild_flight_index(
+            flight_ids=options["flight_ids"], batch_size=options["batch_size"]
+        )
+        self.stdout.write(self.style.SUCCESS(f"已写入 {written} 条航班索引"))
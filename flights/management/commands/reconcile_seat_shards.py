@@ -0,0 +1,12 @@
+from air_ticket_system.scheduler import PeriodicCommand
+from flights.inventory import reconcile_shards
+
+
+class Command(PeriodicCommand):
+    help = "把分片舱位的余票汇总回写到 FlightSeat 并刷新搜索索引（可用 --interval 常驻运行）"
+
+    def run_once(self, **options):
+        changed = reconcile_shards()
+        if changed:
+            return f"已回写 {changed} 个分片舱位的余票"
+        return ""
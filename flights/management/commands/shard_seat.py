@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from flights.inventory import shard_seat
+from flights.models import FlightSeat
+
+
+class Command(BaseCommand):
+    help = "把热门舱位的库存拆分为多个分片以提高并发下单吞吐量；--shards 0 表示合并回单行"
+
+    def add_arguments(self, parser):
+        parser.add_argument("seat_ids", nargs="+", type=int, help="FlightSeat ID")
+        parser.add_argument("--shards", type=int, default=8, help="分片数，默认 8")
+
+    def handle(self, *args, **options):
+        shards = options["shards"]
+        for seat_id in options["seat_ids"]:
+            try:
+                shard_seat(seat_id, shards)
+            except FlightSeat.DoesNotExist:
+                raise CommandError(f"舱位 {seat_id} 不存在")
+            if shards > 0:
+                self.stdout.write(self.style.SUCCESS(f"舱位 {seat_id} 已拆分为 {shards} 个分片"))
+            else:
+                self.stdout.write(self.style.SUCCESS(f"舱位 {seat_id} 已合并为单行库存"))
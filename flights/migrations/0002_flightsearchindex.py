@@ -0,0 +1,58 @@
+# Generated by Django 4.2.30 on 2026-10-17 01:41
+
+from django.db import migrations, models
+from django.db.models import Min, Sum
+from django.utils import timezone
+import django.db.models.deletion
+
+
+def backfill_search_index(apps, schema_editor):
+    Flight = apps.get_model("flights", "Flight")
+    FlightSearchIndex = apps.get_model("flights", "FlightSearchIndex")
+    rows = (
+        Flight.objects.filter(status="ON_SALE", seats__available_seats__gt=0)
+        .values("id", "depart_airport_id", "arrive_airport_id", "depart_time")
+        .annotate(min_price=Min("seats__price"), available=Sum("seats__available_seats"))
+        .order_by()
+    )
+    FlightSearchIndex.objects.bulk_create(
+        [
+            FlightSearchIndex(
+                flight_id=row["id"],
+                depart_airport_id=row["depart_airport_id"],
+                arrive_airport_id=row["arrive_airport_id"],
+                depart_date=timezone.localtime(row["depart_time"]).date(),
+                depart_time=row["depart_time"],
+                min_price=row["min_price"],
+                available_seats=row["available"],
+            )
+            for row in rows.iterator(chunk_size=2000)
+        ],
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flights', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FlightSearchIndex',
+            fields=[
+                ('flight', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_entry', serialize=False, to='flights.flight')),
+                ('depart_date', models.DateField()),
+                ('depart_time', models.DateTimeField()),
+                ('min_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('available_seats', models.PositiveIntegerField()),
+                ('arrive_airport', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='flights.airport')),
+                ('depart_airport', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='flights.airport')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['arrive_airport', 'depart_date', 'depart_airport'], name='flight_search_route_date')],
+            },
+        ),
+        migrations.RunPython(backfill_search_index, migrations.RunPython.noop),
+    ]
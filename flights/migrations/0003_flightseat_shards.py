@@ -0,0 +1,31 @@
+# Generated by Django 4.2.30 on 2026-10-17 01:49
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flights', '0002_flightsearchindex'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='flightseat',
+            name='shard_count',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='FlightSeatShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shard_no', models.PositiveSmallIntegerField()),
+                ('available_seats', models.PositiveIntegerField()),
+                ('seat', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shards', to='flights.flightseat')),
+            ],
+            options={
+                'unique_together': {('seat', 'shard_no')},
+            },
+        ),
+    ]
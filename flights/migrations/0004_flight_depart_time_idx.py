@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-17 02:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flights', '0003_flightseat_shards'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='flight',
+            index=models.Index(fields=['depart_time', 'id'], name='flight_depart_time_idx'),
+        ),
+    ]
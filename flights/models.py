@@ -1,7 +1,14 @@
 # from django.db import models
 
 # Create your models here.
+from datetime import timedelta
+from decimal import Decimal
+
 from django.db import models
+from django.utils import timezone
+
+# 起飞前 1 小时停止售票
+SALE_CUTOFF = timedelta(hours=1)
 
 
 class Airport(models.Model):
@@ -43,6 +50,29 @@ class Flight(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # 后台航班列表按 (depart_time, id) 游标分页
+            models.Index(fields=["depart_time", "id"], name="flight_depart_time_idx"),
+        ]
+
+    @property
+    def sale_status(self):
+        """
+        实际售卖状态：起飞前 1 小时内的在售航班视为已结束。
+        停售由定时任务批量落库，这里保证任务执行前页面显示也正确。
+        """
+        if (
+            self.status == FlightStatus.ON_SALE
+            and self.depart_time <= timezone.now() + SALE_CUTOFF
+        ):
+            return FlightStatus.FINISHED
+        return FlightStatus(self.status)
+
+    @property
+    def is_on_sale(self):
+        return self.sale_status == FlightStatus.ON_SALE
+
     def __str__(self):
         return f"{self.flight_no} {self.depart_airport.code}->{self.arrive_airport.code}"
 
@@ -53,15 +83,82 @@ class CabinClass(models.TextChoices):
     FIRST = "FIRST", "头等舱"
 
 
+# 舱位价格倍数：舱位票价 = 航班基础价 × 倍数
+CABIN_MULTIPLIERS = {
+    CabinClass.ECONOMY: Decimal("1.0"),
+    CabinClass.BUSINESS: Decimal("1.5"),
+    CabinClass.FIRST: Decimal("2.0"),
+}
+
+
+def cabin_price(base_price, cabin_class):
+    return (base_price * CABIN_MULTIPLIERS[cabin_class]).quantize(Decimal("0.01"))
+
+
 class FlightSeat(models.Model):
     flight = models.ForeignKey(Flight, related_name="seats", on_delete=models.CASCADE)
     cabin_class = models.CharField(max_length=20, choices=CabinClass.choices)
     total_seats = models.PositiveIntegerField()
     available_seats = models.PositiveIntegerField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
+    # > 0 时该舱位库存拆分到 FlightSeatShard 的多行中（热门航班抢票用），
+    # available_seats 变为汇总值，由 flights.inventory.reconcile_shards 定期回写
+    shard_count = models.PositiveSmallIntegerField(default=0)
 
     class Meta:
         unique_together = ("flight", "cabin_class")
 
     def __str__(self):
         return f"{self.flight.flight_no}-{self.get_cabin_class_display()}"
+
+
+class FlightSeatShard(models.Model):
+    """
+    舱位库存分片：把一个热门舱位的余票拆成 N 行，
+    并发下单时随机落在不同的行上，避免所有请求争抢同一行。
+    """
+    seat = models.ForeignKey(FlightSeat, related_name="shards", on_delete=models.CASCADE)
+    shard_no = models.PositiveSmallIntegerField()
+    available_seats = models.PositiveIntegerField()
+
+    class Meta:
+        unique_together = ("seat", "shard_no")
+
+    def __str__(self):
+        return f"{self.seat_id}#{self.shard_no}: {self.available_seats}"
+
+
+class FlightSearchIndex(models.Model):
+    """
+    航班搜索索引（反范式冗余表）：
+    - 每个“可售”航班一行：在售 且 至少一个舱位有余票
+    - 按 (到达机场, 当地出发日期, 出发机场) 建索引，搜索时只做一次索引范围查询
+    - 由 flights.search_index 在 Flight / FlightSeat 变更时增量维护
+    """
+    flight = models.OneToOneField(
+        Flight,
+        primary_key=True,
+        related_name="search_entry",
+        on_delete=models.CASCADE,
+    )
+    depart_airport = models.ForeignKey(
+        Airport, related_name="+", on_delete=models.CASCADE
+    )
+    arrive_airport = models.ForeignKey(
+        Airport, related_name="+", on_delete=models.CASCADE
+    )
+    depart_date = models.DateField()  # 按 TIME_ZONE（Asia/Shanghai）计算的当地日期
+    depart_time = models.DateTimeField()
+    min_price = models.DecimalField(max_digits=10, decimal_places=2)
+    available_seats = models.PositiveIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["arrive_airport", "depart_date", "depart_airport"],
+                name="flight_search_route_date",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.flight_id} {self.depart_date} ¥{self.min_price}"
@@ -0,0 +1,285 @@
+# flights/routing.py
+"""
+中转航班查询引擎。
+
+把未来一段时间内可售的航班（FlightSearchIndex）整体加载到内存，构造一张
+“时间展开图”：机场是节点，每个航班是一条 (出发事件 -> 到达事件) 的边，
+各机场的出港航班按起飞时间排序。查询时在内存里做 Dijkstra：
+- earliest_arrival：最早到达
+- cheapest：最低总票价
+两者都满足最短 / 最长中转时间，并限制经停次数（默认最多 2 次中转）。
+
+图按 MAX_AGE 秒定期重建，航班时刻变化时由 signals 调用 invalidate()；
+除了进程里的第一次构建，重建都在后台线程完成，期间查询继续使用旧图。
+余票和票价以重建时为准，真正下单时仍以 FlightSeat 为准。
+"""
+import bisect
+import heapq
+import logging
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from django.db import connection
+from django.utils import timezone
+
+from .models import FlightSearchIndex, SALE_CUTOFF
+
+logger = logging.getLogger(__name__)
+
+MAX_AGE = 60  # 秒
+HORIZON_DAYS = 30  # 只加载未来 30 天内起飞的航班
+MIN_CONNECTION = timedelta(minutes=45)
+MAX_CONNECTION = timedelta(hours=12)
+MAX_STOPS = 2
+
+Leg = namedtuple(
+    "Leg",
+    "flight_id flight_no airline depart_airport_id arrive_airport_id "
+    "depart_time arrive_time price",
+)
+
+# 图里只需要机场的三字码和城市（拼装中转方案时展示），随航段一起查出
+AirportInfo = namedtuple("AirportInfo", "code city")
+
+
+class Itinerary(namedtuple("Itinerary", "legs")):
+    @property
+    def total_price(self):
+        return sum(leg.price for leg in self.legs)
+
+    @property
+    def depart_time(self):
+        return self.legs[0].depart_time
+
+    @property
+    def arrive_time(self):
+        return self.legs[-1].arrive_time
+
+    @property
+    def stops(self):
+        return len(self.legs) - 1
+
+
+class RouteGraph:
+    def __init__(self, legs, airports):
+        self.airports = airports  # id -> AirportInfo
+        self._departures = {}  # airport_id -> [Leg]（按起飞时间排序）
+        self._times = {}  # airport_id -> [depart_time]，供 bisect 使用
+        for leg in sorted(legs, key=lambda l: l.depart_time):
+            self._departures.setdefault(leg.depart_airport_id, []).append(leg)
+        for airport_id, out in self._departures.items():
+            self._times[airport_id] = [leg.depart_time for leg in out]
+
+    @classmethod
+    def load(cls, horizon_days=HORIZON_DAYS):
+        now = timezone.now()
+        rows = (
+            FlightSearchIndex.objects.filter(
+                depart_time__gt=now + SALE_CUTOFF,
+                depart_time__lte=now + timedelta(days=horizon_days),
+            )
+            .values_list(
+                "flight_id",
+                "flight__flight_no",
+                "flight__airline",
+                "depart_airport_id",
+                "arrive_airport_id",
+                "depart_time",
+                "flight__arrive_time",
+                "min_price",
+                "depart_airport__code",
+                "depart_airport__city",
+                "arrive_airport__code",
+                "arrive_airport__city",
+            )
+            .iterator(chunk_size=5000)
+        )
+        # 一条查询同时取出航段和两端机场，冷启动的中转查询只多这一条 SQL
+        legs = []
+        airports = {}
+        for row in rows:
+            leg = Leg(*row[:8])
+            legs.append(leg)
+            airports.setdefault(leg.depart_airport_id, AirportInfo(*row[8:10]))
+            airports.setdefault(leg.arrive_airport_id, AirportInfo(*row[10:12]))
+        return cls(legs, airports)
+
+    def _departures_between(self, airport_id, start, end):
+        times = self._times.get(airport_id)
+        if not times:
+            return []
+        lo = bisect.bisect_left(times, start)
+        hi = bisect.bisect_right(times, end)
+        return self._departures[airport_id][lo:hi]
+
+    def _search(self, origin_ids, dest_ids, day, priority, max_stops, min_stops):
+        """
+        以“航段”为节点的 Dijkstra。priority(prev_key, leg) 计算到达该航段后的代价，
+        要求沿路径单调不减（累计票价 / 到达时间都满足）。
+        """
+        cutoff = timezone.now() + SALE_CUTOFF
+        day_start = timezone.make_aware(datetime.combine(day, datetime.min.time()))
+        day_end = day_start + timedelta(days=1)
+        heap = []
+        counter = 0  # 打破平局，避免比较 Leg
+        settled = {}  # flight_id -> 已确定最优代价时使用的最少航段数
+
+        for origin in origin_ids:
+            for leg in self._departures_between(origin, max(day_start, cutoff), day_end):
+                if leg.depart_time >= day_end or leg.depart_time <= cutoff:
+                    continue
+                if leg.arrive_airport_id in origin_ids:
+                    continue
+                heapq.heappush(heap, (priority(None, leg), counter, (leg,)))
+                counter += 1
+
+        while heap:
+            key, _, path = heapq.heappop(heap)
+            last = path[-1]
+            # 先出堆的代价更小；同一航段若已用更少的航段数到达过，当前路径被支配
+            if settled.get(last.flight_id, MAX_STOPS + 2) <= len(path):
+                continue
+            settled[last.flight_id] = len(path)
+
+            if last.arrive_airport_id in dest_ids:
+                if len(path) - 1 >= min_stops:
+                    return Itinerary(path)
+                continue
+            if len(path) > max_stops:
+                continue
+
+            visited = {leg.depart_airport_id for leg in path}
+            for nxt in self._departures_between(
+                last.arrive_airport_id,
+                last.arrive_time + MIN_CONNECTION,
+                last.arrive_time + MAX_CONNECTION,
+            ):
+                if nxt.arrive_airport_id in visited:
+                    continue
+                heapq.heappush(heap, (priority(key, nxt), counter, path + (nxt,)))
+                counter += 1
+        return None
+
+    def earliest_arrival(self, origin_ids, dest_ids, day, max_stops=MAX_STOPS, min_stops=0):
+        return self._search(
+            origin_ids, dest_ids, day, lambda prev, leg: leg.arrive_time, max_stops, min_stops
+        )
+
+    def cheapest(self, origin_ids, dest_ids, day, max_stops=MAX_STOPS, min_stops=0):
+        return self._search(
+            origin_ids,
+            dest_ids,
+            day,
+            lambda prev, leg: (prev or 0) + leg.price,
+            max_stops,
+            min_stops,
+        )
+
+
+class RouteGraphCache:
+    """
+    进程内缓存的路由图。进程里第一次查询时同步构建；之后过期或失效时由后台线程
+    重建，重建期间查询继续使用旧图，新图建好后整体替换，查询线程不会被阻塞。
+    """
+
+    def __init__(self, max_age=MAX_AGE):
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._graph = None
+        self._built_at = None
+        self._version = 0  # 每次 invalidate() 加一
+        self._built_version = None  # 当前的图是按哪个版本构建的
+        self._rebuilding = False
+        self._thread = None
+
+    def invalidate(self):
+        """航班变化后调用：当前的图继续可用，下一次查询触发后台重建。"""
+        with self._lock:
+            self._version += 1
+
+    def clear(self):
+        """丢弃当前的图，下一次查询同步重建（测试中用来模拟冷启动）。"""
+        with self._lock:
+            self._graph = None
+            self._built_at = None
+
+    def _stale(self):
+        built_at = self._built_at
+        return (
+            built_at is None
+            or self._built_version != self._version
+            or time.monotonic() - built_at > self.max_age
+        )
+
+    def _build(self):
+        # 先记下版本号：构建期间再有 invalidate()，建好后仍是过期的，会再重建一次
+        version = self._version
+        graph = RouteGraph.load()
+        with self._lock:
+            self._graph = graph
+            self._built_at = time.monotonic()
+            self._built_version = version
+
+    def _rebuild_in_background(self):
+        try:
+            self._build()
+        except Exception:
+            # 重建失败时继续使用旧图，下一次查询再试
+            logger.exception("路由图重建失败")
+        finally:
+            self._rebuilding = False
+            connection.close()
+
+    def get(self):
+        graph = self._graph
+        if graph is None:
+            # 还没有可用的图，只能同步构建；并发的首批查询只构建一次
+            with self._build_lock:
+                if self._graph is None:
+                    self._build()
+            return self._graph
+
+        if self._stale():
+            with self._lock:
+                start = not self._rebuilding
+                self._rebuilding = True
+            if start:
+                self._thread = threading.Thread(
+                    target=self._rebuild_in_background, name="route-graph-rebuild", daemon=True
+                )
+                self._thread.start()
+        return graph
+
+
+route_graph = RouteGraphCache()
+
+
+def itinerary_to_dict(itinerary, airports):
+    def airport(airport_id):
+        a = airports.get(airport_id)
+        return {"id": airport_id, "code": a.code if a else "", "city": a.city if a else ""}
+
+    legs = []
+    for leg in itinerary.legs:
+        legs.append(
+            {
+                "flight_id": leg.flight_id,
+                "flight_no": leg.flight_no,
+                "airline": leg.airline,
+                "depart_airport": airport(leg.depart_airport_id),
+                "arrive_airport": airport(leg.arrive_airport_id),
+                "depart_time": timezone.localtime(leg.depart_time).isoformat(),
+                "arrive_time": timezone.localtime(leg.arrive_time).isoformat(),
+                "price": str(leg.price),
+            }
+        )
+    return {
+        "stops": itinerary.stops,
+        "total_price": str(itinerary.total_price),
+        "depart_time": timezone.localtime(itinerary.depart_time).isoformat(),
+        "arrive_time": timezone.localtime(itinerary.arrive_time).isoformat(),
+        "legs": legs,
+    }
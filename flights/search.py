@@ -0,0 +1,182 @@
+# flights/search.py
+"""
+航班搜索引擎：页面和 JSON 接口共用。
+
+分页采用游标（keyset）方式，不使用 OFFSET：
+- 按价格排序：(min_price, id)
+- 按起飞时间排序：(depart_time, id)
+游标里记录上一页最后一行的排序键，下一页从它之后继续读取。
+"""
+from django.db.models import F, Q
+from django.utils import timezone
+
+from air_ticket_system.cursors import (
+    InvalidCursor,
+    cursor_datetime,
+    cursor_decimal,
+    cursor_int,
+    cursor_str,
+    decode_cursor as decode_cursor_values,
+    encode_cursor as encode_cursor_values,
+)
+
+from . import search_cache
+from .airport_resolver import airport_resolver
+from .models import Flight, SALE_CUTOFF
+
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+# 排序方式 -> (索引表中的排序字段, 游标值的解析函数)
+SORT_KEYS = {
+    "price": ("search_entry__min_price", cursor_decimal),
+    "depart_time": ("search_entry__depart_time", cursor_datetime),
+}
+
+
+def encode_cursor(flight, sort):
+    if sort == "depart_time":
+        value = flight.depart_time.isoformat()
+    else:
+        value = str(flight.min_price)
+    return encode_cursor_values(sort, value, flight.pk)
+
+
+def decode_cursor(token, sort):
+    """
+    解析游标，返回 (排序值, id)；游标与当前排序方式不符或格式错误时抛 InvalidCursor。
+    """
+    if sort not in SORT_KEYS:
+        raise InvalidCursor("无效的分页游标")
+    cursor_sort, value, pk = decode_cursor_values(token, cursor_str, SORT_KEYS[sort][1], cursor_int)
+    if cursor_sort != sort:
+        raise InvalidCursor("分页游标与排序方式不匹配")
+    return value, pk
+
+
+def search_queryset(depart_ids, arrive_ids, depart_date, sort):
+    """
+    在搜索索引上做一次 (到达机场, 日期, 出发机场) 范围查询。
+    depart_ids 为 None 表示不限出发地。
+    """
+    qs = (
+        Flight.objects.filter(
+            search_entry__arrive_airport_id__in=arrive_ids,
+            search_entry__depart_date=depart_date,
+            search_entry__depart_time__gt=timezone.now() + SALE_CUTOFF,
+        )
+        .select_related("depart_airport", "arrive_airport")
+        .annotate(min_price=F("search_entry__min_price"))
+    )
+
+    if depart_ids is not None:
+        qs = qs.filter(search_entry__depart_airport_id__in=depart_ids)
+
+    field = SORT_KEYS.get(sort, SORT_KEYS["price"])[0]
+    return qs.order_by(field, "id")
+
+
+def _page_queryset(depart_ids, arrive_ids, depart_date, sort, after, limit):
+    qs = search_queryset(depart_ids, arrive_ids, depart_date, sort)
+    if after is not None:
+        field = SORT_KEYS[sort][0]
+        value, pk = after
+        qs = qs.filter(Q(**{f"{field}__gt": value}) | Q(**{field: value, "id__gt": pk}))
+    # 多取一行用来判断是否还有下一页
+    return qs[: limit + 1]
+
+
+def _page_params(cleaned_data, cursor, limit):
+    sort = cleaned_data.get("sort") or "price"
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    after = decode_cursor(cursor, sort) if cursor else None
+    return sort, limit, after
+
+
+def _split_page(rows, sort, limit):
+    flights = rows[:limit]
+    next_cursor = encode_cursor(flights[-1], sort) if len(rows) > limit else None
+    return flights, next_cursor
+
+
+def search_flights(cleaned_data, cursor=None, limit=PAGE_SIZE):
+    """
+    根据 FlightSearchForm.cleaned_data 搜索一页航班。
+    返回 (flights, next_cursor)，没有下一页时 next_cursor 为 None。
+    """
+    depart_date = cleaned_data["depart_date"]
+    sort, limit, after = _page_params(cleaned_data, cursor, limit)
+
+    # 先在内存中把城市/机场关键字解析成机场 ID 集合；
+    # 任一端匹配不到机场时直接返回空结果，不访问数据库
+    depart_ids, arrive_ids = resolve_route(cleaned_data)
+    if not route_matched(depart_ids, arrive_ids):
+        return [], None
+
+    rows = search_cache.get_or_compute(
+        depart_ids,
+        arrive_ids,
+        depart_date,
+        sort,
+        lambda: _page_queryset(depart_ids, arrive_ids, depart_date, sort, after, limit),
+        extra=f"{cursor or ''}|{limit}",
+    )
+    return _split_page(rows, sort, limit)
+
+
+async def asearch_flights(cleaned_data, cursor=None, limit=PAGE_SIZE):
+    """search_flights 的异步版本，使用 Django 异步 ORM 查询。"""
+    depart_date = cleaned_data["depart_date"]
+    sort, limit, after = _page_params(cleaned_data, cursor, limit)
+
+    depart_ids, arrive_ids = await aresolve_route(cleaned_data)
+    if not route_matched(depart_ids, arrive_ids):
+        return [], None
+
+    async def compute():
+        qs = _page_queryset(depart_ids, arrive_ids, depart_date, sort, after, limit)
+        return [flight async for flight in qs]
+
+    rows = await search_cache.aget_or_compute(
+        depart_ids, arrive_ids, depart_date, sort, compute, extra=f"{cursor or ''}|{limit}"
+    )
+    return _split_page(rows, sort, limit)
+
+
+def resolve_route(cleaned_data):
+    """
+    把表单中的出发地 / 目的地解析为机场 ID 集合。
+    没有填写出发地时 depart_ids 为 None（不限出发地）。
+    """
+    depart_city = (cleaned_data.get("depart_city") or "").strip()
+    arrive_city = cleaned_data["arrive_city"].strip()
+    depart_ids = airport_resolver.resolve(depart_city) if depart_city else None
+    return depart_ids, airport_resolver.resolve(arrive_city)
+
+
+async def aresolve_route(cleaned_data):
+    depart_city = (cleaned_data.get("depart_city") or "").strip()
+    arrive_city = cleaned_data["arrive_city"].strip()
+    depart_ids = await airport_resolver.aresolve(depart_city) if depart_city else None
+    return depart_ids, await airport_resolver.aresolve(arrive_city)
+
+
+def route_matched(depart_ids, arrive_ids):
+    return bool(arrive_ids) and (depart_ids is None or bool(depart_ids))
+
+
+def flight_to_dict(flight):
+    def airport(a):
+        return {"id": a.id, "code": a.code, "name": a.name, "city": a.city}
+
+    return {
+        "id": flight.id,
+        "flight_no": flight.flight_no,
+        "airline": flight.airline,
+        "plane_type": flight.plane_type,
+        "depart_airport": airport(flight.depart_airport),
+        "arrive_airport": airport(flight.arrive_airport),
+        "depart_time": timezone.localtime(flight.depart_time).isoformat(),
+        "arrive_time": timezone.localtime(flight.arrive_time).isoformat(),
+        "min_price": str(flight.min_price),
+    }
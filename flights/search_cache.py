@@ -0,0 +1,205 @@
+# flights/search_cache.py
+"""
+航班搜索结果缓存（基于 Django cache 框架，使用 FLIGHT_SEARCH_CACHE_ALIAS 指定的缓存）。
+
+失效策略：按 (到达机场, 出发日期) 维护一个“代数”(generation)，缓存键里带上
+本次搜索涉及的所有代数。航班 / 舱位库存变化时由 search_index 调用 invalidate()
+把对应代数加一，旧缓存自然不会再被命中，等待过期淘汰即可。
+
+代数和命中计数都存放在缓存里，只有缓存被所有 worker 共享（Redis / Memcached）时
+失效和统计才对整个部署有效；LocMemCache 下每个进程各有一份。
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.utils import timezone
+
+from .models import SALE_CUTOFF
+
+CACHE_ALIAS = getattr(settings, "FLIGHT_SEARCH_CACHE_ALIAS", "search")
+CACHE_TIMEOUT = getattr(settings, "FLIGHT_SEARCH_CACHE_TIMEOUT", 300)
+
+_PREFIX = "flight_search"
+_STAT_KEYS = {"hits": f"{_PREFIX}:stats:hits", "misses": f"{_PREFIX}:stats:misses"}
+
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+def is_process_local():
+    """搜索缓存是否只在当前进程内（LocMemCache / DummyCache）。"""
+    return isinstance(_cache(), (LocMemCache, DummyCache))
+
+
+def _gen_key(arrive_airport_id, day):
+    return f"{_PREFIX}:gen:{arrive_airport_id}:{day.isoformat()}"
+
+
+def _new_generation():
+    # 用时间戳做初始值：代数键被淘汰后重新生成，也不会与旧值重复
+    return time.time_ns()
+
+
+def _gen_keys(arrive_ids, days):
+    return [_gen_key(i, day) for day in days for i in sorted(arrive_ids)]
+
+
+def _generations(arrive_ids, days):
+    cache = _cache()
+    keys = _gen_keys(arrive_ids, days)
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            cache.add(key, _new_generation(), None)
+            found[key] = cache.get(key)
+    return [found[key] for key in keys]
+
+
+async def _agenerations(arrive_ids, days):
+    cache = _cache()
+    keys = _gen_keys(arrive_ids, days)
+    found = await cache.aget_many(keys)
+    for key in keys:
+        if key not in found:
+            await cache.aadd(key, _new_generation(), None)
+            found[key] = await cache.aget(key)
+    return [found[key] for key in keys]
+
+
+def _result_key(namespace, depart_ids, arrive_ids, days, extra, gens):
+    depart = ",".join(map(str, sorted(depart_ids))) if depart_ids is not None else "*"
+    arrive = ",".join(map(str, sorted(arrive_ids)))
+    span = ",".join(day.isoformat() for day in days)
+    raw = f"{depart}|{arrive}|{span}|{extra}|{','.join(map(str, gens))}"
+    return f"{_PREFIX}:{namespace}:" + hashlib.md5(raw.encode()).hexdigest()
+
+
+def _incr(name):
+    cache = _cache()
+    key = _STAT_KEYS[name]
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, None)
+        cache.incr(key)
+
+
+async def _aincr(name):
+    cache = _cache()
+    key = _STAT_KEYS[name]
+    try:
+        await cache.aincr(key)
+    except ValueError:
+        await cache.aadd(key, 0, None)
+        await cache.aincr(key)
+
+
+def _all_on_sale(flights):
+    """
+    缓存期间可能有航班进入起飞前 1 小时停售窗口。缓存的是“一页 + 1 行”，
+    读出后再剔除会得到不满一页、下一页游标也不对的结果，所以只要有一个航班停售
+    就整页当作未命中重新查询。
+    """
+    cutoff = timezone.now() + SALE_CUTOFF
+    return all(f.depart_time > cutoff for f in flights)
+
+
+def get_or_compute_window(
+    namespace, depart_ids, arrive_ids, days, compute, extra="", is_fresh=None
+):
+    """
+    通用版本：结果依赖若干天的库存时使用（如低价日历），任一天库存变化都会失效。
+    compute() 的返回值原样缓存；is_fresh(value) 返回 False 时视为未命中。
+    """
+    cache = _cache()
+    gens = _generations(arrive_ids, days)
+    key = _result_key(namespace, depart_ids, arrive_ids, days, extra, gens)
+    value = cache.get(key)
+    if value is not None and is_fresh is not None and not is_fresh(value):
+        value = None
+    if value is None:
+        _incr("misses")
+        value = compute()
+        cache.set(key, value, CACHE_TIMEOUT)
+    else:
+        _incr("hits")
+    return value
+
+
+async def aget_or_compute_window(
+    namespace, depart_ids, arrive_ids, days, acompute, extra="", is_fresh=None
+):
+    """get_or_compute_window 的异步版本，acompute 为协程函数。"""
+    cache = _cache()
+    gens = await _agenerations(arrive_ids, days)
+    key = _result_key(namespace, depart_ids, arrive_ids, days, extra, gens)
+    value = await cache.aget(key)
+    if value is not None and is_fresh is not None and not is_fresh(value):
+        value = None
+    if value is None:
+        await _aincr("misses")
+        value = await acompute()
+        await cache.aset(key, value, CACHE_TIMEOUT)
+    else:
+        await _aincr("hits")
+    return value
+
+
+def get_or_compute(depart_ids, arrive_ids, day, sort, compute, extra=""):
+    """
+    读取缓存的搜索结果；未命中时调用 compute() 查询数据库并写入缓存。
+    返回 list（已求值）。
+    """
+    return get_or_compute_window(
+        "result",
+        depart_ids,
+        arrive_ids,
+        [day],
+        lambda: list(compute()),
+        f"{sort}|{extra}",
+        is_fresh=_all_on_sale,
+    )
+
+
+async def aget_or_compute(depart_ids, arrive_ids, day, sort, acompute, extra=""):
+    """get_or_compute 的异步版本，acompute 为返回 list 的协程函数。"""
+    return await aget_or_compute_window(
+        "result",
+        depart_ids,
+        arrive_ids,
+        [day],
+        acompute,
+        f"{sort}|{extra}",
+        is_fresh=_all_on_sale,
+    )
+
+
+def invalidate(arrive_airport_id, day):
+    cache = _cache()
+    key = _gen_key(arrive_airport_id, day)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _new_generation(), None)
+
+
+def stats():
+    cache = _cache()
+    values = cache.get_many(list(_STAT_KEYS.values()))
+    hits = values.get(_STAT_KEYS["hits"], 0)
+    misses = values.get(_STAT_KEYS["misses"], 0)
+    total = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": round(hits / total, 4) if total else 0.0,
+    }
+
+
+def reset_stats():
+    _cache().delete_many(list(_STAT_KEYS.values()))
@@ -0,0 +1,139 @@
+# flights/search_index.py
+"""
+航班搜索索引（FlightSearchIndex）的维护逻辑。
+
+- refresh_flight_index：单个航班增量刷新，由 signals 在 Flight / FlightSeat 保存时调用，
+  以及 inventory 在某个舱位售罄 / 从售罄恢复时调用
+- rebuild_flight_index：批量重建（全部或指定航班），用于回填和 update()/bulk_* 之后的补偿
+"""
+from django.db import transaction
+from django.db.models import Min, Sum
+from django.utils import timezone
+
+from . import search_cache
+from .models import Flight, FlightSeat, FlightStatus, FlightSearchIndex
+
+UPSERT_FIELDS = [
+    "depart_airport",
+    "arrive_airport",
+    "depart_date",
+    "depart_time",
+    "min_price",
+    "available_seats",
+]
+
+
+def _entry_for(flight, min_price, available):
+    return FlightSearchIndex(
+        flight_id=flight["id"],
+        depart_airport_id=flight["depart_airport_id"],
+        arrive_airport_id=flight["arrive_airport_id"],
+        depart_date=timezone.localtime(flight["depart_time"]).date(),
+        depart_time=flight["depart_time"],
+        min_price=min_price,
+        available_seats=available,
+    )
+
+
+def refresh_flight_index(flight_id):
+    """
+    重新计算某个航班的索引行：
+    - 航班不存在 / 不在售 / 已无余票：删除索引行
+    - 否则写入最低可售票价、剩余座位数和起飞时间
+    同时让新旧两个 (到达机场, 日期) 的搜索缓存失效。
+
+    写入用 upsert（INSERT ... ON CONFLICT DO UPDATE），两个并发的首次刷新不会因主键冲突报错。
+    普通的扣减 / 归还不会触发刷新（见 flights.inventory），所以索引里的 available_seats
+    只是近似值，搜索只依赖“是否有票”和 min_price。
+    """
+    old = (
+        FlightSearchIndex.objects.filter(flight_id=flight_id)
+        .values_list("arrive_airport_id", "depart_date")
+        .first()
+    )
+    if old:
+        search_cache.invalidate(*old)
+
+    flight = (
+        Flight.objects.filter(pk=flight_id, status=FlightStatus.ON_SALE)
+        .values("id", "depart_airport_id", "arrive_airport_id", "depart_time")
+        .first()
+    )
+    agg = None
+    if flight is not None:
+        agg = FlightSeat.objects.filter(
+            flight_id=flight_id, available_seats__gt=0
+        ).aggregate(min_price=Min("price"), available=Sum("available_seats"))
+
+    if not agg or not agg["available"]:
+        FlightSearchIndex.objects.filter(flight_id=flight_id).delete()
+        return None
+
+    entry = _entry_for(flight, agg["min_price"], agg["available"])
+    FlightSearchIndex.objects.bulk_create(
+        [entry],
+        update_conflicts=True,
+        unique_fields=["flight"],
+        update_fields=UPSERT_FIELDS,
+    )
+    if old != (entry.arrive_airport_id, entry.depart_date):
+        search_cache.invalidate(entry.arrive_airport_id, entry.depart_date)
+    return entry
+
+
+def schedule_refresh(flight_id):
+    """
+    在当前事务提交后再刷新索引，避免在下单事务里额外持有索引行的锁。
+    （不在事务中时 on_commit 会立即执行）
+
+    robust=True：此时订单已经提交，刷新失败只记日志，不能让一笔成功的下单返回 500。
+    """
+    transaction.on_commit(lambda: refresh_flight_index(flight_id), robust=True)
+
+
+def rebuild_flight_index(flight_ids=None, batch_size=2000):
+    """
+    批量重建索引。flight_ids 为 None 时重建全部航班。
+    返回写入的索引行数。
+    """
+    stale = FlightSearchIndex.objects.all()
+    flights = Flight.objects.filter(
+        status=FlightStatus.ON_SALE, seats__available_seats__gt=0
+    )
+    if flight_ids is not None:
+        flight_ids = list(flight_ids)
+        stale = stale.filter(flight_id__in=flight_ids)
+        flights = flights.filter(pk__in=flight_ids)
+
+    rows = (
+        flights.values("id", "depart_airport_id", "arrive_airport_id", "depart_time")
+        .annotate(min_price=Min("seats__price"), available=Sum("seats__available_seats"))
+        .order_by()
+    )
+
+    written = 0
+    with transaction.atomic():
+        invalidate_entries(stale)
+        stale.delete()
+        batch = []
+        for row in rows.iterator(chunk_size=batch_size):
+            batch.append(_entry_for(row, row["min_price"], row["available"]))
+            if len(batch) >= batch_size:
+                FlightSearchIndex.objects.bulk_create(batch)
+                written += len(batch)
+                batch = []
+        if batch:
+            FlightSearchIndex.objects.bulk_create(batch)
+            written += len(batch)
+        # stale 是惰性 QuerySet，此时查到的就是新写入的行
+        invalidate_entries(stale)
+    return written
+
+
+def invalidate_entries(entries):
+    """
+    让一批索引行涉及的 (到达机场, 日期) 搜索缓存全部失效。
+    """
+    pairs = entries.values_list("arrive_airport_id", "depart_date").distinct()
+    for arrive_airport_id, depart_date in pairs:
+        search_cache.invalidate(arrive_airport_id, depart_date)
@@ -0,0 +1,80 @@
+# flights/seat_sync.py
+"""
+后台修改航班座位数时的舱位同步：按各舱位“剩余座位数”创建或更新 FlightSeat。
+
+约定：total_seats 始终保持 = 占座订单数 + 剩余座位数，票价 = 基础价 × 舱位倍数。
+占座订单包括已售（orders.models.SOLD_STATUSES：已支付、退票中）和尚未支付的已预订订单，
+它们的座位都已经从 available_seats 中扣掉了。
+
+一批航班只需要：一条分组查询取出现有舱位及其已售数，一次 bulk_create、
+一次 bulk_update，全部在一个事务中完成。bulk_* 不触发 post_save 信号，
+事务提交后统一重建这些航班的搜索索引。
+"""
+from django.db import transaction
+from django.db.models import Count, Q
+
+from orders.models import OrderStatus, SOLD_STATUSES
+
+from .inventory import shard_seat
+from .models import FlightSeat, cabin_price
+from .search_index import rebuild_flight_index
+
+HOLDING_STATUSES = [OrderStatus.RESERVED, *SOLD_STATUSES]
+
+
+def sync_seats(plan):
+    """
+    plan: {flight: {cabin_class: 剩余座位数}}，未列出的舱位保持不变。
+    之前没有的舱位只在剩余座位数 > 0 时创建。返回 (新建数, 更新数)。
+    """
+    plan = {flight: cabins for flight, cabins in plan.items() if cabins}
+    if not plan:
+        return 0, 0
+
+    with transaction.atomic():
+        existing = {
+            (seat.flight_id, seat.cabin_class): seat
+            for seat in FlightSeat.objects.filter(flight__in=list(plan)).annotate(
+                held=Count("orders", filter=Q(orders__status__in=HOLDING_STATUSES))
+            )
+        }
+
+        created, updated, sharded = [], [], []
+        for flight, cabins in plan.items():
+            for cabin_class, available in cabins.items():
+                available = max(available or 0, 0)
+                price = cabin_price(flight.base_price, cabin_class)
+                seat = existing.get((flight.pk, cabin_class))
+                if seat is None:
+                    if available:
+                        created.append(
+                            FlightSeat(
+                                flight=flight,
+                                cabin_class=cabin_class,
+                                total_seats=available,
+                                available_seats=available,
+                                price=price,
+                            )
+                        )
+                    continue
+                seat.total_seats = seat.held + available
+                seat.available_seats = available
+                seat.price = price
+                updated.append(seat)
+                if seat.shard_count:
+                    sharded.append(seat)
+
+        FlightSeat.objects.bulk_create(created)
+        FlightSeat.objects.bulk_update(updated, ["total_seats", "available_seats", "price"])
+        for seat in sharded:
+            # 分片舱位：按新的剩余座位数重新拆分各分片
+            shard_seat(seat.pk, seat.shard_count, available=seat.available_seats)
+
+        flight_ids = [flight.pk for flight in plan]
+        transaction.on_commit(lambda: rebuild_flight_index(flight_ids))
+    return len(created), len(updated)
+
+
+def sync_cabin_seats(flight, available_by_cabin):
+    """单个航班的舱位同步，available_by_cabin: {cabin_class: 剩余座位数}。"""
+    return sync_seats({flight: available_by_cabin})
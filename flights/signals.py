@@ -0,0 +1,40 @@
+# flights/signals.py
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .airport_resolver import airport_resolver
+from .models import Airport, Flight, FlightSeat
+from .routing import route_graph
+from .search_index import schedule_refresh
+
+
+@receiver(post_save, sender=Airport)
+@receiver(post_delete, sender=Airport)
+def airport_changed(sender, instance, **kwargs):
+    airport_resolver.invalidate()
+    route_graph.invalidate()
+
+
+@receiver(post_save, sender=Flight)
+def flight_saved(sender, instance, **kwargs):
+    schedule_refresh(instance.pk)
+    # 余票变化不重建路由图（按 MAX_AGE 定期刷新），航班时刻 / 状态变化才立即失效
+    route_graph.invalidate()
+
+
+@receiver(post_delete, sender=Flight)
+def flight_deleted(sender, instance, **kwargs):
+    route_graph.invalidate()
+
+
+@receiver(post_save, sender=FlightSeat)
+def flight_seat_saved(sender, instance, **kwargs):
+    schedule_refresh(instance.flight_id)
+
+
+@receiver(post_delete, sender=FlightSeat)
+def flight_seat_deleted(sender, instance, origin=None, **kwargs):
+    # 整个航班被删除时，索引行会随 Flight 级联删除，无需再刷新
+    if isinstance(origin, Flight):
+        return
+    schedule_refresh(instance.flight_id)
@@ -1,3 +1,714 @@
-from django.test import TestCase
+import base64
+import io
+import json
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import PassengerProfile
+from air_ticket_system.query_budget import QueryBudgetTestMixin, get_budget
+from orders.models import OrderStatus, TicketOrder
+
+from . import search_cache
+from .airport_resolver import airport_resolver
+from .fare_calendar import MAX_WINDOW_DAYS, WINDOW_DAYS
+from .inventory import release_seats, shard_seat, take_seats
+from .models import (
+    SALE_CUTOFF,
+    Airport,
+    CabinClass,
+    Flight,
+    FlightSearchIndex,
+    FlightSeat,
+    FlightStatus,
+    cabin_price,
+)
+from .routing import RouteGraph, RouteGraphCache, route_graph
+from .schedule import _copy_value, import_schedule, parse_rule
+from .search import encode_cursor, search_flights
+from .search_index import rebuild_flight_index, refresh_flight_index, schedule_refresh
+from .seat_sync import sync_cabin_seats
+
+
+def create_flight(flight_no, depart, arrive, depart_time, hours=2, price="800.00", seats=5):
+    flight = Flight.objects.create(
+        flight_no=flight_no,
+        airline="东方航空",
+        plane_type="A320",
+        depart_airport=depart,
+        arrive_airport=arrive,
+        depart_time=depart_time,
+        arrive_time=depart_time + timedelta(hours=hours),
+        base_price=Decimal(price),
+    )
+    FlightSeat.objects.create(
+        flight=flight,
+        cabin_class=CabinClass.ECONOMY,
+        total_seats=seats,
+        available_seats=seats,
+        price=Decimal(price),
+    )
+    return flight
+
+
+class FlightSearchQueryBudgetTests(QueryBudgetTestMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        pvg = Airport.objects.create(code="PVG", name="浦东国际机场", city="上海", country="中国")
+        sha = Airport.objects.create(code="SHA", name="虹桥国际机场", city="上海虹桥", country="中国")
+        pek = Airport.objects.create(code="PEK", name="首都国际机场", city="北京", country="中国")
+        can = Airport.objects.create(code="CAN", name="白云国际机场", city="广州", country="中国")
+        base = timezone.localtime().replace(hour=8, minute=0, second=0, microsecond=0) + timedelta(
+            days=2
+        )
+        cls.day = base.date()
+        for i in range(3):
+            create_flight(f"MU51{i:02d}", pvg, pek, base + timedelta(hours=i))
+        # 虹桥 -> 北京没有直飞，只能经广州中转
+        create_flight("CZ3500", sha, can, base)
+        create_flight("CZ3501", can, pek, base + timedelta(hours=4))
+        rebuild_flight_index()
+        cls.user = User.objects.create_user("budget", password="pw123456")
+
+    def setUp(self):
+        # 进程内的解析器、路由图和搜索缓存都从冷启动开始，按最坏情况计数
+        caches[search_cache.CACHE_ALIAS].clear()
+        airport_resolver.invalidate()
+        route_graph.clear()
+        self.client.force_login(self.user)
+
+    def test_search_direct_within_budget(self):
+        response = self.assertWithinQueryBudget(
+            "flights:search",
+            data={"depart_city": "PVG", "arrive_city": "PEK", "depart_date": self.day},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context["flights"]), 3)
+
+    def test_search_without_direct_flights_within_budget(self):
+        response = self.assertWithinQueryBudget(
+            "flights:search",
+            data={"depart_city": "SHA", "arrive_city": "PEK", "depart_date": self.day},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["flights"], [])
+        labels = [label for label, _ in response.context["connections"]]
+        self.assertIn("最低总价", labels)
+
+    def test_connections_api_within_budget(self):
+        response = self.assertWithinQueryBudget(
+            "flights:connections_api",
+            data={"depart_city": "SHA", "arrive_city": "PEK", "depart_date": self.day},
+        )
+        legs = response.json()["cheapest"]["legs"]
+        self.assertEqual(
+            [(leg["depart_airport"]["code"], leg["arrive_airport"]["city"]) for leg in legs],
+            [("SHA", "广州"), ("CAN", "北京")],
+        )
+
+
+@override_settings(QUERY_BUDGET_STRICT=True)
+class AsyncViewTests(TestCase):
+    """异步视图经过 QueryBudgetMiddleware 的异步分支，超出预算时直接抛 QueryBudgetExceeded。"""
+
+    @classmethod
+    def setUpTestData(cls):
+        pvg = Airport.objects.create(code="PVG", name="浦东国际机场", city="上海", country="中国")
+        pek = Airport.objects.create(code="PEK", name="首都国际机场", city="北京", country="中国")
+        base = timezone.localtime().replace(hour=9, minute=0, second=0, microsecond=0) + timedelta(
+            days=2
+        )
+        cls.day = base.date()
+        cls.flights = [
+            create_flight(f"MU67{i:02d}", pvg, pek, base + timedelta(hours=i), price=price)
+            for i, price in enumerate(["900.00", "700.00"])
+        ]
+        rebuild_flight_index()
+
+    def setUp(self):
+        caches[search_cache.CACHE_ALIAS].clear()
+        airport_resolver.invalidate()
+        route_graph.clear()
+
+    def assertWithinBudget(self, response, view_name):
+        self.assertLessEqual(response.query_stats.count, get_budget(view_name))
+
+    async def test_search_async_returns_flights(self):
+        response = await self.async_client.get(
+            reverse("flights:search_async"),
+            {"depart_city": "上海", "arrive_city": "北京", "depart_date": self.day},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertWithinBudget(response, "flights:search_async")
+        # 按价格排序
+        self.assertEqual(
+            [f.flight_no for f in response.context["flights"]], ["MU6701", "MU6700"]
+        )
+        cheapest = [item["date"] for item in response.context["calendar"] if item["is_cheapest"]]
+        self.assertEqual(cheapest, [self.day])
+
+    async def test_detail_async(self):
+        flight = self.flights[0]
+        response = await self.async_client.get(reverse("flights:detail_async", args=[flight.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertWithinBudget(response, "flights:detail_async")
+        self.assertEqual(response.context["flight"].pk, flight.pk)
+        self.assertEqual([s.available_seats for s in response.context["seats"]], [5])
+
+    async def test_detail_async_missing_flight(self):
+        response = await self.async_client.get(reverse("flights:detail_async", args=[999999]))
+        self.assertEqual(response.status_code, 404)
+        self.assertWithinBudget(response, "flights:detail_async")
+
+
+class RouteGraphCacheTests(SimpleTestCase):
+    def test_stale_graph_is_served_while_rebuilding(self):
+        old, new = object(), object()
+        graphs = RouteGraphCache(max_age=60)
+        with mock.patch.object(RouteGraph, "load", side_effect=[old, new]) as load:
+            # 没有图时同步构建
+            self.assertIs(graphs.get(), old)
+            graphs.invalidate()
+            # 失效后立即返回旧图，新图在后台线程构建
+            self.assertIs(graphs.get(), old)
+            graphs._thread.join(timeout=5)
+            self.assertIs(graphs.get(), new)
+        self.assertEqual(load.call_count, 2)
+
+    def test_failed_rebuild_keeps_old_graph(self):
+        old = object()
+        graphs = RouteGraphCache(max_age=60)
+        with mock.patch.object(RouteGraph, "load", side_effect=[old, RuntimeError("db down")]):
+            graphs.get()
+            graphs.invalidate()
+            with self.assertLogs("flights.routing", "ERROR"):
+                graphs.get()
+                graphs._thread.join(timeout=5)
+        self.assertIs(graphs._graph, old)
+
+
+class ImportScheduleTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Airport.objects.create(code="PVG", name="浦东国际机场", city="上海", country="中国")
+        Airport.objects.create(code="PEK", name="首都国际机场", city="北京", country="中国")
+
+    def rules(self):
+        start = timezone.localdate() + timedelta(days=1)
+        raw = {
+            "flight_no": "mu5900",
+            "airline": "东方航空",
+            "plane_type": "A320\t(改)",
+            "depart": "PVG",
+            "arrive": "PEK",
+            "depart_time": "23:30",
+            "arrive_time": "01:45",
+            "days": "daily",
+            "start_date": start.isoformat(),
+            "end_date": (start + timedelta(days=9)).isoformat(),
+            "base_price": "1000",
+            "economy_seats": "150",
+            "business_seats": "20",
+        }
+        airports = dict(Airport.objects.values_list("code", "id"))
+        return [parse_rule(raw, 2, airports)]
+
+    def assertImported(self, stats, use_copy):
+        self.assertEqual((stats["flights"], stats["seats"], stats["index"]), (10, 20, 10))
+        flights = Flight.objects.filter(flight_no="MU5900")
+        self.assertEqual(flights.count(), 10)
+        flight = flights.order_by("depart_time").first()
+        self.assertEqual(flight.plane_type, "A320\t(改)")
+        self.assertEqual(flight.arrive_time - flight.depart_time, timedelta(hours=2, minutes=15))
+        seats = dict(flight.seats.values_list("cabin_class", "available_seats"))
+        self.assertEqual(seats, {CabinClass.ECONOMY: 150, CabinClass.BUSINESS: 20})
+        self.assertEqual(FlightSearchIndex.objects.filter(flight__in=flights).count(), 10)
+        # 再次导入时全部跳过
+        again = import_schedule(self.rules(), use_copy=use_copy)
+        self.assertEqual(again["flights"], 0)
+
+    def test_bulk_create_import(self):
+        stats = import_schedule(self.rules(), batch_size=4, use_copy=False)
+        self.assertImported(stats, use_copy=False)
+
+    @skipUnless(connection.vendor == "postgresql", "COPY 只在 PostgreSQL 下可用")
+    def test_copy_import(self):
+        stats = import_schedule(self.rules(), batch_size=4, use_copy=True)
+        self.assertImported(stats, use_copy=True)
+        # 预留 ID 走的是同一个序列，之后普通插入不会撞主键
+        pek, pvg = Airport.objects.order_by("code")
+        create_flight("MU5999", pvg, pek, timezone.now() + timedelta(days=20))
+
+    def test_copy_value_escaping(self):
+        self.assertEqual(_copy_value(None), r"\N")
+        self.assertEqual(_copy_value("a\tb\nc\\d"), r"a\tb\nc\\d")
+        self.assertEqual(_copy_value(Decimal("12.50")), "12.50")
+
+
+class SeatSyncTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        pvg = Airport.objects.create(code="PVG", name="浦东国际机场", city="上海", country="中国")
+        pek = Airport.objects.create(code="PEK", name="首都国际机场", city="北京", country="中国")
+        cls.flight = create_flight(
+            "MU5800", pvg, pek, timezone.now() + timedelta(days=3), price="1000.00", seats=5
+        )
+        seat = cls.flight.seats.get()
+        # 已支付、退票中、未支付各一张，另有一张已取消（座位已归还）
+        statuses = [
+            OrderStatus.PAID,
+            OrderStatus.REFUNDING,
+            OrderStatus.RESERVED,
+            OrderStatus.CANCELLED,
+        ]
+        for i, status in enumerate(statuses):
+            user = User.objects.create_user(f"sync{i}")
+            profile = PassengerProfile.objects.create(
+                user=user, real_name=user.username, id_card_no=f"SYNC{i}", phone="1", email=""
+            )
+            TicketOrder.objects.create(
+                order_no=f"SYNC{i:04d}",
+                user=user,
+                profile=profile,
+                flight=cls.flight,
+                seat=seat,
+                status=status,
+                ticket_price=seat.price,
+                total_amount=seat.price,
+            )
+        FlightSeat.objects.filter(pk=seat.pk).update(available_seats=2)
+
+    def test_total_keeps_seats_held_by_orders(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            created, updated = sync_cabin_seats(
+                self.flight,
+                {CabinClass.ECONOMY: 10, CabinClass.BUSINESS: 3, CabinClass.FIRST: 0},
+            )
+        self.assertEqual((created, updated), (1, 1))
+        seats = {seat.cabin_class: seat for seat in self.flight.seats.all()}
+        self.assertEqual(set(seats), {CabinClass.ECONOMY, CabinClass.BUSINESS})
+        economy = seats[CabinClass.ECONOMY]
+        # 3 张占座订单（已支付 / 退票中 / 未支付）+ 10 张剩余
+        self.assertEqual((economy.total_seats, economy.available_seats), (13, 10))
+        business = seats[CabinClass.BUSINESS]
+        self.assertEqual((business.total_seats, business.available_seats), (3, 3))
+        self.assertEqual(business.price, cabin_price(self.flight.base_price, CabinClass.BUSINESS))
+        entry = FlightSearchIndex.objects.get(flight=self.flight)
+        self.assertEqual(entry.available_seats, 13)
+
+
+def raw_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip("=")
+
+
+class SearchPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        pvg = Airport.objects.create(code="PVG", name="浦东国际机场", city="上海", country="中国")
+        pek = Airport.objects.create(code="PEK", name="首都国际机场", city="北京", country="中国")
+        base = timezone.localtime().replace(hour=6, minute=0, second=0, microsecond=0) + timedelta(
+            days=2
+        )
+        cls.day = base.date()
+        # 票价有重复，验证 (排序值, id) 的第二键
+        prices = ["900.00", "700.00", "700.00", "800.00", "700.00", "1000.00", "650.00"]
+        cls.flights = [
+            create_flight(f"MU61{i:02d}", pvg, pek, base + timedelta(minutes=50 * i), price=price)
+            for i, price in enumerate(prices)
+        ]
+        rebuild_flight_index()
+
+    def setUp(self):
+        caches[search_cache.CACHE_ALIAS].clear()
+        airport_resolver.invalidate()
+
+    def params(self, **extra):
+        return {"depart_city": "PVG", "arrive_city": "PEK", "depart_date": self.day, **extra}
+
+    def walk(self, sort):
+        ids, cursor, pages = [], None, 0
+        while True:
+            data = self.params(sort=sort, limit=2)
+            if cursor:
+                data["cursor"] = cursor
+            body = self.client.get(reverse("flights:search_api"), data).json()
+            ids.extend(item["id"] for item in body["results"])
+            pages += 1
+            cursor = body["next_cursor"]
+            if not cursor:
+                return ids, pages
+
+    def test_round_trip_by_price(self):
+        ids, pages = self.walk("price")
+        expected = sorted(self.flights, key=lambda f: (f.base_price, f.pk))
+        self.assertEqual(ids, [f.pk for f in expected])
+        self.assertEqual(pages, 4)
+
+    def test_round_trip_by_depart_time(self):
+        ids, _ = self.walk("depart_time")
+        self.assertEqual(ids, [f.pk for f in self.flights])
+
+    def test_invalid_cursors_rejected(self):
+        flight = self.flights[0]
+        cursors = [
+            "!!!",
+            "bm90IGpzb24",  # "not json"
+            raw_cursor([1, 2]),
+            raw_cursor(["price", "NaN", 1]),
+            raw_cursor(["price", "sNaN", 1]),
+            raw_cursor(["price", "Infinity", 1]),
+            raw_cursor(["price", "-Infinity", 1]),
+            raw_cursor(["price", "700.00", "x"]),
+            raw_cursor(["depart_time", "not a date", 1]),
+            # 游标与排序方式不符
+            encode_cursor(flight, "depart_time"),
+        ]
+        for cursor in cursors:
+            with self.subTest(cursor=cursor):
+                response = self.client.get(
+                    reverse("flights:search_api"), self.params(sort="price", cursor=cursor)
+                )
+                self.assertEqual(response.status_code, 400)
+                self.assertIn("cursor", response.json()["errors"])
+                # 搜索页面回到第一页
+                response = self.client.get(
+                    reverse("flights:search"), self.params(sort="price", cursor=cursor)
+                )
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.context["flights"]), len(self.flights))
+
+    def test_non_finite_json_numbers_rejected(self):
+        cursor = base64.urlsafe_b64encode(b'["price", Infinity, Infinity]').decode()
+        response = self.client.get(reverse("flights:search_api"), self.params(cursor=cursor))
+        self.assertEqual(response.status_code, 400)
+
+
+class InventoryIndexTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        pvg = Airport.objects.create(code="PVG", name="浦东国际机场", city="上海", country="中国")
+        pek = Airport.objects.create(code="PEK", name="首都国际机场", city="北京", country="中国")
+        cls.flight = create_flight("MU6500", pvg, pek, timezone.now() + timedelta(days=3), seats=3)
+        rebuild_flight_index()
+
+    def setUp(self):
+        self.seat = self.flight.seats.get()
+
+    def test_refresh_only_when_seats_cross_zero(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.assertTrue(take_seats(self.seat, 2))
+        self.assertEqual(callbacks, [])
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.assertFalse(take_seats(self.seat, 2))
+            self.assertTrue(take_seats(self.seat))
+        self.assertEqual(len(callbacks), 1)
+        self.assertFalse(FlightSearchIndex.objects.filter(flight=self.flight).exists())
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            release_seats(self.seat)
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(FlightSearchIndex.objects.get(flight=self.flight).min_price, self.seat.price)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            release_seats(self.seat)
+        self.assertEqual(callbacks, [])
+        self.seat.refresh_from_db()
+        self.assertEqual(self.seat.available_seats, 2)
+
+    def test_refresh_upserts_existing_entry(self):
+        FlightSeat.objects.filter(pk=self.seat.pk).update(price=Decimal("555.00"))
+        refresh_flight_index(self.flight.pk)
+        refresh_flight_index(self.flight.pk)
+        entry = FlightSearchIndex.objects.get(flight=self.flight)
+        self.assertEqual(entry.min_price, Decimal("555.00"))
+
+    def test_refresh_is_registered_robust(self):
+        with mock.patch("flights.search_index.transaction.on_commit") as on_commit:
+            schedule_refresh(self.flight.pk)
+        self.assertIs(on_commit.call_args.kwargs["robust"], True)
+
+    def test_detail_shows_live_sharded_seats(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            shard_seat(self.seat.pk, 2)
+        self.seat.refresh_from_db()
+        self.assertTrue(take_seats(self.seat))
+        # 汇总行要等 reconcile_seat_shards 才回写，详情页应直接汇总分片
+        self.assertEqual(FlightSeat.objects.get(pk=self.seat.pk).available_seats, 3)
+        response = self.client.get(reverse("flights:detail", args=[self.flight.pk]))
+        self.assertEqual([s.available_seats for s in response.context["seats"]], [2])
+
+
+class SearchCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        pvg = Airport.objects.create(code="PVG", name="浦东国际机场", city="上海", country="中国")
+        pek = Airport.objects.create(code="PEK", name="首都国际机场", city="北京", country="中国")
+        cls.base = timezone.localtime().replace(
+            hour=6, minute=0, second=0, microsecond=0
+        ) + timedelta(days=2)
+        cls.flights = [
+            create_flight(f"MU66{i:02d}", pvg, pek, cls.base + timedelta(minutes=30 * i), seats=1)
+            for i in range(4)
+        ]
+        rebuild_flight_index()
+
+    def setUp(self):
+        caches[search_cache.CACHE_ALIAS].clear()
+        airport_resolver.invalidate()
+        self.query = {
+            "depart_city": "PVG",
+            "arrive_city": "PEK",
+            "depart_date": self.base.date(),
+            "sort": "depart_time",
+        }
+
+    def search_ids(self, **kwargs):
+        flights, next_cursor = search_flights(self.query, **kwargs)
+        return [f.pk for f in flights], next_cursor
+
+    def test_miss_then_hit(self):
+        first = self.search_ids()
+        with self.assertNumQueries(0):
+            second = self.search_ids()
+        self.assertEqual(first, second)
+        stats = search_cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+
+    def test_invalidated_when_flight_sells_out_and_reopens(self):
+        flight = self.flights[1]
+        seat = flight.seats.get()
+        self.search_ids()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(take_seats(seat))
+        ids, _ = self.search_ids()
+        self.assertNotIn(flight.pk, ids)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            release_seats(seat)
+        ids, _ = self.search_ids()
+        self.assertIn(flight.pk, ids)
+        self.assertEqual(search_cache.stats()["hits"], 0)
+
+    def test_cached_page_recomputed_when_flight_enters_cutoff(self):
+        ids, next_cursor = self.search_ids(limit=2)
+        self.assertEqual(ids, [f.pk for f in self.flights[:2]])
+
+        # 第一个航班进入停售窗口：不能返回只有 1 个航班的“短页”
+        later = self.flights[0].depart_time - SALE_CUTOFF + timedelta(minutes=1)
+        with mock.patch("django.utils.timezone.now", return_value=later):
+            ids, next_cursor = self.search_ids(limit=2)
+            self.assertEqual(ids, [f.pk for f in self.flights[1:3]])
+            self.assertIsNotNone(next_cursor)
+            ids, next_cursor = self.search_ids(limit=2, cursor=next_cursor)
+        self.assertEqual(ids, [self.flights[3].pk])
+        self.assertIsNone(next_cursor)
+
+
+class SearchIndexSignalTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.pvg = Airport.objects.create(code="PVG", name="浦东国际机场", city="上海", country="中国")
+        cls.pek = Airport.objects.create(code="PEK", name="首都国际机场", city="北京", country="中国")
+
+    def entry(self, flight):
+        return FlightSearchIndex.objects.filter(flight=flight).first()
+
+    def test_index_follows_flight_and_seat_changes(self):
+        depart_time = timezone.now() + timedelta(days=3)
+        with self.captureOnCommitCallbacks(execute=True):
+            flight = create_flight("MU6800", self.pvg, self.pek, depart_time, price="800.00")
+        entry = self.entry(flight)
+        self.assertEqual(
+            (entry.min_price, entry.available_seats, entry.depart_date),
+            (Decimal("800.00"), 5, timezone.localdate(depart_time)),
+        )
+
+        # 新增更便宜的舱位 / 修改票价
+        with self.captureOnCommitCallbacks(execute=True):
+            cheap = FlightSeat.objects.create(
+                flight=flight,
+                cabin_class=CabinClass.BUSINESS,
+                total_seats=2,
+                available_seats=2,
+                price=Decimal("600.00"),
+            )
+        self.assertEqual(self.entry(flight).min_price, Decimal("600.00"))
+        with self.captureOnCommitCallbacks(execute=True):
+            cheap.price = Decimal("650.00")
+            cheap.save()
+        self.assertEqual(self.entry(flight).min_price, Decimal("650.00"))
+        with self.captureOnCommitCallbacks(execute=True):
+            cheap.delete()
+        self.assertEqual(self.entry(flight).min_price, Decimal("800.00"))
+
+        # 改期：索引里的出发日期跟着变
+        with self.captureOnCommitCallbacks(execute=True):
+            flight.depart_time += timedelta(days=1)
+            flight.arrive_time += timedelta(days=1)
+            flight.save()
+        self.assertEqual(self.entry(flight).depart_date, timezone.localdate(flight.depart_time))
+
+        # 取消 / 删除航班：索引行随之移除
+        with self.captureOnCommitCallbacks(execute=True):
+            flight.status = FlightStatus.CANCELLED
+            flight.save()
+        self.assertIsNone(self.entry(flight))
+        with self.captureOnCommitCallbacks(execute=True):
+            flight.status = FlightStatus.ON_SALE
+            flight.save()
+        self.assertIsNotNone(self.entry(flight))
+        with self.captureOnCommitCallbacks(execute=True):
+            flight.delete()
+        self.assertFalse(FlightSearchIndex.objects.exists())
+
+    def test_sold_out_flight_leaves_index(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            flight = create_flight("MU6801", self.pvg, self.pek, timezone.now() + timedelta(days=3))
+        seat = flight.seats.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            seat.available_seats = 0
+            seat.save()
+        self.assertIsNone(self.entry(flight))
+
+
+class AirportResolverTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.pvg = Airport.objects.create(code="PVG", name="浦东国际机场", city="上海", country="中国")
+        cls.sha = Airport.objects.create(code="SHA", name="虹桥国际机场", city="上海", country="中国")
+        cls.pek = Airport.objects.create(code="PEK", name="首都国际机场", city="北京", country="中国")
+
+    def setUp(self):
+        airport_resolver.invalidate()
+
+    def test_matching(self):
+        cases = {
+            "上海": {self.pvg.pk, self.sha.pk},
+            " 上海市 ": {self.pvg.pk, self.sha.pk},
+            "浦东": {self.pvg.pk},
+            "pek": {self.pek.pk},
+            "ＰＥＫ": {self.pek.pk},  # 全角
+            "p": {self.pvg.pk, self.pek.pk},
+            "广州": set(),
+            "": set(),
+        }
+        for text, expected in cases.items():
+            with self.subTest(text=text):
+                self.assertEqual(airport_resolver.resolve(text), expected)
+
+    def test_built_once_and_invalidated_by_airport_changes(self):
+        with self.assertNumQueries(1):
+            airport_resolver.resolve("上海")
+            airport_resolver.resolve("北京")
+
+        new = Airport.objects.create(code="CAN", name="白云国际机场", city="广州", country="中国")
+        self.assertEqual(airport_resolver.resolve("广州"), {new.pk})
+        self.sha.delete()
+        self.assertEqual(airport_resolver.resolve("上海"), {self.pvg.pk})
+
+
+class ExpireFlightsCommandTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        pvg = Airport.objects.create(code="PVG", name="浦东国际机场", city="上海", country="中国")
+        pek = Airport.objects.create(code="PEK", name="首都国际机场", city="北京", country="中国")
+        now = timezone.now()
+        cls.soon = create_flight("MU6900", pvg, pek, now + timedelta(minutes=30))
+        cls.later = create_flight("MU6901", pvg, pek, now + timedelta(hours=3))
+        cls.cancelled = create_flight("MU6902", pvg, pek, now + timedelta(minutes=20))
+        Flight.objects.filter(pk=cls.cancelled.pk).update(status=FlightStatus.CANCELLED)
+        rebuild_flight_index()
+
+    def run_command(self):
+        out = io.StringIO()
+        call_command("expire_flights", stdout=out)
+        return out.getvalue()
+
+    def test_expires_flights_inside_sale_cutoff(self):
+        self.assertIn("已停售 1 个航班", self.run_command())
+        statuses = dict(Flight.objects.values_list("flight_no", "status"))
+        self.assertEqual(
+            statuses,
+            {
+                "MU6900": FlightStatus.FINISHED,
+                "MU6901": FlightStatus.ON_SALE,
+                "MU6902": FlightStatus.CANCELLED,
+            },
+        )
+        self.assertEqual(
+            list(FlightSearchIndex.objects.values_list("flight_id", flat=True)), [self.later.pk]
+        )
+        # 没有需要停售的航班时不输出
+        self.assertEqual(self.run_command(), "")
+
+
+class FareCalendarTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        pvg = Airport.objects.create(code="PVG", name="浦东国际机场", city="上海", country="中国")
+        pek = Airport.objects.create(code="PEK", name="首都国际机场", city="北京", country="中国")
+        noon = timezone.localtime().replace(hour=12, minute=0, second=0, microsecond=0)
+        cls.today = noon.date()
+        fares = [
+            (1, "900.00", 5),
+            (2, "800.00", 5),
+            (2, "600.00", 5),
+            (3, "100.00", 0),
+            (4, "600.00", 5),
+        ]
+        for i, (offset, price, seats) in enumerate(fares):
+            create_flight(
+                f"MU70{i:02d}", pvg, pek, noon + timedelta(days=offset), price=price, seats=seats
+            )
+        rebuild_flight_index()
+
+    def setUp(self):
+        caches[search_cache.CACHE_ALIAS].clear()
+        airport_resolver.invalidate()
+
+    def calendar(self, center, **params):
+        response = self.client.get(
+            reverse("flights:fare_calendar_api"),
+            {"depart_city": "PVG", "arrive_city": "PEK", "depart_date": center, **params},
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.json()["calendar"]
+
+    def test_prices_per_day_and_cheapest(self):
+        calendar = self.calendar(self.today + timedelta(days=1))
+        # 窗口 ±3 天，但今天之前的日期不计入
+        rows = [
+            (
+                item["date"],
+                item["min_price"] and Decimal(item["min_price"]),
+                item["flights"],
+                item["is_cheapest"],
+            )
+            for item in calendar
+        ]
+        self.assertEqual(
+            rows,
+            [
+                (str(self.today), None, 0, False),
+                (str(self.today + timedelta(days=1)), Decimal("900.00"), 1, False),
+                (str(self.today + timedelta(days=2)), Decimal("600.00"), 2, True),
+                # 售罄航班不在索引里
+                (str(self.today + timedelta(days=3)), None, 0, False),
+                (str(self.today + timedelta(days=4)), Decimal("600.00"), 1, True),
+            ],
+        )
+
+    def test_window_size_clamped(self):
+        center = self.today + timedelta(days=30)
+        self.assertEqual(len(self.calendar(center, days=100)), 2 * MAX_WINDOW_DAYS + 1)
+        self.assertEqual(len(self.calendar(center, days=-5)), 1)
+        self.assertEqual(len(self.calendar(center, days="abc")), 2 * WINDOW_DAYS + 1)
@@ -5,5 +5,12 @@ app_name = "flights"
 
 urlpatterns = [
     path("search/", views.flight_search, name="search"),
+    path("search/api/", views.flight_search_api, name="search_api"),
+    path("connections/api/", views.connection_search_api, name="connections_api"),
+    path("calendar/api/", views.fare_calendar_api, name="fare_calendar_api"),
     path("<int:pk>/", views.flight_detail, name="detail"),
+
+    # 异步版本（ASGI 部署时使用，见 README）
+    path("async/search/", views.flight_search_async, name="search_async"),
+    path("async/<int:pk>/", views.flight_detail_async, name="detail_async"),
 ]
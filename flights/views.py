@@ -1,93 +1,267 @@
 # flights/views.py
+from asgiref.sync import sync_to_async
+from django.http import Http404, JsonResponse
 from django.shortcuts import render, get_object_or_404
-from django.db.models import Min, Q
-from django.utils import timezone
-from datetime import timedelta
+from django.urls import reverse
 
-from .models import Flight, FlightSeat, FlightStatus
+from .models import Flight, FlightSeat
 from .forms import FlightSearchForm
+from .inventory import with_live_availability
+from .fare_calendar import WINDOW_DAYS, afare_calendar, fare_calendar
+from .routing import MAX_STOPS, itinerary_to_dict, route_graph
+from .search import (
+    PAGE_SIZE,
+    InvalidCursor,
+    aresolve_route,
+    asearch_flights,
+    flight_to_dict,
+    resolve_route,
+    route_matched,
+    search_flights,
+)
 
 
-def _expire_flights():
+def _connections(cleaned_data, max_stops=MAX_STOPS):
     """
-    将起飞时间在 1 小时内的在售航班标记为已结束，避免继续售票。
+    查询中转方案，返回 (最早到达, 最低总价, 路由图)；没有出发地时不查询。
     """
-    now = timezone.now()
-    cutoff = now + timedelta(hours=1)
-    Flight.objects.filter(
-        status=FlightStatus.ON_SALE,
-        depart_time__lte=cutoff,
-    ).update(status=FlightStatus.FINISHED)
+    depart_ids, arrive_ids = resolve_route(cleaned_data)
+    graph = route_graph.get()
+    if not depart_ids or not arrive_ids:
+        return None, None, graph
+    day = cleaned_data["depart_date"]
+    earliest = graph.earliest_arrival(
+        depart_ids, arrive_ids, day, max_stops=max_stops, min_stops=1
+    )
+    cheapest = graph.cheapest(
+        depart_ids, arrive_ids, day, max_stops=max_stops, min_stops=1
+    )
+    return earliest, cheapest, graph
 
 
 def home(request):
     return render(request, "welcome.html")
 
 
-def flight_search(request):
-    # 先刷新即将起飞的航班状态，起飞前 1 小时内不再售票
-    _expire_flights()
+def _connection_options(earliest, cheapest):
+    options = []
+    if cheapest:
+        options.append(("最低总价", cheapest))
+    if earliest and earliest != cheapest:
+        options.append(("最早到达", earliest))
+    return options
+
+
+def _search_context(request, form, searched, flights, next_cursor, connections, calendar):
+    # 低价日历中每一天都链接到对应日期的搜索
+    for item in calendar:
+        day_params = request.GET.copy()
+        day_params.pop("cursor", None)
+        day_params["depart_date"] = item["date"].isoformat()
+        item["query"] = day_params.urlencode()
+
+    params = request.GET.copy()
+    params.pop("cursor", None)
+    first_query = params.urlencode()
+    next_query = None
+    if next_cursor:
+        params["cursor"] = next_cursor
+        next_query = params.urlencode()
+
+    return {
+        "form": form,
+        "flights": flights,
+        "searched": searched,
+        "first_query": first_query,
+        "next_query": next_query,
+        "is_first_page": not request.GET.get("cursor"),
+        "connections": connections,
+        "calendar": calendar,
+        "selected_date": form.cleaned_data["depart_date"] if searched else None,
+    }
 
+
+def flight_search(request):
     form = FlightSearchForm(request.GET or None)
-    flights = []
-    searched = False
-
-    if form.is_valid():
-        searched = True
-        depart_city = form.cleaned_data.get("depart_city", "").strip()
-        arrive_city = form.cleaned_data["arrive_city"].strip()
-        depart_date = form.cleaned_data["depart_date"]
-        sort = form.cleaned_data.get("sort") or "price"
-
-        # ① 构建“目的城市”搜索条件（必定有值）
-        dest_q = (
-            Q(arrive_airport__city__icontains=arrive_city)
-            | Q(arrive_airport__name__icontains=arrive_city)
-            | Q(arrive_airport__code__icontains=arrive_city)
-        )
+    flights, next_cursor, connections, calendar = [], None, [], []
+    searched = form.is_valid()
 
-        # ② 如果填了出发地城市，再叠加一个“出发城市”条件
-        filters = dest_q
-        if depart_city:
-            origin_q = (
-                Q(depart_airport__city__icontains=depart_city)
-                | Q(depart_airport__name__icontains=depart_city)
-                | Q(depart_airport__code__icontains=depart_city)
-            )
-            filters &= origin_q
-
-        qs = (
-            Flight.objects.filter(
-                filters,
-                depart_time__date=depart_date,
-                depart_time__gt=timezone.now() + timedelta(hours=1),
-                status=FlightStatus.ON_SALE,
-                seats__available_seats__gt=0,
-            )
-            .annotate(min_price=Min("seats__price"))
-            .distinct()
-        )
+    if searched:
+        cursor = request.GET.get("cursor")
+        try:
+            flights, next_cursor = search_flights(form.cleaned_data, cursor=cursor)
+        except InvalidCursor:
+            # 游标失效（例如切换了排序方式）时回到第一页
+            flights, next_cursor = search_flights(form.cleaned_data)
 
-        if sort == "depart_time":
-            qs = qs.order_by("depart_time")
-        else:
-            qs = qs.order_by("min_price")
+        # 直飞航班没有结果时，给出中转方案
+        if not flights and not cursor:
+            earliest, cheapest, _ = _connections(form.cleaned_data)
+            connections = _connection_options(earliest, cheapest)
 
-        flights = qs
+        # 前后几天的最低价，方便用户直接换日期
+        depart_ids, arrive_ids = resolve_route(form.cleaned_data)
+        if route_matched(depart_ids, arrive_ids):
+            calendar = fare_calendar(depart_ids, arrive_ids, form.cleaned_data["depart_date"])
 
     return render(
         request,
         "flights/search_results.html",
-        {"form": form, "flights": flights, "searched": searched},
+        _search_context(request, form, searched, flights, next_cursor, connections, calendar),
+    )
+
+
+async def flight_search_async(request):
+    """
+    flight_search 的异步版本（ASGI 部署时使用）：
+    查询走 Django 异步 ORM，等待数据库时不占用工作线程。
+    """
+    form = FlightSearchForm(request.GET or None)
+    flights, next_cursor, connections, calendar = [], None, [], []
+    searched = form.is_valid()
+
+    if searched:
+        cursor = request.GET.get("cursor")
+        try:
+            flights, next_cursor = await asearch_flights(form.cleaned_data, cursor=cursor)
+        except InvalidCursor:
+            flights, next_cursor = await asearch_flights(form.cleaned_data)
+
+        if not flights and not cursor:
+            earliest, cheapest, _ = await sync_to_async(_connections)(form.cleaned_data)
+            connections = _connection_options(earliest, cheapest)
+
+        depart_ids, arrive_ids = await aresolve_route(form.cleaned_data)
+        if route_matched(depart_ids, arrive_ids):
+            calendar = await afare_calendar(
+                depart_ids, arrive_ids, form.cleaned_data["depart_date"]
+            )
+
+    context = _search_context(
+        request, form, searched, flights, next_cursor, connections, calendar
+    )
+    # 模板里会读取 session / 登录用户（同步查询），放到线程里渲染
+    return await sync_to_async(render)(request, "flights/search_results.html", context)
+
+
+def flight_search_api(request):
+    """
+    JSON 搜索接口：参数与搜索页面相同，另支持 cursor / limit。
+    返回 {"results": [...], "next_cursor": "..."}，客户端带上 next_cursor 继续拉取下一页。
+    """
+    form = FlightSearchForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse({"errors": form.errors}, status=400)
+
+    try:
+        limit = int(request.GET.get("limit") or PAGE_SIZE)
+    except ValueError:
+        limit = PAGE_SIZE
+
+    try:
+        flights, next_cursor = search_flights(
+            form.cleaned_data, cursor=request.GET.get("cursor"), limit=limit
+        )
+    except InvalidCursor as e:
+        return JsonResponse({"errors": {"cursor": [str(e)]}}, status=400)
+
+    results = []
+    for flight in flights:
+        item = flight_to_dict(flight)
+        item["detail_url"] = reverse("flights:detail", args=[flight.id])
+        results.append(item)
+    return JsonResponse({"results": results, "next_cursor": next_cursor})
+
+
+def connection_search_api(request):
+    """
+    中转查询 JSON 接口：参数同搜索页面（出发地必填），可选 max_stops（1~2）。
+    返回最早到达和最低总价两个方案。
+    """
+    form = FlightSearchForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse({"errors": form.errors}, status=400)
+    if not (form.cleaned_data.get("depart_city") or "").strip():
+        return JsonResponse({"errors": {"depart_city": ["中转查询需要填写出发地"]}}, status=400)
+
+    try:
+        max_stops = min(max(int(request.GET.get("max_stops") or MAX_STOPS), 1), MAX_STOPS)
+    except ValueError:
+        max_stops = MAX_STOPS
+
+    earliest, cheapest, graph = _connections(form.cleaned_data, max_stops=max_stops)
+    return JsonResponse(
+        {
+            "earliest_arrival": itinerary_to_dict(earliest, graph.airports) if earliest else None,
+            "cheapest": itinerary_to_dict(cheapest, graph.airports) if cheapest else None,
+        }
+    )
+
+
+def fare_calendar_api(request):
+    """
+    低价日历 JSON 接口：参数同搜索页面，另支持 days（前后天数，默认 3，最大 15）。
+    """
+    form = FlightSearchForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse({"errors": form.errors}, status=400)
+    try:
+        days = int(request.GET.get("days") or WINDOW_DAYS)
+    except ValueError:
+        days = WINDOW_DAYS
+
+    depart_ids, arrive_ids = resolve_route(form.cleaned_data)
+    calendar = []
+    if route_matched(depart_ids, arrive_ids):
+        calendar = fare_calendar(
+            depart_ids, arrive_ids, form.cleaned_data["depart_date"], days=days
+        )
+    return JsonResponse(
+        {
+            "calendar": [
+                {
+                    "date": item["date"].isoformat(),
+                    "min_price": str(item["min_price"]) if item["min_price"] is not None else None,
+                    "flights": item["flights"],
+                    "is_cheapest": item["is_cheapest"],
+                }
+                for item in calendar
+            ]
+        }
     )
 
 
 def flight_detail(request, pk):
-    _expire_flights()
-    flight = get_object_or_404(Flight, pk=pk)
-    seats = FlightSeat.objects.filter(flight=flight).order_by("price")
+    flight = get_object_or_404(
+        Flight.objects.select_related("depart_airport", "arrive_airport"), pk=pk
+    )
+    seats = list(with_live_availability(FlightSeat.objects.filter(flight=flight)).order_by("price"))
+    for s in seats:
+        # 分片舱位的 available_seats 只是定期回写的汇总值，展示实时余票
+        s.available_seats = s.live_available
     return render(
         request,
         "flights/flight_detail.html",
         {"flight": flight, "seats": seats},
     )
+
+
+async def flight_detail_async(request, pk):
+    """flight_detail 的异步版本。"""
+    flight = (
+        await Flight.objects.select_related("depart_airport", "arrive_airport")
+        .filter(pk=pk)
+        .afirst()
+    )
+    if flight is None:
+        raise Http404("航班不存在")
+    seats = [
+        s async for s in with_live_availability(FlightSeat.objects.filter(flight=flight)).order_by("price")
+    ]
+    for s in seats:
+        s.available_seats = s.live_available
+    return await sync_to_async(render)(
+        request,
+        "flights/flight_detail.html",
+        {"flight": flight, "seats": seats},
+    )
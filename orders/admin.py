@@ -2,7 +2,7 @@
 #
 # # Register your models here.
 from django.contrib import admin
-from .models import TicketOrder, RefundRecord
+from .models import TicketOrder, RefundRecord, SeatHold
 
 
 @admin.register(TicketOrder)
@@ -10,8 +10,16 @@ class TicketOrderAdmin(admin.ModelAdmin):
     list_display = ("order_no", "user", "flight", "total_amount", "status", "paid_at")
     list_filter = ("status",)
     search_fields = ("order_no", "user__username")
+    # 状态只能经 orders.state 迁移（CAS + order_transitioned 信号维护营收汇总），
+    # 在后台直接改状态或金额会绕过状态机，也不会释放 / 扣减座位
+    readonly_fields = ("status", "total_amount", "fee", "paid_at", "cancelled_at", "refunded_at")
 
 
 @admin.register(RefundRecord)
 class RefundRecordAdmin(admin.ModelAdmin):
     list_display = ("order", "status", "refund_amount", "refund_fee", "approve_time")
+
+
+@admin.register(SeatHold)
+class SeatHoldAdmin(admin.ModelAdmin):
+    list_display = ("order", "seat", "expires_at")
@@ -0,0 +1,27 @@
+# orders/checks.py
+from django.conf import settings
+from django.core.checks import Warning, register
+from django.db import connections
+
+
+def node_id_collision_risk():
+    """
+    未配置 ORDER_NO_NODE_ID 且使用 SQLite 以外的数据库（通常是多进程 / 多机器部署）时返回 True：
+    由主机名和进程号计算的节点号只有 1000 个取值，worker 多了容易撞上。
+    """
+    if getattr(settings, "ORDER_NO_NODE_ID", None) is not None:
+        return False
+    return any(connections[alias].vendor != "sqlite" for alias in settings.DATABASES)
+
+
+@register()
+def check_order_no_node_id(app_configs, **kwargs):
+    if not node_id_collision_risk():
+        return []
+    return [
+        Warning(
+            "未配置 ORDER_NO_NODE_ID，订单号节点号由主机名和进程号计算，多个 worker 可能得到相同的节点号",
+            hint="为每台机器 / 每个 worker 配置不同的 ORDER_NO_NODE_ID（0-999），例如从环境变量读取。",
+            id="orders.W001",
+        )
+    ]
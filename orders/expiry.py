@@ -0,0 +1,80 @@
+# orders/expiry.py
+"""
+未支付订单超时取消：把保座已到期、仍为“已预订”的订单批量改为“已取消”，并归还座位。
+
+由 expire_orders 管理命令定时执行（进程内保座后端由自身的后台线程调用 expire_holds）；
+页面只根据 created_at 计算倒计时，不再写库。
+"""
+from collections import Counter
+
+from django.db import transaction
+from django.utils import timezone
+
+from flights.inventory import release_many
+
+from .holds import get_hold_store, MAX_HOLD
+from .models import TicketOrder, OrderStatus
+from .state import transition
+
+
+def _cancel(order_ids, now):
+    """
+    取消一批订单并归还座位（调用方已开启事务）：
+    1. 锁住其中仍为 RESERVED 的订单（跳过正在被支付请求锁住的行）
+    2. 一条 UPDATE 把它们改为 CANCELLED
+    3. 按舱位汇总，每个舱位一条 UPDATE 归还座位
+    """
+    rows = list(
+        TicketOrder.objects.select_for_update(skip_locked=True)
+        .filter(pk__in=order_ids, status=OrderStatus.RESERVED)
+        .values_list("id", "seat_id")
+    )
+    if not rows:
+        return 0
+    cancelled = transition(
+        [pk for pk, _ in rows], OrderStatus.RESERVED, OrderStatus.CANCELLED, now=now
+    )
+    release_many(Counter(seat_id for _, seat_id in rows))
+    return cancelled
+
+
+def expire_holds(store=None, batch_size=500, now=None):
+    """分批取出到期保座并取消对应订单，返回取消的订单数。"""
+    store = store or get_hold_store()
+    now = now or timezone.now()
+    total = 0
+    while True:
+        with transaction.atomic():
+            order_ids = store.pop_expired(now, batch_size)
+            if not order_ids:
+                return total
+            total += _cancel(order_ids, now)
+
+
+def expire_orphans(batch_size=500, now=None):
+    """
+    兜底清理：超过最长保座时间仍为 RESERVED 的订单（保座记录丢失，
+    如进程内后端所在进程重启），同样取消并归还座位。
+    """
+    now = now or timezone.now()
+    pending = TicketOrder.objects.filter(
+        status=OrderStatus.RESERVED, created_at__lte=now - MAX_HOLD
+    )
+
+    total = 0
+    last_id = 0
+    while True:
+        ids = list(
+            pending.filter(pk__gt=last_id).order_by("pk").values_list("id", flat=True)[:batch_size]
+        )
+        if not ids:
+            return total
+        last_id = ids[-1]
+        with transaction.atomic():
+            total += _cancel(ids, now)
+
+
+def expire_reserved_orders(batch_size=500, now=None):
+    """先按保座到期时间取消，再做兜底清理。返回本次取消的订单数。"""
+    now = now or timezone.now()
+    return expire_holds(batch_size=batch_size, now=now) + expire_orphans(batch_size, now)
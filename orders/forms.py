@@ -7,3 +7,38 @@ class RefundRequestForm(forms.Form):
         widget=forms.Textarea(attrs={"rows": 3, "class": "form-control"}),
         required=False,
     )
+
+
+class GroupBookingForm(forms.Form):
+    """团体订票：每行一位乘机人，格式为“身份证号,手机号”。"""
+
+    MAX_PASSENGERS = 9
+
+    passengers = forms.CharField(
+        label="乘机人",
+        help_text="每行一位乘机人：身份证号,手机号（乘机人需已在本站注册，并在个人信息页授权本账号代订）",
+        widget=forms.Textarea(attrs={"rows": 5, "class": "form-control"}),
+    )
+    idempotency_key = forms.CharField(widget=forms.HiddenInput, required=False, max_length=64)
+
+    def clean_passengers(self):
+        passengers = []
+        seen = set()
+        for lineno, line in enumerate(self.cleaned_data["passengers"].splitlines(), 1):
+            line = line.strip()
+            if not line:
+                continue
+            parts = [p.strip() for p in line.replace("，", ",").split(",")]
+            if len(parts) != 2 or not all(parts):
+                raise forms.ValidationError(f"第 {lineno} 行格式应为：身份证号,手机号")
+            id_card_no, phone = parts
+            if id_card_no in seen:
+                raise forms.ValidationError(f"乘机人 {id_card_no} 重复")
+            seen.add(id_card_no)
+            passengers.append((id_card_no, phone))
+
+        if len(passengers) < 2:
+            raise forms.ValidationError("团体订票至少需要 2 位乘机人")
+        if len(passengers) > self.MAX_PASSENGERS:
+            raise forms.ValidationError(f"一次最多为 {self.MAX_PASSENGERS} 位乘机人订票")
+        return passengers
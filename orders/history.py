@@ -0,0 +1,48 @@
+# orders/history.py
+"""
+“我的订单”分页：按 (created_at, id) 倒序做游标（keyset）分页，不使用 OFFSET。
+
+配合 TicketOrder 上的 (user, -created_at, -id) 索引，每页只在索引上读取
+limit + 1 行，翻到多深的历史页耗时都一样。
+"""
+from django.db.models import Q
+
+from air_ticket_system.cursors import (
+    cursor_datetime,
+    cursor_int,
+    decode_cursor as decode_cursor_values,
+    encode_cursor as encode_cursor_values,
+)
+
+from .models import TicketOrder
+
+PAGE_SIZE = 20
+
+
+def encode_cursor(order):
+    return encode_cursor_values(order.created_at.isoformat(), order.pk)
+
+
+def decode_cursor(token):
+    """解析游标，返回 (created_at, id)；格式错误时抛 InvalidCursor。"""
+    return decode_cursor_values(token, cursor_datetime, cursor_int)
+
+
+def order_page(user, cursor=None, limit=PAGE_SIZE):
+    """
+    返回 (orders, next_cursor)，没有下一页时 next_cursor 为 None。
+    """
+    qs = (
+        TicketOrder.objects.filter(user=user)
+        .select_related("flight__depart_airport", "flight__arrive_airport", "seat")
+        .order_by("-created_at", "-id")
+    )
+    if cursor:
+        created_at, pk = decode_cursor(cursor)
+        qs = qs.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+
+    # 多取一行用来判断是否还有下一页
+    rows = list(qs[: limit + 1])
+    orders = rows[:limit]
+    next_cursor = encode_cursor(orders[-1]) if len(rows) > limit else None
+    return orders, next_cursor
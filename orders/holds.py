@@ -0,0 +1,180 @@
+# orders/holds.py
+"""
+保座存储：记录未支付订单占用的座位及其到期时间。
+
+下单时 place()，支付开始时 extend() 留出支付处理时间，支付完成后 release()；
+到期未支付的保座由 orders.expiry 取出（pop_expired），取消订单并归还座位。
+
+两种后端，由 settings.SEAT_HOLD_BACKEND 选择：
+- DatabaseHoldStore：SeatHold 表，多进程共享，由 expire_orders 命令定期清理
+- InMemoryHoldStore：进程内 TTL 存储（堆 + 字典），读写不访问数据库；
+  后台线程每隔 reap_interval 秒自动释放到期保座，只适合单进程部署
+"""
+import heapq
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import SeatHold, PAYMENT_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+# 支付请求处理期间保座至少保留的时长，避免支付途中被清理进程取消
+PAYMENT_GRACE = timedelta(minutes=2)
+# 保座最长可延长到 下单时间 + PAYMENT_TIMEOUT + PAYMENT_GRACE
+MAX_HOLD = PAYMENT_TIMEOUT + PAYMENT_GRACE
+
+
+def hold_deadline(order):
+    return order.created_at + PAYMENT_TIMEOUT
+
+
+def extend_until(order, now=None):
+    """支付开始时保座延长到的时间点：now + PAYMENT_GRACE，但不超过 MAX_HOLD。"""
+    now = now or timezone.now()
+    return min(now + PAYMENT_GRACE, order.created_at + MAX_HOLD)
+
+
+class HoldStore:
+    def place(self, order):
+        """为新订单保座，到期时间为 下单时间 + PAYMENT_TIMEOUT。"""
+        raise NotImplementedError
+
+    def place_many(self, orders):
+        """批量保座（团体订票）。"""
+        for order in orders:
+            self.place(order)
+
+    def extend(self, order, until):
+        """把未到期的保座延长到 until（不会缩短）；保座不存在或已到期时返回 False。"""
+        raise NotImplementedError
+
+    def release(self, order_id):
+        """支付完成后移除保座（座位转为已售，不归还库存）。"""
+        raise NotImplementedError
+
+    def pop_expired(self, now, limit):
+        """取出并移除最多 limit 个已到期的保座，返回订单 ID 列表。"""
+        raise NotImplementedError
+
+
+class DatabaseHoldStore(HoldStore):
+    def place(self, order):
+        SeatHold.objects.create(order=order, seat_id=order.seat_id, expires_at=hold_deadline(order))
+
+    def place_many(self, orders):
+        SeatHold.objects.bulk_create(
+            SeatHold(order=o, seat_id=o.seat_id, expires_at=hold_deadline(o)) for o in orders
+        )
+
+    def extend(self, order, until):
+        return bool(
+            SeatHold.objects.filter(order_id=order.pk, expires_at__gt=timezone.now()).update(
+                expires_at=Greatest(F("expires_at"), until)
+            )
+        )
+
+    def release(self, order_id):
+        return SeatHold.objects.filter(order_id=order_id).delete()[0] > 0
+
+    def pop_expired(self, now, limit):
+        # 调用方在事务中：锁住的保座与订单取消一起提交，失败时一起回滚；
+        # skip_locked 让多个清理进程可以并行处理不同的行
+        order_ids = list(
+            SeatHold.objects.select_for_update(skip_locked=True)
+            .filter(expires_at__lte=now)
+            .order_by("expires_at")
+            .values_list("order_id", flat=True)[:limit]
+        )
+        if order_ids:
+            SeatHold.objects.filter(order_id__in=order_ids).delete()
+        return order_ids
+
+
+class InMemoryHoldStore(HoldStore):
+    def __init__(self, reap_interval=5.0):
+        self.reap_interval = reap_interval
+        self._lock = threading.Lock()
+        self._expires = {}  # order_id -> expires_at
+        self._heap = []  # (expires_at, order_id)，延长后旧条目留在堆里，弹出时校验
+        self._reaper = None
+
+    def __len__(self):
+        return len(self._expires)
+
+    def place(self, order):
+        expires_at = hold_deadline(order)
+        with self._lock:
+            self._expires[order.pk] = expires_at
+            heapq.heappush(self._heap, (expires_at, order.pk))
+        self._ensure_reaper()
+
+    def extend(self, order, until):
+        with self._lock:
+            expires_at = self._expires.get(order.pk)
+            if expires_at is None or expires_at <= timezone.now():
+                return False
+            if until > expires_at:
+                self._expires[order.pk] = until
+                heapq.heappush(self._heap, (until, order.pk))
+            return True
+
+    def release(self, order_id):
+        with self._lock:
+            return self._expires.pop(order_id, None) is not None
+
+    def pop_expired(self, now, limit):
+        popped = []
+        with self._lock:
+            heap = self._heap
+            while heap and heap[0][0] <= now and len(popped) < limit:
+                expires_at, order_id = heapq.heappop(heap)
+                # 已支付释放或被延长过的旧条目直接丢弃
+                if self._expires.get(order_id) == expires_at:
+                    del self._expires[order_id]
+                    popped.append(order_id)
+        return popped
+
+    def _ensure_reaper(self):
+        if self._reaper is not None or self.reap_interval <= 0:
+            return
+        with self._lock:
+            if self._reaper is None:
+                self._reaper = threading.Thread(
+                    target=self._reap_forever, name="seat-hold-reaper", daemon=True
+                )
+                self._reaper.start()
+
+    def _reap_forever(self):
+        from .expiry import expire_holds
+
+        while True:
+            time.sleep(self.reap_interval)
+            close_old_connections()
+            try:
+                expire_holds(store=self)
+            except Exception:
+                # 后台线程不能退出；本轮取出的保座由 expire_orders 的兜底清理处理
+                logger.exception("释放到期保座失败")
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_hold_store() -> HoldStore:
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                path = getattr(settings, "SEAT_HOLD_BACKEND", "orders.holds.DatabaseHoldStore")
+                _store = import_string(path)()
+    return _store
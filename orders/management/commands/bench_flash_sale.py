@@ -0,0 +1,266 @@
+import multiprocessing
+import statistics
+import threading
+import time
+import uuid
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client
+from django.urls import resolve, reverse
+from django.utils import timezone
+
+from accounts.models import PassengerProfile
+from dashboard.revenue import affected_days, recompute_days
+from flights.inventory import available_seats, reconcile_shards, shard_seat
+from flights.models import Airport, CabinClass, Flight, FlightSeat
+from orders.models import TicketOrder, OrderStatus
+
+USER_PREFIX = "flash-"
+BENCH_AIRPORTS = ["FLS", "FLA"]
+ACTIVE = [OrderStatus.RESERVED, OrderStatus.PAID, OrderStatus.REFUNDING]
+
+
+def _http_host():
+    hosts = [h.lstrip(".") for h in settings.ALLOWED_HOSTS if h != "*"]
+    return hosts[0] if hosts else "localhost"
+
+
+class _SeatUpdateTimer:
+    """统计舱位库存 UPDATE 的耗时：并发下单时这部分时间基本都花在等待行锁上。"""
+
+    def __init__(self):
+        self.seconds = []
+
+    def __call__(self, execute, sql, params, many, context):
+        if not sql.lstrip().upper().startswith("UPDATE") or "flightseat" not in sql:
+            return execute(sql, params, many, context)
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds.append(time.perf_counter() - started)
+
+
+def _redirects_to(response, url_name):
+    if response.status_code != 302:
+        return None
+    match = resolve(urlsplit(response["Location"]).path)
+    return match if match.view_name == url_name else None
+
+
+def _buy(user, flight_id, seat_id, pay, host, timer):
+    """一个用户的抢票流程：下单 -> 支付。返回 (结果, 下单耗时, 支付耗时)。"""
+    client = Client(HTTP_HOST=host)
+    client.force_login(user)
+    with connection.execute_wrapper(timer):
+        started = time.perf_counter()
+        response = client.post(
+            reverse("orders:create_order", args=[flight_id, seat_id]),
+            {"idempotency_key": uuid.uuid4().hex},
+        )
+        create_seconds = time.perf_counter() - started
+        created = _redirects_to(response, "orders:order_detail")
+        if created is None:
+            sold_out = response.status_code == 200 and "余票不足" in response.content.decode()
+            return ("sold_out" if sold_out else "error"), create_seconds, None
+        if not pay:
+            return "reserved", create_seconds, None
+
+        started = time.perf_counter()
+        response = client.post(reverse("orders:pay_order", args=[created.kwargs["order_no"]]))
+        pay_seconds = time.perf_counter() - started
+    paid = _redirects_to(response, "orders:order_detail") is not None
+    return ("paid" if paid else "pay_failed"), create_seconds, pay_seconds
+
+
+def _run_threads(args):
+    """在当前进程中用线程池跑一组用户；子进程入口同样是这个函数。"""
+    users, flight_id, seat_id, pay_every, concurrency, host = args
+    connections.close_all()  # fork 出的子进程不能复用父进程的数据库连接
+    lock = threading.Lock()
+    lock_waits = []
+
+    def task(item):
+        index, user = item
+        timer = _SeatUpdateTimer()
+        try:
+            return _buy(user, flight_id, seat_id, index % pay_every == 0, host, timer)
+        except Exception:
+            return "error", 0.0, None
+        finally:
+            connections.close_all()
+            with lock:
+                lock_waits.extend(timer.seconds)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(task, enumerate(users)))
+    return results, lock_waits
+
+
+def _percentile(values, p):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+class Command(BaseCommand):
+    help = (
+        "秒杀压测：创建一个航班和一批乘客，多线程 / 多进程同时对同一舱位下单并支付，"
+        "输出吞吐量、p50/p99 延迟、库存行等待时间，并核对是否超卖或丢票。"
+        "测试数据用完自动清理（--keep 保留）"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=5000, help="抢票用户数，默认 5000")
+        parser.add_argument("--seats", type=int, default=100, help="舱位座位数，默认 100")
+        parser.add_argument("--concurrency", type=int, default=50, help="每个进程的线程数")
+        parser.add_argument("--processes", type=int, default=1, help="进程数（fork）")
+        parser.add_argument(
+            "--pay-every", type=int, default=1, help="每 N 个用户中有 1 个下单后立即支付，默认全部支付"
+        )
+        parser.add_argument("--shards", type=int, default=0, help="把舱位库存拆分为 N 个分片")
+        parser.add_argument("--keep", action="store_true", help="保留测试数据")
+
+    def _seed(self, options):
+        depart, _ = Airport.objects.get_or_create(
+            code="FLS", defaults={"name": "压测出发机场", "city": "压测出发", "country": "中国"}
+        )
+        arrive, _ = Airport.objects.get_or_create(
+            code="FLA", defaults={"name": "压测到达机场", "city": "压测到达", "country": "中国"}
+        )
+        depart_time = timezone.now() + timedelta(days=7)
+        flight = Flight.objects.create(
+            flight_no=f"FS{int(time.time()) % 10000:04d}",
+            airline="压测航空",
+            plane_type="A320",
+            depart_airport=depart,
+            arrive_airport=arrive,
+            depart_time=depart_time,
+            arrive_time=depart_time + timedelta(hours=2),
+            base_price=Decimal("500.00"),
+        )
+        seat = FlightSeat.objects.create(
+            flight=flight,
+            cabin_class=CabinClass.ECONOMY,
+            total_seats=options["seats"],
+            available_seats=options["seats"],
+            price=Decimal("500.00"),
+        )
+        if options["shards"]:
+            shard_seat(seat.pk, options["shards"])
+            seat.refresh_from_db()
+
+        run = uuid.uuid4().hex[:8]
+        users = User.objects.bulk_create(
+            User(username=f"{USER_PREFIX}{run}-{i}", password="!") for i in range(options["users"])
+        )
+        PassengerProfile.objects.bulk_create(
+            PassengerProfile(
+                user=user,
+                real_name=user.username,
+                id_card_no=f"FLASH{run}{i:07d}",
+                phone="",
+                email="",
+            )
+            for i, user in enumerate(users)
+        )
+        return flight, seat, users
+
+    def _cleanup(self, flight, users):
+        orders = TicketOrder.objects.filter(flight=flight)
+        # 压测支付已经计入每日营收汇总，删除订单后按订单表重算这些日期
+        days = affected_days(orders.values_list("pk", flat=True))
+        orders.delete()
+        recompute_days(days)
+        flight.delete()
+        User.objects.filter(pk__in=[u.pk for u in users]).delete()
+        # 压测机场上还有航班（之前用 --keep 保留的）时先不删
+        Airport.objects.filter(
+            code__in=BENCH_AIRPORTS, depart_flights__isnull=True, arrive_flights__isnull=True
+        ).delete()
+
+    def _drive(self, flight, seat, users, options):
+        host = _http_host()
+        processes = max(1, options["processes"])
+        chunks = [users[i::processes] for i in range(processes)]
+        jobs = [
+            (chunk, flight.pk, seat.pk, max(1, options["pay_every"]), options["concurrency"], host)
+            for chunk in chunks
+        ]
+        if processes == 1:
+            return [_run_threads(jobs[0])]
+        if connection.vendor == "sqlite":
+            raise CommandError("SQLite 不支持多进程并发写入，请使用 --processes 1")
+        connections.close_all()
+        with multiprocessing.get_context("fork").Pool(processes) as pool:
+            return pool.map(_run_threads, jobs)
+
+    def _report(self, results, elapsed):
+        outcomes = {}
+        create, pay, lock_waits = [], [], []
+        for rows, waits in results:
+            lock_waits.extend(waits)
+            for outcome, create_seconds, pay_seconds in rows:
+                outcomes[outcome] = outcomes.get(outcome, 0) + 1
+                create.append(create_seconds)
+                if pay_seconds is not None:
+                    pay.append(pay_seconds)
+
+        total = sum(outcomes.values())
+        requests = len(create) + len(pay)
+        self.stdout.write(
+            f"耗时 {elapsed:.2f}s，{total / elapsed:.1f} 用户/s，{requests / elapsed:.1f} 请求/s"
+        )
+        self.stdout.write("结果：" + "，".join(f"{k}={v}" for k, v in sorted(outcomes.items())))
+        for label, values in (("下单", create), ("支付", pay)):
+            if values:
+                self.stdout.write(
+                    f"{label}延迟 p50={statistics.median(values) * 1000:.1f}ms "
+                    f"p99={_percentile(values, 0.99) * 1000:.1f}ms"
+                )
+        if lock_waits:
+            self.stdout.write(
+                f"库存 UPDATE {len(lock_waits)} 次，合计 {sum(lock_waits):.2f}s，"
+                f"p50={statistics.median(lock_waits) * 1000:.2f}ms "
+                f"p99={_percentile(lock_waits, 0.99) * 1000:.2f}ms"
+            )
+
+    def _verify(self, seat, initial):
+        if seat.shard_count:
+            reconcile_shards([seat.pk])
+        seat.refresh_from_db()
+        sold = TicketOrder.objects.filter(seat=seat, status__in=ACTIVE).count()
+        remaining = available_seats(seat)
+        self.stdout.write(f"座位核对：初始 {initial}，已售 {sold}，剩余 {remaining}")
+        if sold > initial:
+            self.stdout.write(self.style.ERROR(f"超卖 {sold - initial} 张"))
+        elif sold + remaining < initial:
+            self.stdout.write(self.style.ERROR(f"丢失 {initial - sold - remaining} 张（既未售出也未回到库存）"))
+        elif sold + remaining > initial:
+            self.stdout.write(self.style.ERROR(f"库存多出 {sold + remaining - initial} 张"))
+        else:
+            self.stdout.write(self.style.SUCCESS("没有超卖，也没有丢票"))
+
+    def handle(self, *args, **options):
+        flight, seat, users = self._seed(options)
+        self.stdout.write(
+            f"数据库 {connection.vendor}：{len(users)} 个用户抢 {options['seats']} 个座位，"
+            f"{options['processes']} 进程 × {options['concurrency']} 线程"
+            + (f"，库存分 {options['shards']} 片" if options["shards"] else "")
+        )
+        try:
+            started = time.perf_counter()
+            results = self._drive(flight, seat, users, options)
+            self._report(results, time.perf_counter() - started)
+            self._verify(seat, options["seats"])
+        finally:
+            if not options["keep"]:
+                self._cleanup(flight, users)
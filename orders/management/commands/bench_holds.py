@@ -0,0 +1,97 @@
+import time
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from accounts.models import PassengerProfile
+from flights.models import FlightSeat
+from orders.expiry import expire_holds
+from orders.holds import DatabaseHoldStore, InMemoryHoldStore, MAX_HOLD
+from orders.models import TicketOrder, OrderStatus
+
+BACKENDS = {
+    "db": lambda: DatabaseHoldStore(),
+    # 压测时不启动后台清理线程，到期释放单独计时
+    "memory": lambda: InMemoryHoldStore(reap_interval=0),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "压测保座存储：分别统计 place / extend / release 以及到期释放（取消订单 + 归还座位）"
+        "的每秒操作数。测试数据（临时乘机人和订单）在事务中创建，结束后全部回滚"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--holds", type=int, default=2000, help="保座数量，默认 2000")
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--backend", choices=tuple(BACKENDS), help="只压测其中一个后端")
+
+    def _timed(self, label, count, func):
+        started = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - started
+        rate = count / elapsed if elapsed else float("inf")
+        self.stdout.write(f"  {label:<8} {count:>7} 次  {rate:10.1f} ops/s  ({elapsed * 1000:.1f}ms)")
+
+    def _passengers(self, name, count):
+        # 同一乘机人同一航班只能有一个有效订单，每个保座用一个临时乘机人
+        users = User.objects.bulk_create(
+            User(username=f"bench-{name}-{i}", password="!") for i in range(count)
+        )
+        return PassengerProfile.objects.bulk_create(
+            PassengerProfile(
+                user=user,
+                real_name=user.username,
+                id_card_no=f"BENCH{name}{i:010d}",
+                phone="",
+                email="",
+            )
+            for i, user in enumerate(users)
+        )
+
+    def _bench(self, name, seat, options):
+        count = options["holds"]
+        store = BACKENDS[name]()
+        self.stdout.write(f"{name}:")
+        with transaction.atomic():
+            profiles = self._passengers(name, count)
+            orders = TicketOrder.objects.bulk_create(
+                TicketOrder(
+                    order_no=f"BENCH{name}{i:010d}",
+                    user=profile.user,
+                    profile=profile,
+                    flight_id=seat.flight_id,
+                    seat=seat,
+                    status=OrderStatus.RESERVED,
+                    ticket_price=seat.price,
+                    total_amount=seat.price,
+                )
+                for i, profile in enumerate(profiles)
+            )
+            until = timezone.now() + timedelta(minutes=1)
+            paid = orders[: count // 2]
+
+            self._timed("place", count, lambda: [store.place(o) for o in orders])
+            self._timed("extend", count, lambda: [store.extend(o, until) for o in orders])
+            self._timed("release", len(paid), lambda: [store.release(o.pk) for o in paid])
+            # 剩余一半按到期处理：取消订单并归还座位
+            later = timezone.now() + MAX_HOLD + timedelta(minutes=1)
+            self._timed(
+                "expire",
+                count - len(paid),
+                lambda: expire_holds(store=store, batch_size=options["batch_size"], now=later),
+            )
+            transaction.set_rollback(True)
+
+    def handle(self, *args, **options):
+        seat = FlightSeat.objects.select_related("flight").first()
+        if seat is None:
+            raise CommandError("需要至少一个舱位才能压测")
+
+        for name in BACKENDS:
+            if options["backend"] in (None, name):
+                self._bench(name, seat, options)
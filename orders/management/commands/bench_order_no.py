@@ -0,0 +1,95 @@
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from orders.order_no import OrderNoGenerator
+
+SCHEMES = {
+    "uuid4": lambda: (lambda: uuid.uuid4().hex[:20]),
+    "ksortable": lambda: OrderNoGenerator(),
+}
+
+
+def _quote(name):
+    return connection.ops.quote_name(name)
+
+
+class Command(BaseCommand):
+    help = (
+        "对比订单号方案（uuid4 前 20 位 vs 按时间递增）在大表上的插入吞吐量和唯一索引大小。"
+        "在独立的临时表上测试，不影响业务数据；建议在 PostgreSQL 上以千万级行数运行"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=10_000_000, help="每种方案插入的行数")
+        parser.add_argument("--batch-size", type=int, default=10_000)
+        parser.add_argument(
+            "--report-every", type=int, default=1_000_000, help="每插入多少行输出一次阶段吞吐量"
+        )
+        parser.add_argument("--scheme", choices=tuple(SCHEMES), help="只测试其中一种方案")
+        parser.add_argument("--keep", action="store_true", help="测试结束后保留临时表")
+
+    def _create(self, table, index):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {_quote(table)}")
+            cursor.execute(f"CREATE TABLE {_quote(table)} (order_no varchar(32) NOT NULL)")
+            cursor.execute(f"CREATE UNIQUE INDEX {_quote(index)} ON {_quote(table)} (order_no)")
+
+    def _index_size(self, index):
+        with connection.cursor() as cursor:
+            if connection.vendor == "postgresql":
+                cursor.execute("SELECT pg_relation_size(%s::regclass)", [index])
+                return cursor.fetchone()[0]
+            if connection.vendor == "sqlite":
+                try:
+                    cursor.execute("SELECT SUM(pgsize) FROM dbstat WHERE name = %s", [index])
+                    return cursor.fetchone()[0]
+                except Exception:  # 未编译 dbstat 扩展
+                    return None
+        return None
+
+    def _run(self, name, options):
+        table = f"bench_order_no_{name}"
+        index = f"{table}_uniq"
+        rows, batch_size = options["rows"], options["batch_size"]
+        generate = SCHEMES[name]()
+        self._create(table, index)
+
+        sql_head = f"INSERT INTO {_quote(table)} (order_no) VALUES "
+        inserted = 0
+        started = stage_started = time.perf_counter()
+        stage_rows = 0
+        while inserted < rows:
+            size = min(batch_size, rows - inserted)
+            values = [generate() for _ in range(size)]
+            with connection.cursor() as cursor:
+                cursor.execute(sql_head + ",".join(["(%s)"] * size), values)
+            inserted += size
+            stage_rows += size
+            if stage_rows >= options["report_every"] or inserted == rows:
+                now = time.perf_counter()
+                self.stdout.write(
+                    f"  {name:<9} {inserted:>11,} 行  阶段 {stage_rows / (now - stage_started):10.0f} rows/s"
+                )
+                stage_started, stage_rows = now, 0
+        elapsed = time.perf_counter() - started
+
+        size = self._index_size(index)
+        size_text = f"{size / 1024 / 1024:.1f} MiB" if size is not None else "未知"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{name:<9} 共 {rows:,} 行，{elapsed:.1f}s，平均 {rows / elapsed:.0f} rows/s，"
+                f"唯一索引 {size_text}"
+            )
+        )
+        if not options["keep"]:
+            with connection.cursor() as cursor:
+                cursor.execute(f"DROP TABLE {_quote(table)}")
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"数据库：{connection.vendor}，每种方案 {options['rows']:,} 行")
+        for name in SCHEMES:
+            if options["scheme"] in (None, name):
+                self._run(name, options)
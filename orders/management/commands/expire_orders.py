@@ -0,0 +1,12 @@
+from air_ticket_system.scheduler import PeriodicCommand
+from orders.expiry import expire_reserved_orders
+
+
+class Command(PeriodicCommand):
+    help = "批量取消超过支付时限的未支付订单并归还座位（可用 --interval 常驻运行）"
+
+    def run_once(self, **options):
+        cancelled = expire_reserved_orders(batch_size=options["batch_size"])
+        if cancelled:
+            return f"已取消 {cancelled} 个超时未支付订单"
+        return ""
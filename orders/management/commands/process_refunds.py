@@ -0,0 +1,18 @@
+from air_ticket_system.scheduler import PeriodicCommand
+from orders.refunds import DatabaseRefundQueue, metrics, queue_stats
+
+
+class Command(PeriodicCommand):
+    help = "批量处理待审核的退票申请：订单改为已退票并按舱位归还座位（可用 --interval 常驻运行）"
+
+    def run_once(self, **options):
+        approved, rejected = DatabaseRefundQueue().drain(batch_size=options["batch_size"])
+        if not approved and not rejected:
+            return ""
+        stats = metrics.snapshot()
+        queued = queue_stats()
+        return (
+            f"退票通过 {approved} 笔，驳回 {rejected} 笔；"
+            f"累计 {stats['batches']} 批，{stats['per_second']} 笔/秒；"
+            f"队列剩余 {queued['pending']} 笔，最早一笔已等待 {queued['lag_seconds']}s"
+        )
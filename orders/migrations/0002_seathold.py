@@ -0,0 +1,28 @@
+# Generated by Django 4.2.30 on 2026-10-17 01:52
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flights', '0003_flightseat_shards'),
+        ('orders', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='ticketorder',
+            name='status',
+            field=models.CharField(choices=[('RESERVED', '已预订'), ('PAID', '已支付'), ('CANCELLED', '已取消'), ('REFUNDING', '退票中'), ('REFUNDED', '已退票')], default='RESERVED', max_length=20),
+        ),
+        migrations.CreateModel(
+            name='SeatHold',
+            fields=[
+                ('order', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='hold', serialize=False, to='orders.ticketorder')),
+                ('expires_at', models.DateTimeField(db_index=True)),
+                ('seat', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='flights.flightseat')),
+            ],
+        ),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 4.2.30 on 2026-10-17 01:54
+
+from django.db import migrations, models
+from django.db.models import Count, F
+from django.utils import timezone
+
+INACTIVE = ["CANCELLED", "REFUNDED"]
+
+
+def cancel_duplicate_active_orders(apps, schema_editor):
+    """
+    加唯一约束前清理历史数据：同一用户同一航班有多个有效订单时只保留一个。
+    只会取消未支付（RESERVED）的重复订单并归还座位；优先保留已支付 / 退票中的订单，
+    其次保留最早创建的。同一组里有两个以上已付款的订单时不做任何修改、直接中止迁移，
+    列出这些订单号，需要先按退票流程处理后再重新执行 migrate。
+    升级到这里时还没有库存分片，直接加回 FlightSeat.available_seats。
+    """
+    TicketOrder = apps.get_model("orders", "TicketOrder")
+    SeatHold = apps.get_model("orders", "SeatHold")
+    FlightSeat = apps.get_model("flights", "FlightSeat")
+
+    active = TicketOrder.objects.exclude(status__in=INACTIVE)
+    duplicated = (
+        active.values("user_id", "flight_id").annotate(n=Count("id")).filter(n__gt=1)
+    )
+    to_cancel, paid_conflicts = [], []
+    for group in duplicated:
+        orders = sorted(
+            active.filter(user_id=group["user_id"], flight_id=group["flight_id"]),
+            key=lambda o: (o.status == "RESERVED", o.created_at, o.pk),
+        )
+        paid = [o for o in orders if o.status != "RESERVED"]
+        if len(paid) > 1:
+            paid_conflicts.extend(o.order_no for o in paid)
+        to_cancel.extend(o for o in orders[1:] if o.status == "RESERVED")
+
+    if paid_conflicts:
+        raise RuntimeError(
+            "以下订单属于同一用户同一航班的多个已付款订单，无法自动取消，"
+            "请先为多余的订单办理退票后再执行 migrate：" + ", ".join(paid_conflicts)
+        )
+
+    now = timezone.now()
+    for order in to_cancel:
+        TicketOrder.objects.filter(pk=order.pk).update(status="CANCELLED", cancelled_at=now)
+        SeatHold.objects.filter(order_id=order.pk).delete()
+        FlightSeat.objects.filter(pk=order.seat_id).update(
+            available_seats=F("available_seats") + 1
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0002_seathold'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ticketorder',
+            name='idempotency_key',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='ticketorder',
+            constraint=models.UniqueConstraint(fields=('user', 'idempotency_key'), name='order_user_idempotency_key'),
+        ),
+        migrations.RunPython(cancel_duplicate_active_orders, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='ticketorder',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['CANCELLED', 'REFUNDED']), _negated=True), fields=('user', 'flight'), name='order_one_active_per_user_flight'),
+        ),
+    ]
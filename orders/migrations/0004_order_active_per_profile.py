@@ -0,0 +1,21 @@
+# Generated by Django 4.2.30 on 2026-10-17 01:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0003_order_idempotency'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='ticketorder',
+            name='order_one_active_per_user_flight',
+        ),
+        migrations.AddConstraint(
+            model_name='ticketorder',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['CANCELLED', 'REFUNDED']), _negated=True), fields=('profile', 'flight'), name='order_one_active_per_profile_flight'),
+        ),
+    ]
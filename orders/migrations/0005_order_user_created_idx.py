@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-17 01:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0004_order_active_per_profile'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ticketorder',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='order_user_created_idx'),
+        ),
+    ]
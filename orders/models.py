@@ -1,14 +1,19 @@
 # from django.db import models
 #
 # # Create your models here.
+from datetime import timedelta
+
 from django.db import models
 from django.contrib.auth.models import User
-from django.utils import timezone
 
 from accounts.models import PassengerProfile
 from flights.models import Flight, FlightSeat
 
 
+# 预订后需在该时限内完成支付，超时由 expire_orders 命令批量取消
+PAYMENT_TIMEOUT = timedelta(minutes=15)
+
+
 class OrderStatus(models.TextChoices):
     RESERVED = "RESERVED", "已预订"
     PAID = "PAID", "已支付"
@@ -17,6 +22,10 @@ class OrderStatus(models.TextChoices):
     REFUNDED = "REFUNDED", "已退票"
 
 
+# 计入“已售”的订单状态（退票中的订单仍占着座位）
+SOLD_STATUSES = [OrderStatus.PAID, OrderStatus.REFUNDING]
+
+
 class TicketOrder(models.Model):
     order_no = models.CharField(max_length=32, unique=True)
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="orders")
@@ -44,15 +53,52 @@ class TicketOrder(models.Model):
     cancelled_at = models.DateTimeField(null=True, blank=True)
     refunded_at = models.DateTimeField(null=True, blank=True)
 
+    # 客户端提交的幂等键：同一用户重复提交同一个键时返回第一次创建的订单
+    idempotency_key = models.CharField(max_length=64, null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # “我的订单”按 (created_at, id) 倒序游标分页
+            models.Index(fields=["user", "-created_at", "-id"], name="order_user_created_idx"),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "idempotency_key"], name="order_user_idempotency_key"
+            ),
+            # 同一乘机人同一航班最多一个有效订单（已取消、已退票的不算），由数据库在插入时保证；
+            # 团体订票时一个账号可以为多位乘机人下单
+            models.UniqueConstraint(
+                fields=["profile", "flight"],
+                condition=~models.Q(status__in=[OrderStatus.CANCELLED, OrderStatus.REFUNDED]),
+                name="order_one_active_per_profile_flight",
+            ),
+        ]
+
     def mark_paid(self):
-        self.status = OrderStatus.PAID
-        self.paid_at = timezone.now()
-        self.save()
+        """RESERVED -> PAID；订单已不是 RESERVED 时返回 False。"""
+        from .state import advance
+
+        return advance(self, OrderStatus.RESERVED, OrderStatus.PAID)
 
     def __str__(self):
         return f"{self.order_no} - {self.flight.flight_no}"
 
 
+class SeatHold(models.Model):
+    """
+    未支付订单占用的座位（数据库保座后端，见 orders.holds.DatabaseHoldStore）。
+    到期后由 expire_orders 命令取消订单并归还座位。
+    """
+    order = models.OneToOneField(
+        TicketOrder, primary_key=True, on_delete=models.CASCADE, related_name="hold"
+    )
+    seat = models.ForeignKey(FlightSeat, on_delete=models.CASCADE, related_name="+")
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"Hold {self.order_id} until {self.expires_at}"
+
+
 class RefundStatus(models.TextChoices):
     PENDING = "PENDING", "待审核"
     APPROVED = "APPROVED", "已同意"
@@ -0,0 +1,97 @@
+# orders/order_no.py
+"""
+按时间递增的订单号生成器（k-sortable），20 位纯数字：
+
+    13 位毫秒时间戳 + 3 位节点号 + 4 位序号
+    1760680000123     042       0007
+
+- 新订单号总是落在 order_no 唯一索引的最右侧，插入只写最后几个页，
+  不会像 uuid4 那样随机分散到整棵 B-tree 上，表越大差距越明显
+- 节点号区分不同的进程 / 机器：优先使用 settings.ORDER_NO_NODE_ID（0-999），
+  未配置时由主机名和进程号计算；各进程之间无需任何协调。计算出的节点号只有 1000 个取值，
+  worker 多时可能相同，所以使用 SQLite 以外的数据库且未配置时会给出警告（orders.W001）
+- 同一毫秒内序号递增（起始值随机，进一步降低节点号碰撞时的冲突概率），
+  一毫秒内用完 10000 个序号时等待下一毫秒；系统时钟回拨时沿用上次的时间戳
+"""
+import logging
+import os
+import random
+import socket
+import threading
+import time
+import zlib
+
+from django.conf import settings
+
+from .checks import node_id_collision_risk
+
+logger = logging.getLogger(__name__)
+
+NODE_MODULO = 1000
+SEQUENCE_MODULO = 10000
+
+
+def default_node_id():
+    node_id = getattr(settings, "ORDER_NO_NODE_ID", None)
+    if node_id is not None:
+        return int(node_id) % NODE_MODULO
+    seed = f"{socket.gethostname()}:{os.getpid()}".encode()
+    node_id = zlib.crc32(seed) % NODE_MODULO
+    if node_id_collision_risk():
+        # gunicorn 等不会执行系统检查（orders.W001），在每个进程第一次生成订单号时再提醒一次
+        logger.warning(
+            "未配置 ORDER_NO_NODE_ID，按主机名和进程号计算出节点号 %03d；"
+            "多个 worker 的节点号可能相同，请为每个 worker 显式配置",
+            node_id,
+        )
+    return node_id
+
+
+class OrderNoGenerator:
+    def __init__(self, node_id=None):
+        self.node_id = default_node_id() if node_id is None else node_id % NODE_MODULO
+        self._lock = threading.Lock()
+        self._last_ms = 0
+        self._start = 0
+        self._issued = 0
+
+    def _next(self):
+        with self._lock:
+            now_ms = max(int(time.time() * 1000), self._last_ms)
+            if now_ms == self._last_ms and self._issued >= SEQUENCE_MODULO:
+                # 本毫秒序号已用完，等到下一毫秒
+                while now_ms <= self._last_ms:
+                    time.sleep(0.0001)
+                    now_ms = int(time.time() * 1000)
+            if now_ms != self._last_ms:
+                self._last_ms = now_ms
+                self._start = random.randrange(SEQUENCE_MODULO)
+                self._issued = 0
+            sequence = (self._start + self._issued) % SEQUENCE_MODULO
+            self._issued += 1
+            return now_ms, sequence
+
+    def __call__(self):
+        now_ms, sequence = self._next()
+        return f"{now_ms:013d}{self.node_id:03d}{sequence:04d}"
+
+
+_generator = None
+_generator_pid = None
+_generator_lock = threading.Lock()
+
+
+def _get_generator():
+    # 加锁创建：两个线程各建一个生成器时节点号相同、序号各自计数，同一毫秒内会生成相同的订单号
+    global _generator, _generator_pid
+    pid = os.getpid()
+    if _generator is None or _generator_pid != pid:
+        with _generator_lock:
+            if _generator is None or _generator_pid != pid:
+                _generator, _generator_pid = OrderNoGenerator(), pid
+    return _generator
+
+
+def generate_order_no():
+    """返回新的订单号；fork 出的子进程会重新计算节点号。"""
+    return _get_generator()()
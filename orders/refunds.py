@@ -0,0 +1,225 @@
+# orders/refunds.py
+"""
+异步退票：用户提交退票只写一条 PENDING 的 RefundRecord 并把订单改为“退票中”，
+由后台 worker 分批审核通过、把订单改为“已退票”并归还座位。
+
+每批一个短事务：
+1. 锁住本批仍为 PENDING 的退票记录（skip_locked，多个 worker 可以并行）
+2. 一条 UPDATE 把对应的 REFUNDING 订单改为 REFUNDED（手续费取自退票记录）
+3. 一条 UPDATE 把退票记录改为 APPROVED
+4. 按舱位汇总，每个舱位一条 UPDATE 归还座位
+
+队列后端由 settings.REFUND_QUEUE_BACKEND 选择：
+- DatabaseRefundQueue：退票记录表本身就是队列，由 process_refunds 命令轮询（默认）
+- LocalRefundQueue：进程内队列 + 后台线程，提交后立即处理，不依赖任何外部服务；
+  只适合单进程部署。进程重启时遗留的 PENDING 记录仍由 process_refunds 兜底处理
+"""
+import logging
+import queue
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Count, Min, OuterRef, Subquery
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from flights.inventory import release_many
+
+from .models import TicketOrder, OrderStatus, RefundRecord, RefundStatus
+from .state import advance, transition
+
+logger = logging.getLogger(__name__)
+
+
+class RefundMetrics:
+    """本进程内的退票处理统计。"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.batches = 0
+            self.approved = 0
+            self.rejected = 0
+            self.busy_seconds = 0.0
+
+    def record(self, approved, rejected, seconds):
+        with self._lock:
+            self.batches += 1
+            self.approved += approved
+            self.rejected += rejected
+            self.busy_seconds += seconds
+
+    def snapshot(self):
+        with self._lock:
+            processed = self.approved + self.rejected
+            return {
+                "batches": self.batches,
+                "approved": self.approved,
+                "rejected": self.rejected,
+                "per_second": round(processed / self.busy_seconds, 1) if self.busy_seconds else 0.0,
+            }
+
+
+metrics = RefundMetrics()
+
+
+def process_batch(record_ids, now=None):
+    """
+    处理一批退票记录，返回 (审核通过数, 驳回数)。
+    订单已不是“退票中”的记录（数据异常）直接驳回；被其他 worker 锁住的记录留给下一轮。
+    """
+    now = now or timezone.now()
+    started = time.perf_counter()
+    with transaction.atomic():
+        records = dict(
+            RefundRecord.objects.select_for_update(skip_locked=True)
+            .filter(pk__in=record_ids, status=RefundStatus.PENDING)
+            .values_list("order_id", "pk")
+        )
+        if not records:
+            return 0, 0
+
+        rows = list(
+            TicketOrder.objects.filter(pk__in=records, status=OrderStatus.REFUNDING).values_list(
+                "id", "seat_id"
+            )
+        )
+        order_ids = [pk for pk, _ in rows]
+        fee = Subquery(RefundRecord.objects.filter(order_id=OuterRef("pk")).values("refund_fee")[:1])
+        transition(order_ids, OrderStatus.REFUNDING, OrderStatus.REFUNDED, now=now, fee=fee)
+        approved = RefundRecord.objects.filter(order_id__in=order_ids).update(
+            status=RefundStatus.APPROVED, approve_time=now
+        )
+        refunded = set(order_ids)
+        rejected_ids = [pk for order_id, pk in records.items() if order_id not in refunded]
+        rejected = RefundRecord.objects.filter(pk__in=rejected_ids).update(
+            status=RefundStatus.REJECTED, approve_time=now
+        )
+        release_many(Counter(seat_id for _, seat_id in rows))
+
+    metrics.record(approved, rejected, time.perf_counter() - started)
+    return approved, rejected
+
+
+def queue_stats():
+    """待处理的退票数量和最早一笔的等待秒数。"""
+    agg = RefundRecord.objects.filter(status=RefundStatus.PENDING).aggregate(
+        pending=Count("pk"), oldest=Min("request_time")
+    )
+    lag = (timezone.now() - agg["oldest"]).total_seconds() if agg["oldest"] else 0.0
+    return {"pending": agg["pending"], "lag_seconds": round(lag, 1)}
+
+
+class RefundQueue:
+    def enqueue(self, record_id):
+        """退票记录提交后调用（已在事务提交之后）。"""
+        raise NotImplementedError
+
+
+class DatabaseRefundQueue(RefundQueue):
+    def enqueue(self, record_id):
+        # PENDING 记录本身就在队列里，等待 process_refunds 轮询
+        pass
+
+    def claim(self, limit):
+        return list(
+            RefundRecord.objects.filter(status=RefundStatus.PENDING)
+            .order_by("request_time", "pk")
+            .values_list("pk", flat=True)[:limit]
+        )
+
+    def drain(self, batch_size=500):
+        """处理当前所有待退票记录，返回 (审核通过数, 驳回数)。"""
+        approved = rejected = 0
+        while True:
+            ids = self.claim(batch_size)
+            if not ids:
+                return approved, rejected
+            a, r = process_batch(ids)
+            if not a and not r:
+                # 这一批全部被其他 worker 锁住，留给它们处理
+                return approved, rejected
+            approved, rejected = approved + a, rejected + r
+
+
+class LocalRefundQueue(RefundQueue):
+    def __init__(self, batch_size=200, linger=0.05):
+        self.batch_size = batch_size
+        self.linger = linger  # 收到第一笔后再等一会儿，凑成批次
+        self._queue = queue.SimpleQueue()
+        self._worker = None
+        self._lock = threading.Lock()
+
+    def enqueue(self, record_id):
+        self._queue.put(record_id)
+        self._ensure_worker()
+
+    def _ensure_worker(self):
+        if self._worker is not None:
+            return
+        with self._lock:
+            if self._worker is None:
+                self._worker = threading.Thread(
+                    target=self._run_forever, name="refund-worker", daemon=True
+                )
+                self._worker.start()
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        time.sleep(self.linger)
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run_forever(self):
+        while True:
+            batch = self._next_batch()
+            close_old_connections()
+            try:
+                process_batch(batch)
+            except Exception:
+                # 未处理的记录仍为 PENDING，由 process_refunds 兜底
+                logger.exception("处理退票失败")
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_refund_queue() -> RefundQueue:
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                path = getattr(settings, "REFUND_QUEUE_BACKEND", "orders.refunds.DatabaseRefundQueue")
+                _queue = import_string(path)()
+    return _queue
+
+
+def submit_refund(order, fee, refund_amount, reason=""):
+    """
+    提交退票申请：已支付订单改为“退票中”并写入 PENDING 退票记录。
+    订单状态已变化（重复提交 / 并发请求）时返回 None。
+    """
+    with transaction.atomic():
+        if not advance(order, OrderStatus.PAID, OrderStatus.REFUNDING):
+            return None
+        record = RefundRecord.objects.create(
+            order=order,
+            status=RefundStatus.PENDING,
+            refund_amount=refund_amount,
+            refund_fee=fee,
+            reason=reason,
+        )
+        refund_queue = get_refund_queue()
+        transaction.on_commit(lambda: refund_queue.enqueue(record.pk))
+    return record
@@ -0,0 +1,88 @@
+# orders/state.py
+"""
+订单状态机：所有订单状态变更都经过这里，用比较并交换（compare-and-set）实现：
+
+    UPDATE orders_ticketorder SET status = <目标状态>, ...
+    WHERE id IN (...) AND status = <期望的当前状态>
+
+受影响行数就是成功迁移的订单数；状态已被其他请求改掉的订单不会被覆盖，
+也不需要提前 select_for_update 锁住订单行。
+
+允许的迁移：
+    RESERVED  -> PAID        支付
+    RESERVED  -> CANCELLED   超时 / 取消
+    PAID      -> REFUNDING   提交退票申请
+    REFUNDING -> REFUNDED    退票审核通过
+    PAID      -> REFUNDED    直接退票（后台操作）
+"""
+from django.dispatch import Signal
+from django.utils import timezone
+
+from .models import TicketOrder, OrderStatus
+
+TRANSITIONS = {
+    (OrderStatus.RESERVED, OrderStatus.PAID),
+    (OrderStatus.RESERVED, OrderStatus.CANCELLED),
+    (OrderStatus.PAID, OrderStatus.REFUNDING),
+    (OrderStatus.REFUNDING, OrderStatus.REFUNDED),
+    (OrderStatus.PAID, OrderStatus.REFUNDED),
+}
+
+# 进入某个状态时自动记录的时间字段
+TIMESTAMP_FIELDS = {
+    OrderStatus.PAID: "paid_at",
+    OrderStatus.CANCELLED: "cancelled_at",
+    OrderStatus.REFUNDED: "refunded_at",
+}
+
+
+# 状态迁移成功后发送（在同一事务中）：
+# order_ids 为尝试迁移的订单，updated 为实际迁移的数量（两者不等说明有订单被并发修改）
+order_transitioned = Signal()
+
+
+class InvalidTransition(ValueError):
+    pass
+
+
+def check_transition(source, target):
+    if (source, target) not in TRANSITIONS:
+        raise InvalidTransition(f"订单状态不能从 {source} 变为 {target}")
+
+
+def transition(order_ids, source, target, now=None, **fields):
+    """
+    把 order_ids 中当前状态为 source 的订单改为 target，返回成功迁移的订单数。
+    fields 为同时写入的其他字段（可以是 F / Subquery 表达式）；
+    目标状态对应的时间字段未指定时填入 now。
+    """
+    check_transition(source, target)
+    timestamp_field = TIMESTAMP_FIELDS.get(target)
+    if timestamp_field and timestamp_field not in fields:
+        fields[timestamp_field] = now or timezone.now()
+    order_ids = list(order_ids)
+    updated = TicketOrder.objects.filter(pk__in=order_ids, status=source).update(
+        status=target, **fields
+    )
+    if updated:
+        order_transitioned.send(
+            sender=TicketOrder, order_ids=order_ids, source=source, target=target, updated=updated
+        )
+    return updated
+
+
+def advance(order, source, target, now=None, **fields):
+    """
+    单个订单的状态迁移（fields 只能是普通值）；成功时同步更新内存中的 order 并返回 True，
+    订单已不处于 source 状态（被并发请求抢先修改）时返回 False。
+    """
+    check_transition(source, target)
+    timestamp_field = TIMESTAMP_FIELDS.get(target)
+    if timestamp_field and timestamp_field not in fields:
+        fields[timestamp_field] = now or timezone.now()
+    if not transition([order.pk], source, target, **fields):
+        return False
+    order.status = target
+    for name, value in fields.items():
+        setattr(order, name, value)
+    return True
@@ -1,3 +1,694 @@
-from django.test import TestCase
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock, skipUnless
+
+from django.contrib.auth.models import User
+from django.http import QueryDict
+from django.db import connection, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import BookingDelegate, PassengerProfile
+from dashboard.models import DailyRevenue
+from dashboard.revenue import backfill
+from air_ticket_system.query_budget import QueryBudgetTestMixin
+from flights.inventory import take_seats
+from flights.models import Airport, FlightSearchIndex
+from flights.tests import create_flight
+
+from .checks import check_order_no_node_id
+from .history import PAGE_SIZE
+from .expiry import expire_holds, expire_orphans
+from .holds import MAX_HOLD, DatabaseHoldStore, InMemoryHoldStore, extend_until
+from .models import (
+    PAYMENT_TIMEOUT,
+    OrderStatus,
+    RefundRecord,
+    RefundStatus,
+    SeatHold,
+    TicketOrder,
+)
+from .order_no import SEQUENCE_MODULO, OrderNoGenerator, default_node_id, generate_order_no
+from .refunds import process_batch, submit_refund
+from .state import InvalidTransition, advance, order_transitioned, transition
+from .views import ORDER_FAILED, PASSENGER_REJECTED
+
+
+class OrderListQueryBudgetTests(QueryBudgetTestMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        pvg = Airport.objects.create(code="PVG", name="浦东国际机场", city="上海", country="中国")
+        pek = Airport.objects.create(code="PEK", name="首都国际机场", city="北京", country="中国")
+        cls.user = User.objects.create_user("budget", password="pw123456")
+        profile = PassengerProfile.objects.create(
+            user=cls.user,
+            real_name="张三",
+            id_card_no="310000199001010000",
+            phone="13800000000",
+            email="budget@example.com",
+        )
+        base = timezone.now() + timedelta(days=3)
+        statuses = [OrderStatus.RESERVED, OrderStatus.PAID, OrderStatus.CANCELLED]
+        for i in range(PAGE_SIZE + 5):
+            flight = create_flight(f"MU52{i:02d}", pvg, pek, base + timedelta(hours=i))
+            seat = flight.seats.get()
+            TicketOrder.objects.create(
+                order_no=f"TEST{i:04d}",
+                user=cls.user,
+                profile=profile,
+                flight=flight,
+                seat=seat,
+                status=statuses[i % len(statuses)],
+                ticket_price=seat.price,
+                tax=Decimal("50.00"),
+                total_amount=seat.price + Decimal("50.00"),
+            )
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_order_list_within_budget(self):
+        response = self.assertWithinQueryBudget("orders:order_list")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context["orders"]), PAGE_SIZE)
+
+    def test_order_list_next_page_within_budget(self):
+        first = self.client.get(reverse("orders:order_list"))
+        self.assertTrue(first.context["next_query"])
+        response = self.assertWithinQueryBudget(
+            "orders:order_list", data=QueryDict(first.context["next_query"])
+        )
+        self.assertEqual(len(response.context["orders"]), 5)
+
+
+def create_passenger(username, id_card_no, phone):
+    user = User.objects.create_user(username, password="pw123456")
+    profile = PassengerProfile.objects.create(
+        user=user,
+        real_name=username,
+        id_card_no=id_card_no,
+        phone=phone,
+        email=f"{username}@example.com",
+    )
+    return user, profile
+
+
+class GroupBookingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        pvg = Airport.objects.create(code="PVG", name="浦东国际机场", city="上海", country="中国")
+        pek = Airport.objects.create(code="PEK", name="首都国际机场", city="北京", country="中国")
+        cls.flight = create_flight("MU5400", pvg, pek, timezone.now() + timedelta(days=3))
+        cls.seat = cls.flight.seats.get()
+        cls.user, cls.own = create_passenger("leader", "310000000000000001", "13800000001")
+        _, cls.friend = create_passenger("friend", "310000000000000002", "13800000002")
+        _, cls.stranger = create_passenger("stranger", "310000000000000003", "13800000003")
+        BookingDelegate.objects.create(profile=cls.friend, user=cls.user)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def book(self, *profiles):
+        url = reverse("orders:group_booking", args=[self.flight.pk, self.seat.pk])
+        lines = "\n".join(f"{p.id_card_no},{p.phone}" for p in profiles)
+        return self.client.post(url, {"passengers": lines})
+
+    def test_books_own_and_delegated_passengers(self):
+        response = self.book(self.own, self.friend)
+        self.assertRedirects(response, reverse("orders:order_list"))
+        self.assertEqual(
+            set(TicketOrder.objects.values_list("profile_id", flat=True)),
+            {self.own.pk, self.friend.pk},
+        )
+        self.seat.refresh_from_db()
+        self.assertEqual(self.seat.available_seats, 3)
+
+    def test_rejects_passenger_without_delegation(self):
+        response = self.book(self.own, self.stranger)
+        self.assertContains(response, PASSENGER_REJECTED)
+        self.assertFalse(TicketOrder.objects.exists())
+
+    def test_same_error_for_unknown_and_mismatched_passengers(self):
+        wrong_phone = PassengerProfile(id_card_no=self.friend.id_card_no, phone="13900000000")
+        unknown = PassengerProfile(id_card_no="310000000000000009", phone="13800000009")
+        for other in (wrong_phone, unknown, self.stranger):
+            with self.subTest(id_card_no=other.id_card_no, phone=other.phone):
+                response = self.book(self.own, other)
+                self.assertContains(response, PASSENGER_REJECTED)
+        self.assertFalse(TicketOrder.objects.exists())
+
+    def test_delegation_is_managed_by_the_passenger(self):
+        self.client.force_login(self.stranger.user)
+        self.client.post(reverse("accounts:add_delegate"), {"username": "leader"})
+        self.client.force_login(self.user)
+        self.assertRedirects(self.book(self.own, self.stranger), reverse("orders:order_list"))
+
+
+class DuplicateActiveOrderMigrationTests(TransactionTestCase):
+    """0003 在加“同一用户同一航班一个有效订单”约束前取消重复订单并归还座位。"""
+
+    before = [("orders", "0002_seathold")]
+    after = [("orders", "0003_order_idempotency")]
+
+    def setUp(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.before)
+        self.apps = executor.loader.project_state(self.before).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def create_fixtures(self):
+        Airport = self.apps.get_model("flights", "Airport")
+        Flight = self.apps.get_model("flights", "Flight")
+        FlightSeat = self.apps.get_model("flights", "FlightSeat")
+        User = self.apps.get_model("auth", "User")
+        Profile = self.apps.get_model("accounts", "PassengerProfile")
+
+        pvg = Airport.objects.create(code="PVG", name="浦东", city="上海", country="中国")
+        pek = Airport.objects.create(code="PEK", name="首都", city="北京", country="中国")
+        depart = timezone.now() + timedelta(days=3)
+        self.flight = Flight.objects.create(
+            flight_no="MU5500",
+            airline="东方航空",
+            plane_type="A320",
+            depart_airport=pvg,
+            arrive_airport=pek,
+            depart_time=depart,
+            arrive_time=depart + timedelta(hours=2),
+            base_price=Decimal("800.00"),
+        )
+        self.seat = FlightSeat.objects.create(
+            flight=self.flight,
+            cabin_class="ECONOMY",
+            total_seats=5,
+            available_seats=1,
+            price=Decimal("800.00"),
+        )
+        self.user = User.objects.create(username="dup")
+        self.profile = Profile.objects.create(
+            user=self.user, real_name="dup", id_card_no="1", phone="1", email="dup@example.com"
+        )
+
+    def order(self, no, status):
+        return self.apps.get_model("orders", "TicketOrder").objects.create(
+            order_no=no,
+            user=self.user,
+            profile=self.profile,
+            flight=self.flight,
+            seat=self.seat,
+            status=status,
+            ticket_price=Decimal("800.00"),
+            total_amount=Decimal("850.00"),
+        )
+
+    def test_reserved_duplicates_cancelled_and_seats_released(self):
+        Order = self.apps.get_model("orders", "TicketOrder")
+        SeatHold = self.apps.get_model("orders", "SeatHold")
+        self.create_fixtures()
+
+        reserved = self.order("DUP1", "RESERVED")
+        paid = self.order("DUP2", "PAID")
+        newer = self.order("DUP3", "RESERVED")
+        cancelled = self.order("DUP4", "CANCELLED")
+        SeatHold.objects.create(order=newer, seat=self.seat, expires_at=timezone.now())
+
+        MigrationExecutor(connection).migrate(self.after)
+
+        statuses = dict(Order.objects.values_list("order_no", "status"))
+        self.assertEqual(
+            statuses,
+            {"DUP1": "CANCELLED", "DUP2": "PAID", "DUP3": "CANCELLED", "DUP4": "CANCELLED"},
+        )
+        # 已支付的订单原样保留
+        paid.refresh_from_db()
+        self.assertEqual(paid.status, "PAID")
+        self.assertIsNone(paid.cancelled_at)
+        self.seat.refresh_from_db()
+        self.assertEqual(self.seat.available_seats, 3)
+        self.assertFalse(SeatHold.objects.exists())
+        self.assertIsNone(Order.objects.get(pk=cancelled.pk).cancelled_at)
+        self.assertIsNotNone(Order.objects.get(pk=reserved.pk).cancelled_at)
+
+    def test_paid_duplicates_abort_migration(self):
+        self.create_fixtures()
+        first = self.order("PAID1", "PAID")
+        self.order("PAID2", "REFUNDING")
+        reserved = self.order("DUP3", "RESERVED")
+
+        with self.assertRaisesMessage(RuntimeError, "PAID1, PAID2"):
+            MigrationExecutor(connection).migrate(self.after)
+
+        # 中止时不做任何修改
+        reserved.refresh_from_db()
+        self.assertEqual(reserved.status, "RESERVED")
+        self.seat.refresh_from_db()
+        self.assertEqual(self.seat.available_seats, 1)
+
+        # 人工退票后可以重新执行
+        first.status = "REFUNDED"
+        first.save()
+        MigrationExecutor(connection).migrate(self.after)
+        reserved.refresh_from_db()
+        self.assertEqual(reserved.status, "CANCELLED")
+
+
+class CreateOrderConflictTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        pvg = Airport.objects.create(code="PVG", name="浦东国际机场", city="上海", country="中国")
+        pek = Airport.objects.create(code="PEK", name="首都国际机场", city="北京", country="中国")
+        cls.flight = create_flight("MU5600", pvg, pek, timezone.now() + timedelta(days=3))
+        cls.other_flight = create_flight("MU5601", pvg, pek, timezone.now() + timedelta(days=4))
+        cls.seat = cls.flight.seats.get()
+        cls.user, cls.profile = create_passenger("buyer", "310000000000000011", "13800000011")
+        other = cls.other_flight.seats.get()
+        cls.existing = TicketOrder.objects.create(
+            order_no="TAKEN0001",
+            user=cls.user,
+            profile=cls.profile,
+            flight=cls.other_flight,
+            seat=other,
+            ticket_price=other.price,
+            total_amount=other.price,
+        )
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        self.url = reverse("orders:create_order", args=[self.flight.pk, self.seat.pk])
+
+    def available(self):
+        self.seat.refresh_from_db()
+        return self.seat.available_seats
+
+    def test_order_no_collision_is_retried(self):
+        with mock.patch("orders.views._generate_order_no", side_effect=["TAKEN0001", "FRESH0001"]):
+            with self.assertLogs("orders.views", "WARNING"):
+                response = self.client.post(self.url)
+        self.assertRedirects(
+            response,
+            reverse("orders:order_detail", args=["FRESH0001"]),
+            fetch_redirect_response=False,
+        )
+        self.assertEqual(self.available(), 4)
+
+    def test_persistent_collision_shows_generic_error(self):
+        with mock.patch("orders.views._generate_order_no", return_value="TAKEN0001"):
+            with self.assertLogs("orders.views", "WARNING") as logs:
+                response = self.client.post(self.url)
+        self.assertEqual(len(logs.records), 3)
+        self.assertContains(response, ORDER_FAILED)
+        self.assertEqual(self.available(), 5)
+
+    def test_duplicate_active_order(self):
+        self.client.post(self.url)
+        response = self.client.post(self.url)
+        self.assertContains(response, "请勿重复下单")
+        self.assertEqual(self.available(), 4)
+
+    def test_replayed_idempotency_key_returns_original_order(self):
+        first = self.client.post(self.url, {"idempotency_key": "k1"})
+        again = self.client.post(self.url, {"idempotency_key": "k1"})
+        self.assertEqual(first["Location"], again["Location"])
+        self.assertEqual(self.available(), 4)
+
+
+class OrderStateTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        pvg = Airport.objects.create(code="PVG", name="浦东国际机场", city="上海", country="中国")
+        pek = Airport.objects.create(code="PEK", name="首都国际机场", city="北京", country="中国")
+        cls.flight = create_flight("MU5650", pvg, pek, timezone.now() + timedelta(days=3))
+        cls.seat = cls.flight.seats.get()
+        cls.orders = []
+        for i in range(2):
+            user, profile = create_passenger(f"state{i}", f"31000000000000030{i}", "13800000030")
+            cls.orders.append(
+                TicketOrder.objects.create(
+                    order_no=f"STATE{i:04d}",
+                    user=user,
+                    profile=profile,
+                    flight=cls.flight,
+                    seat=cls.seat,
+                    ticket_price=cls.seat.price,
+                    total_amount=cls.seat.price,
+                )
+            )
+
+    def setUp(self):
+        self.sent = []
+
+        def receiver(**kwargs):
+            self.sent.append(kwargs)
+
+        order_transitioned.connect(receiver, weak=False)
+        self.addCleanup(order_transitioned.disconnect, receiver)
+
+    def test_invalid_transition_rejected(self):
+        order = self.orders[0]
+        for source, target in [
+            (OrderStatus.RESERVED, OrderStatus.REFUNDED),
+            (OrderStatus.PAID, OrderStatus.CANCELLED),
+            (OrderStatus.CANCELLED, OrderStatus.PAID),
+        ]:
+            with self.subTest(source=source, target=target):
+                with self.assertRaises(InvalidTransition):
+                    transition([order.pk], source, target)
+                with self.assertRaises(InvalidTransition):
+                    advance(order, source, target)
+        order.refresh_from_db()
+        self.assertEqual(order.status, OrderStatus.RESERVED)
+        self.assertEqual(self.sent, [])
+
+    def test_lost_race_changes_nothing(self):
+        stale = TicketOrder.objects.get(pk=self.orders[0].pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(advance(self.orders[0], OrderStatus.RESERVED, OrderStatus.CANCELLED))
+        self.assertEqual(len(self.sent), 1)
+
+        # 内存中的订单还是 RESERVED，但数据库里已被取消
+        self.assertFalse(advance(stale, OrderStatus.RESERVED, OrderStatus.PAID))
+        self.assertEqual(stale.status, OrderStatus.RESERVED)
+        self.assertIsNone(stale.paid_at)
+        self.assertEqual(transition([stale.pk], OrderStatus.RESERVED, OrderStatus.PAID), 0)
+        self.assertEqual(len(self.sent), 1)
+        self.assertFalse(DailyRevenue.objects.exists())
+
+    def test_partial_transition_recomputes_revenue(self):
+        first, second = self.orders
+        with self.captureOnCommitCallbacks(execute=True):
+            advance(first, OrderStatus.RESERVED, OrderStatus.PAID)
+        with self.captureOnCommitCallbacks(execute=True):
+            updated = transition([first.pk, second.pk], OrderStatus.RESERVED, OrderStatus.PAID)
+        self.assertEqual(updated, 1)
+        self.assertEqual(self.sent[-1]["updated"], 1)
+        # 只按增量累加会把已支付的 first 再算一遍；这里应按订单表重算为 2 单
+        row = DailyRevenue.objects.get(day=timezone.localdate())
+        self.assertEqual((row.paid_count, row.paid_amount), (2, self.seat.price * 2))
+
+    def test_admin_cannot_edit_status(self):
+        admin_user = User.objects.create_superuser("root", password="pw123456")
+        self.client.force_login(admin_user)
+        url = reverse("admin:orders_ticketorder_change", args=[self.orders[0].pk])
+        form = self.client.get(url).context["adminform"].form
+        self.assertNotIn("status", form.fields)
+        self.assertNotIn("paid_at", form.fields)
+
+
+def create_order(order_no, flight, user, profile, status=OrderStatus.RESERVED, **fields):
+    seat = flight.seats.get()
+    return TicketOrder.objects.create(
+        order_no=order_no,
+        user=user,
+        profile=profile,
+        flight=flight,
+        seat=seat,
+        status=status,
+        ticket_price=seat.price,
+        total_amount=seat.price,
+        **fields,
+    )
+
+
+class RefundProcessingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        pvg = Airport.objects.create(code="PVG", name="浦东国际机场", city="上海", country="中国")
+        pek = Airport.objects.create(code="PEK", name="首都国际机场", city="北京", country="中国")
+        cls.flight = create_flight("MU5660", pvg, pek, timezone.now() + timedelta(days=3), seats=2)
+        cls.seat = cls.flight.seats.get()
+        user, profile = create_passenger("refunder", "310000000000000040", "13800000040")
+        cls.order = create_order(
+            "REFUND0001", cls.flight, user, profile, OrderStatus.PAID, paid_at=timezone.now()
+        )
+        # 直接建的已支付订单没有经过状态机，先补上营收汇总
+        backfill()
+
+    def available(self):
+        self.seat.refresh_from_db()
+        return self.seat.available_seats
+
+    def submit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return submit_refund(self.order, Decimal("40.00"), Decimal("760.00"), "行程变更")
+
+    def test_approved_refund_releases_seat(self):
+        record = self.submit()
+        self.assertEqual(self.order.status, OrderStatus.REFUNDING)
+        # 重复提交不会再建一条记录
+        self.assertIsNone(submit_refund(self.order, Decimal("40.00"), Decimal("760.00")))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(process_batch([record.pk]), (1, 0))
+        self.order.refresh_from_db()
+        record.refresh_from_db()
+        self.assertEqual(self.order.status, OrderStatus.REFUNDED)
+        self.assertEqual(self.order.fee, Decimal("40.00"))
+        self.assertIsNotNone(self.order.refunded_at)
+        self.assertEqual(record.status, RefundStatus.APPROVED)
+        self.assertEqual(record.refund_amount, Decimal("760.00"))
+        self.assertEqual(record.approve_time, self.order.refunded_at)
+        self.assertEqual(self.available(), 3)
+        revenue = DailyRevenue.objects.get(day=timezone.localdate())
+        self.assertEqual((revenue.paid_count, revenue.refund_fee), (0, Decimal("40.00")))
+
+        # 已处理的记录不会再处理一次
+        self.assertEqual(process_batch([record.pk]), (0, 0))
+        self.assertEqual(self.available(), 3)
+
+    def test_record_for_order_no_longer_refunding_is_rejected(self):
+        record = self.submit()
+        TicketOrder.objects.filter(pk=self.order.pk).update(status=OrderStatus.PAID)
+
+        self.assertEqual(process_batch([record.pk]), (0, 1))
+        self.order.refresh_from_db()
+        record.refresh_from_db()
+        self.assertEqual(self.order.status, OrderStatus.PAID)
+        self.assertEqual(self.order.fee, Decimal("0"))
+        self.assertEqual(record.status, RefundStatus.REJECTED)
+        self.assertEqual(self.available(), 2)
+
+
+@skipUnless(connection.features.has_select_for_update_skip_locked, "需要 SKIP LOCKED 支持")
+class RefundSkipLockedTests(TransactionTestCase):
+    def setUp(self):
+        pvg = Airport.objects.create(code="PVG", name="浦东国际机场", city="上海", country="中国")
+        pek = Airport.objects.create(code="PEK", name="首都国际机场", city="北京", country="中国")
+        flight = create_flight("MU5661", pvg, pek, timezone.now() + timedelta(days=3))
+        user, profile = create_passenger("locked", "310000000000000041", "13800000041")
+        order = create_order(
+            "LOCKED0001", flight, user, profile, OrderStatus.PAID, paid_at=timezone.now()
+        )
+        backfill()
+        self.record = submit_refund(order, Decimal("40.00"), Decimal("760.00"))
+
+    def test_batch_claimed_by_another_worker_is_left_alone(self):
+        locked, release = threading.Event(), threading.Event()
+
+        def other_worker():
+            with transaction.atomic():
+                RefundRecord.objects.select_for_update().filter(pk=self.record.pk).first()
+                locked.set()
+                release.wait(5)
+            connection.close()
+
+        worker = threading.Thread(target=other_worker)
+        worker.start()
+        try:
+            self.assertTrue(locked.wait(5))
+            self.assertEqual(process_batch([self.record.pk]), (0, 0))
+            self.record.refresh_from_db()
+            self.assertEqual(self.record.status, RefundStatus.PENDING)
+        finally:
+            release.set()
+            worker.join()
+        self.assertEqual(process_batch([self.record.pk]), (1, 0))
+
+
+class HoldExpiryTestsMixin:
+    """两种保座后端共用的超时取消测试。"""
+
+    def make_store(self):
+        raise NotImplementedError
+
+    @classmethod
+    def setUpTestData(cls):
+        pvg = Airport.objects.create(code="PVG", name="浦东国际机场", city="上海", country="中国")
+        pek = Airport.objects.create(code="PEK", name="首都国际机场", city="北京", country="中国")
+        cls.flight = create_flight("MU5670", pvg, pek, timezone.now() + timedelta(days=3), seats=1)
+        cls.seat = cls.flight.seats.get()
+        cls.user, cls.profile = create_passenger("holder", "310000000000000050", "13800000050")
+
+    def setUp(self):
+        self.store = self.make_store()
+        # 下单：最后一个座位被占用，航班从搜索索引中移除
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(take_seats(self.seat))
+            self.order = create_order("HOLD0001", self.flight, self.user, self.profile)
+            self.store.place(self.order)
+        self.assertFalse(FlightSearchIndex.objects.filter(flight=self.flight).exists())
+        self.expired = self.order.created_at + PAYMENT_TIMEOUT + timedelta(seconds=1)
+
+    def expire_holds(self, now):
+        with self.captureOnCommitCallbacks(execute=True):
+            return expire_holds(store=self.store, now=now)
+
+    def assertCancelledAndReleased(self):
+        self.order.refresh_from_db()
+        self.seat.refresh_from_db()
+        self.assertEqual(self.order.status, OrderStatus.CANCELLED)
+        self.assertEqual(self.seat.available_seats, 1)
+        self.assertTrue(FlightSearchIndex.objects.filter(flight=self.flight).exists())
+
+    def test_expired_hold_cancels_order(self):
+        self.assertEqual(self.expire_holds(self.expired - timedelta(seconds=2)), 0)
+        self.assertEqual(self.expire_holds(self.expired), 1)
+        self.assertCancelledAndReleased()
+        # 保座已取出，不会重复取消
+        self.assertEqual(self.expire_holds(self.expired), 0)
+
+    def test_extended_hold_survives_original_deadline(self):
+        paying_at = self.expired - timedelta(seconds=30)
+        with mock.patch("django.utils.timezone.now", return_value=paying_at):
+            self.assertTrue(self.store.extend(self.order, extend_until(self.order, paying_at)))
+        self.assertEqual(self.expire_holds(self.expired), 0)
+        self.assertEqual(self.expire_holds(self.order.created_at + MAX_HOLD), 1)
+        self.assertCancelledAndReleased()
+
+    def test_released_hold_is_not_expired(self):
+        self.assertTrue(self.store.release(self.order.pk))
+        self.assertEqual(self.expire_holds(self.expired), 0)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, OrderStatus.RESERVED)
+
+    def test_hold_popped_while_order_locked_is_swept_later(self):
+        # 支付请求正锁着订单行：skip_locked 跳过它，但保座已被取出
+        with mock.patch.object(
+            TicketOrder.objects, "select_for_update", return_value=TicketOrder.objects.none()
+        ):
+            self.assertEqual(self.expire_holds(self.expired), 0)
+        self.assertEqual(self.store.pop_expired(self.expired, 10), [])
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, OrderStatus.RESERVED)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(expire_orphans(now=self.expired), 0)
+            self.assertEqual(expire_orphans(now=self.order.created_at + MAX_HOLD), 1)
+        self.assertCancelledAndReleased()
+
+
+class DatabaseHoldExpiryTests(HoldExpiryTestsMixin, TestCase):
+    def make_store(self):
+        return DatabaseHoldStore()
+
+
+class InMemoryHoldExpiryTests(HoldExpiryTestsMixin, TestCase):
+    def make_store(self):
+        return InMemoryHoldStore(reap_interval=0)
+
+
+@skipUnless(connection.features.has_select_for_update_skip_locked, "需要 SKIP LOCKED 支持")
+class HoldExpirySkipLockedTests(TransactionTestCase):
+    def test_order_locked_by_payment_is_skipped(self):
+        pvg = Airport.objects.create(code="PVG", name="浦东国际机场", city="上海", country="中国")
+        pek = Airport.objects.create(code="PEK", name="首都国际机场", city="北京", country="中国")
+        flight = create_flight("MU5671", pvg, pek, timezone.now() + timedelta(days=3))
+        user, profile = create_passenger("paying", "310000000000000051", "13800000051")
+        order = create_order("HOLD0002", flight, user, profile)
+        store = DatabaseHoldStore()
+        store.place(order)
+        expired = order.created_at + PAYMENT_TIMEOUT + timedelta(seconds=1)
+        locked, release = threading.Event(), threading.Event()
+
+        def payment():
+            with transaction.atomic():
+                TicketOrder.objects.select_for_update().filter(pk=order.pk).first()
+                locked.set()
+                release.wait(5)
+            connection.close()
+
+        worker = threading.Thread(target=payment)
+        worker.start()
+        try:
+            self.assertTrue(locked.wait(5))
+            self.assertEqual(expire_holds(store=store, now=expired), 0)
+        finally:
+            release.set()
+            worker.join()
+        self.assertFalse(SeatHold.objects.filter(order=order).exists())
+        self.assertEqual(expire_orphans(now=order.created_at + MAX_HOLD), 1)
+
+
+class OrderNoNodeIdCheckTests(SimpleTestCase):
+    @override_settings(ORDER_NO_NODE_ID=None)
+    def test_warns_without_node_id_on_server_database(self):
+        with mock.patch("orders.checks.connections") as conns:
+            conns.__getitem__.return_value.vendor = "postgresql"
+            errors = check_order_no_node_id(None)
+            with self.assertLogs("orders.order_no", "WARNING"):
+                default_node_id()
+        self.assertEqual([e.id for e in errors], ["orders.W001"])
+
+    @override_settings(ORDER_NO_NODE_ID=7)
+    def test_configured_node_id(self):
+        with mock.patch("orders.checks.connections") as conns:
+            conns.__getitem__.return_value.vendor = "postgresql"
+            self.assertEqual(check_order_no_node_id(None), [])
+        self.assertEqual(default_node_id(), 7)
+
+    @override_settings(ORDER_NO_NODE_ID=None)
+    def test_sqlite_is_not_flagged(self):
+        self.assertEqual(check_order_no_node_id(None), [])
+
+
+class OrderNoGeneratorTests(SimpleTestCase):
+    def test_numbers_are_unique_and_time_ordered(self):
+        generator = OrderNoGenerator(node_id=42)
+        numbers = [generator() for _ in range(5000)]
+        self.assertEqual(len(set(numbers)), len(numbers))
+        self.assertTrue(all(len(n) == 20 and n.isdigit() for n in numbers))
+        self.assertTrue(all(n[13:16] == "042" for n in numbers))
+        timestamps = [n[:13] for n in numbers]
+        self.assertEqual(timestamps, sorted(timestamps))
+
+    def test_exhausted_sequence_waits_for_next_millisecond(self):
+        clock = iter([1_000.0] * (SEQUENCE_MODULO + 1) + [1_000.001] * 10)
+        generator = OrderNoGenerator(node_id=1)
+        with mock.patch("orders.order_no.time.time", side_effect=lambda: next(clock)), mock.patch(
+            "orders.order_no.time.sleep"
+        ):
+            numbers = [generator() for _ in range(SEQUENCE_MODULO + 1)]
+        self.assertEqual(len(set(numbers)), len(numbers))
+        self.assertEqual({n[:13] for n in numbers[:-1]}, {"0000001000000"})
+        self.assertEqual(numbers[-1][:13], "0000001000001")
+
+    def test_concurrent_cold_start_shares_one_generator(self):
+        start = threading.Barrier(8)
+        results = []
+
+        def slow_node_id():
+            # 放大“多个线程同时创建生成器”的时间窗口
+            time.sleep(0.01)
+            return 3
+
+        def worker():
+            start.wait()
+            results.extend(generate_order_no() for _ in range(500))
+
+        with mock.patch("orders.order_no._generator", None), mock.patch(
+            "orders.order_no.default_node_id", slow_node_id
+        ):
+            threads = [threading.Thread(target=worker) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(len(results), 4000)
+        self.assertEqual(len(set(results)), len(results))
 
-# Create your tests here.
@@ -16,6 +16,13 @@ urlpatterns = [
         name="create_order",
     ),
 
+    # 团体订票：/orders/group/<flight_id>/<seat_id>/
+    path(
+        "group/<int:flight_id>/<int:seat_id>/",
+        views.group_booking,
+        name="group_booking",
+    ),
+
     # 支付订单：/orders/<order_no>/pay/
     path("<str:order_no>/pay/", views.pay_order, name="pay_order"),
 
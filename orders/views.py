@@ -1,25 +1,40 @@
 # from django.shortcuts import render
 #
 # # Create your views here.
+import logging
 import uuid
 from decimal import Decimal
-from datetime import timedelta
 
-from django.db import transaction
+from django.db import IntegrityError, transaction
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.utils import timezone
-from django.http import Http404, HttpResponseNotAllowed
+from django.http import Http404, HttpResponse, HttpResponseNotAllowed
 from django.db.models import Q
 
+from air_ticket_system.cursors import InvalidCursor
+from flights.inventory import take_seats
 from flights.models import Flight, FlightSeat
 from accounts.models import PassengerProfile
-from .models import TicketOrder, OrderStatus, RefundRecord, RefundStatus
-from .forms import RefundRequestForm
+from .models import TicketOrder, OrderStatus, PAYMENT_TIMEOUT
+from .forms import GroupBookingForm, RefundRequestForm
+from .history import order_page
+from .holds import get_hold_store, extend_until
+from .order_no import generate_order_no
+from .refunds import submit_refund
+from .state import advance
+
+logger = logging.getLogger(__name__)
+
+
+# 唯一约束冲突既不是重复提交也不是重复下单时（订单号碰撞），最多尝试的次数
+ORDER_INSERT_ATTEMPTS = 3
+ORDER_FAILED = "下单失败，请稍后重试"
 
 
 def _generate_order_no():
-    return uuid.uuid4().hex[:20]
+    # 按时间递增的订单号，插入总是落在唯一索引末尾，见 orders.order_no
+    return generate_order_no()
 
 
 def _calc_tax(price: Decimal) -> Decimal:
@@ -50,25 +65,51 @@ def _calc_refund_fee(order: TicketOrder):
 
 def _refresh_order_status(order: TicketOrder) -> TicketOrder:
     """
-    自动处理未支付订单的过期状态，并补充支付截止时间/倒计时信息。
+    补充未支付订单的支付截止时间/倒计时信息（只读，不写库）。
+    已超时但尚未被 expire_orders 命令处理的订单，按已取消展示。
     """
     if order.status == OrderStatus.RESERVED:
-        deadline = order.created_at + timedelta(minutes=15)
+        deadline = order.created_at + PAYMENT_TIMEOUT
         now = timezone.now()
         if now >= deadline:
             order.status = OrderStatus.CANCELLED
-            order.cancelled_at = now
-            order.save(update_fields=["status", "cancelled_at"])
-            # 归还座位
-            seat = order.seat
-            seat.available_seats += 1
-            seat.save(update_fields=["available_seats"])
+            order.cancelled_at = deadline
         else:
             order.payment_deadline = deadline
             order.remaining_seconds = int((deadline - now).total_seconds())
     return order
 
 
+def _idempotency_key(request):
+    """POST 表单中的 idempotency_key，或 Idempotency-Key 请求头（API 调用方使用）。"""
+    if request.method != "POST":
+        return None
+    key = request.POST.get("idempotency_key") or request.headers.get("Idempotency-Key")
+    key = (key or "").strip()
+    return key[:64] or None
+
+
+def _has_active_order(profile, flight):
+    return (
+        TicketOrder.objects.filter(profile=profile, flight=flight)
+        .exclude(status__in=[OrderStatus.CANCELLED, OrderStatus.REFUNDED])
+        .exists()
+    )
+
+
+def _replayed_order(user, idempotency_key, flight):
+    order = (
+        TicketOrder.objects.filter(user=user, idempotency_key=idempotency_key)
+        .only("order_no", "flight_id")
+        .first()
+    )
+    if order is None:
+        return None
+    if order.flight_id != flight.pk:
+        return HttpResponse("幂等键已用于其他订单", status=422)
+    return redirect("orders:order_detail", order_no=order.order_no)
+
+
 @login_required
 def create_order(request, flight_id, seat_id):
     flight = get_object_or_404(Flight, pk=flight_id)
@@ -84,79 +125,236 @@ def create_order(request, flight_id, seat_id):
 
     profile: PassengerProfile = request.user.profile
 
-    if flight.status != "ON_SALE":
+    idempotency_key = _idempotency_key(request)
+    if idempotency_key:
+        # 重复提交（重试 / 双击）：直接返回第一次创建的订单，不再扣减库存
+        replayed = _replayed_order(request.user, idempotency_key, flight)
+        if replayed is not None:
+            return replayed
+
+    if not flight.is_on_sale:
         raise Http404("航班不可售")
 
-    # 同一用户同一航班不得重复预订/支付（仅排除已取消或已退票的订单）
-    existing = TicketOrder.objects.filter(
-        user=request.user,
-        flight=flight,
-    ).exclude(status__in=[OrderStatus.CANCELLED, OrderStatus.REFUNDED])
-    if existing.exists():
+    if request.method == "POST":
+        for _ in range(ORDER_INSERT_ATTEMPTS):
+            try:
+                with transaction.atomic():
+                    # 条件更新扣减库存，不对舱位行加锁；余票不足时不做任何修改
+                    if not take_seats(seat):
+                        return render(
+                            request,
+                            "orders/order_error.html",
+                            {"message": "该舱位余票不足，请选择其他航班或舱位"},
+                        )
+
+                    ticket_price = seat.price
+                    tax = _calc_tax(ticket_price)
+                    total_amount = ticket_price + tax
+
+                    # 同一乘机人同一航班只能有一个有效订单、同一幂等键只能用一次，
+                    # 都由数据库唯一约束在插入时保证；冲突时整个事务（含库存扣减）回滚
+                    order = TicketOrder.objects.create(
+                        order_no=_generate_order_no(),
+                        user=request.user,
+                        profile=profile,
+                        flight=flight,
+                        seat=seat,
+                        status=OrderStatus.RESERVED,
+                        ticket_price=ticket_price,
+                        tax=tax,
+                        total_amount=total_amount,
+                        idempotency_key=idempotency_key,
+                    )
+                    # 保座 PAYMENT_TIMEOUT，到期未支付由清理任务取消订单并归还座位
+                    get_hold_store().place(order)
+                break
+            except IntegrityError:
+                # 各数据库的报错里不一定带约束名，重新查询判断是哪个唯一约束冲突
+                if idempotency_key:
+                    # 并发的重复提交先一步插入成功
+                    replayed = _replayed_order(request.user, idempotency_key, flight)
+                    if replayed is not None:
+                        return replayed
+                if _has_active_order(profile, flight):
+                    return render(
+                        request,
+                        "orders/order_error.html",
+                        {"message": "您已对该航班有预订或已支付订单，请勿重复下单。可在“我的订单”查看进度。"},
+                    )
+                # 其他冲突（如订单号碰撞）：事务已整体回滚，换一个订单号重试
+                logger.warning("创建订单时唯一约束冲突，重试", exc_info=True)
+        else:
+            return render(request, "orders/order_error.html", {"message": ORDER_FAILED})
+
+        return redirect("orders:order_detail", order_no=order.order_no)
+
+    # 简单确认页
+    return render(
+        request,
+        "orders/order_confirm.html",
+        {
+            "flight": flight,
+            "seat": seat,
+            "profile": profile,
+            "idempotency_key": uuid.uuid4().hex,
+        },
+    )
+
+
+@login_required
+def group_booking(request, flight_id, seat_id):
+    """
+    团体订票：一次为多位乘机人（本人或已授权本账号代订的乘机人）预订同一航班同一舱位。
+    一条 UPDATE 扣减 N 个座位、一次 bulk_create 写入 N 个订单，任一步失败整体回滚。
+    """
+    flight = get_object_or_404(
+        Flight.objects.select_related("depart_airport", "arrive_airport"), pk=flight_id
+    )
+    seat = get_object_or_404(FlightSeat, pk=seat_id, flight=flight)
+
+    if request.user.is_staff:
         return render(
             request,
             "orders/order_error.html",
-            {"message": "您已对该航班有预订或已支付订单，请勿重复下单。可在“我的订单”查看进度。"},
+            {"message": "管理员账号仅用于后台管理，不支持在线购票。请使用乘客账号下单。"},
         )
 
+    idempotency_key = _idempotency_key(request)
+    if idempotency_key:
+        replayed = _replayed_order(request.user, idempotency_key, flight)
+        if replayed is not None:
+            return replayed
+
+    if not flight.is_on_sale:
+        raise Http404("航班不可售")
+
     if request.method == "POST":
+        form = GroupBookingForm(request.POST)
+        if form.is_valid():
+            passengers = form.cleaned_data["passengers"]
+            profiles, error = _verify_passengers(request.user, passengers)
+            if error:
+                form.add_error("passengers", error)
+            else:
+                return _book_group(request, flight, seat, profiles, idempotency_key)
+    else:
+        form = GroupBookingForm(initial={"idempotency_key": uuid.uuid4().hex})
+
+    return render(
+        request,
+        "orders/group_booking.html",
+        {"flight": flight, "seat": seat, "form": form},
+    )
+
+
+# 不区分“未注册”“手机号不符”“未授权”，避免借团体订票探测他人的身份证号和手机号
+PASSENGER_REJECTED = "部分乘机人无法预订：请核对身份证号和手机号，并确认乘机人已在个人信息页授权本账号代订"
+
+
+def _verify_passengers(user, passengers):
+    """
+    查出本人或已授权 user 代订的乘机人并核对手机号，返回 (按输入顺序排列的 profiles, 错误信息)。
+    """
+    allowed = PassengerProfile.objects.filter(
+        Q(user=user) | Q(delegates__user=user),
+        id_card_no__in=[id_card_no for id_card_no, _ in passengers],
+    ).distinct()
+    by_id_card = {profile.id_card_no: profile for profile in allowed}
+    profiles = []
+    for id_card_no, phone in passengers:
+        profile = by_id_card.get(id_card_no)
+        if profile is None or profile.phone != phone:
+            return None, PASSENGER_REJECTED
+        profiles.append(profile)
+    return profiles, None
+
+
+def _book_group(request, flight, seat, profiles, idempotency_key):
+    ticket_price = seat.price
+    tax = _calc_tax(ticket_price)
+    try:
         with transaction.atomic():
-            seat_for_update = (
-                FlightSeat.objects.select_for_update()
-                .select_related("flight")
-                .get(pk=seat_id)
-            )
-            if seat_for_update.available_seats <= 0:
+            if not take_seats(seat, len(profiles)):
                 return render(
                     request,
                     "orders/order_error.html",
-                    {"message": "该舱位余票不足，请选择其他航班或舱位"},
+                    {"message": f"该舱位余票不足 {len(profiles)} 张，请选择其他航班或舱位"},
                 )
-
-            seat_for_update.available_seats -= 1
-            seat_for_update.save()
-
-            ticket_price = seat_for_update.price
-            tax = _calc_tax(ticket_price)
-            total_amount = ticket_price + tax
-
-            order = TicketOrder.objects.create(
-                order_no=_generate_order_no(),
-                user=request.user,
-                profile=profile,
-                flight=flight,
-                seat=seat_for_update,
-                status=OrderStatus.RESERVED,
-                ticket_price=ticket_price,
-                tax=tax,
-                total_amount=total_amount,
+            orders = TicketOrder.objects.bulk_create(
+                TicketOrder(
+                    order_no=_generate_order_no(),
+                    user=request.user,
+                    profile=profile,
+                    flight=flight,
+                    seat=seat,
+                    status=OrderStatus.RESERVED,
+                    ticket_price=ticket_price,
+                    tax=tax,
+                    total_amount=ticket_price + tax,
+                    # 幂等键只记在第一位乘机人的订单上，重复提交时据此识别
+                    idempotency_key=idempotency_key if i == 0 else None,
+                )
+                for i, profile in enumerate(profiles)
             )
+            get_hold_store().place_many(orders)
+    except IntegrityError:
+        if idempotency_key:
+            replayed = _replayed_order(request.user, idempotency_key, flight)
+            if replayed is not None:
+                return replayed
+        booked = list(
+            TicketOrder.objects.filter(flight=flight, profile__in=profiles)
+            .exclude(status__in=[OrderStatus.CANCELLED, OrderStatus.REFUNDED])
+            .values_list("profile__real_name", flat=True)
+        )
+        if not booked:
+            logger.warning("团体订票时唯一约束冲突", exc_info=True)
+            return render(request, "orders/order_error.html", {"message": ORDER_FAILED})
+        return render(
+            request,
+            "orders/order_error.html",
+            {"message": f"以下乘机人已有该航班的有效订单：{'、'.join(booked)}"},
+        )
 
-        return redirect("orders:order_detail", order_no=order.order_no)
-
-    # 简单确认页
-    return render(
-        request,
-        "orders/order_confirm.html",
-        {"flight": flight, "seat": seat, "profile": profile},
-    )
+    return redirect("orders:order_list")
 
 
 @login_required
 def order_list(request):
-    orders_qs = (
-        TicketOrder.objects.filter(user=request.user)
-        .select_related("flight", "seat")
-        .order_by("-created_at")
+    cursor = request.GET.get("cursor")
+    try:
+        orders, next_cursor = order_page(request.user, cursor)
+    except InvalidCursor:
+        cursor = None
+        orders, next_cursor = order_page(request.user)
+    orders = [_refresh_order_status(o) for o in orders]
+
+    params = request.GET.copy()
+    params.pop("cursor", None)
+    first_query = params.urlencode()
+    next_query = None
+    if next_cursor:
+        params["cursor"] = next_cursor
+        next_query = params.urlencode()
+
+    return render(
+        request,
+        "orders/order_list.html",
+        {
+            "orders": orders,
+            "first_query": first_query,
+            "next_query": next_query,
+            "is_first_page": not cursor,
+        },
     )
-    orders = [_refresh_order_status(o) for o in orders_qs]
-    return render(request, "orders/order_list.html", {"orders": orders})
 
 
 @login_required
 def order_detail(request, order_no):
     order = get_object_or_404(
-        TicketOrder.objects.select_related("flight", "seat", "profile"),
+        TicketOrder.objects.select_related(
+            "flight__depart_airport", "flight__arrive_airport", "seat", "profile"
+        ),
         order_no=order_no,
         user=request.user,
     )
@@ -187,27 +385,13 @@ def refund_request(request, order_no):
         form = RefundRequestForm(request.POST)
         if form.is_valid():
             reason = form.cleaned_data["reason"]
-            with transaction.atomic():
-                RefundRecord.objects.create(
-                    order=order,
-                    status=RefundStatus.APPROVED,
-                    refund_amount=refund_amount,
-                    refund_fee=fee,
-                    reason=reason,
-                    approve_time=timezone.now(),
-                )
-
-                order.status = OrderStatus.REFUNDED
-                order.fee = fee
-                order.refunded_at = timezone.now()
-                order.save()
-
-                seat_for_update = (
-                    FlightSeat.objects.select_for_update().get(pk=order.seat_id)
+            # 只登记退票申请，审核、归还座位由后台 process_refunds 批量处理
+            if submit_refund(order, fee, refund_amount, reason) is None:
+                return render(
+                    request,
+                    "orders/order_error.html",
+                    {"message": "只有已支付订单可以申请退票"},
                 )
-                seat_for_update.available_seats += 1
-                seat_for_update.save()
-
             return redirect("orders:order_detail", order_no=order.order_no)
     else:
         form = RefundRequestForm()
@@ -244,7 +428,16 @@ def pay_order(request, order_no):
     if request.method != "POST":
         return HttpResponseNotAllowed(["POST"])
 
-    order.status = OrderStatus.PAID
-    order.paid_at = timezone.now()
-    order.save(update_fields=["status", "paid_at"])
+    # 先延长保座，保证支付处理期间不会被清理任务取消；保座已到期说明订单已（或即将）取消
+    holds = get_hold_store()
+    now = timezone.now()
+    expired_message = {"message": "超过支付时限，订单已取消"}
+    if not holds.extend(order, extend_until(order, now)):
+        return render(request, "orders/order_error.html", expired_message)
+
+    # 只有仍为 RESERVED 的订单才能改为 PAID，避免与清理任务并发时把已取消的订单改回已支付
+    paid = advance(order, OrderStatus.RESERVED, OrderStatus.PAID, now=now)
+    if not paid:
+        return render(request, "orders/order_error.html", expired_message)
+    holds.release(order.pk)
     return redirect("orders:order_detail", order_no=order.order_no)